@@ -0,0 +1,298 @@
+"""
+数据库基准测试
+按可配置规模生成合成的新闻、报告、预测记录和热搜数据，测量 database.py 热点函数的
+延迟分位数和吞吐，结果写成结构固定的 JSON，便于比较存储层改动前后的表现。
+
+用法：
+    python benchmark_database.py --news 100000 --predictions 20000 --output data/db_benchmark.json
+    python benchmark_database.py --news 1000000 --predictions 100000 --queries 500 --keep
+    python benchmark_database.py --compare data/db_benchmark.json      # 与上次结果对比
+    DATABASE_URL=postgresql://... python benchmark_database.py --news 100000   # 测 PostgreSQL（会写入该库）
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from benchmark_pipeline import WORDS, SOURCES, percentile
+
+SYMBOLS = ['AAPL', 'TSLA', 'NVDA', 'MSFT', 'AMZN', 'GOOGL', 'META', 'BABA', 'BIDU', '600519', '000858', '300750']
+PLATFORMS = ['weibo', 'zhihu', 'baidu', 'douyin', 'toutiao']
+REPORT_TYPES = [('hourly', 24), ('daily', 2), ('weekly', 0.15), ('monthly', 0.03)]  # 每天生成份数
+
+
+def _utc(dt: datetime) -> str:
+    """与 CURRENT_TIMESTAMP 写入的列相同格式"""
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _words(rng: random.Random, low: int, high: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def make_news(count: int, days: int, rng: random.Random, offset: int = 0):
+    """生成合成新闻，发布时间均匀分布在最近 days 天内"""
+    now = datetime.now()
+    news = []
+    for i in range(offset, offset + count):
+        title = _words(rng, 6, 12).capitalize()
+        news.append({
+            'title': title,
+            'content': f'{title}. {_words(rng, 40, 150)}',
+            'summary': _words(rng, 15, 30),
+            'source': rng.choice(SOURCES),
+            'category': rng.choice(['general', 'stock', 'macro', 'crypto']),
+            'url': f'https://example.com/news/{i}',
+            'published_at': (now - timedelta(seconds=rng.uniform(0, days * 86400))).isoformat()
+        })
+    return news
+
+
+def make_reports(days: int, rng: random.Random):
+    """按各类报告的实际生成频率生成 reports 表的行"""
+    now = datetime.now().replace(microsecond=0)
+    rows = []
+    for report_type, per_day in REPORT_TYPES:
+        count = max(1, int(days * per_day))
+        # 报告键是秒级时间戳，同类型内唯一
+        offsets = rng.sample(range(days * 86400), min(count, days * 86400))
+        for seconds in offsets:
+            created = now - timedelta(seconds=seconds)
+            content = '\n'.join(_words(rng, 10, 25) for _ in range(rng.randint(20, 60)))
+            rows.append((
+                report_type, created.strftime('%Y%m%d_%H%M%S'),
+                report_type, content, _words(rng, 20, 40),
+                rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1), rng.randint(10, 200),
+                json.dumps(rng.sample(WORDS, 5)), '[]',
+                json.dumps([{'symbol': s, 'direction': rng.choice(['上涨', '下跌'])} for s in rng.sample(SYMBOLS, 3)]),
+                created.strftime('%Y-%m-%d %H:%M:%S')
+            ))
+    return rows
+
+
+def make_predictions(count: int, days: int, rng: random.Random):
+    """生成预测记录，约 70% 已验证"""
+    now = datetime.now(timezone.utc)
+    rows = []
+    for _ in range(count):
+        predicted = now - timedelta(seconds=rng.uniform(0, days * 86400))
+        direction = rng.choice(['上涨', '下跌', '中性'])
+        verified = rng.random() < 0.7
+        actual = rng.choice(['上涨', '下跌', '中性']) if verified else None
+        rows.append((
+            rng.choice(SYMBOLS), rng.choice(['news_based', 'weekly', 'monthly']), direction,
+            round(rng.uniform(0.3, 0.95), 2), _utc(predicted), (predicted + timedelta(days=1)).strftime('%Y-%m-%d'),
+            actual, round(rng.uniform(-5, 5), 2) if verified else None,
+            (1 if actual == direction else 0) if verified else None,
+            _utc(predicted + timedelta(days=1)) if verified else None
+        ))
+    return rows
+
+
+def make_hot_searches(count: int, days: int, rng: random.Random):
+    """生成热搜快照：每个平台每次采集 50 条，采集时间从现在往前排"""
+    now = datetime.now(timezone.utc)
+    snapshots = max(1, count // (50 * len(PLATFORMS)))
+    interval = days * 86400 / snapshots
+    rows = []
+    for n in range(snapshots):
+        collected = _utc(now - timedelta(seconds=n * interval))
+        for platform_name in PLATFORMS:
+            for rank in range(1, 51):
+                rows.append((platform_name, rank, _words(rng, 3, 8), '', rng.randint(1000, 10 ** 7),
+                             rng.choice(['财经', '科技', '社会']), collected))
+    return rows
+
+
+def summarize(latencies, rows=None) -> dict:
+    """延迟（毫秒）分位数和吞吐"""
+    total = sum(latencies)
+    result = {
+        'count': len(latencies),
+        'mean_ms': round(total / len(latencies) * 1000, 3) if latencies else 0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3) if latencies else 0,
+        'ops_per_second': round(len(latencies) / total, 2) if total else 0,
+    }
+    if rows is not None:
+        result['avg_rows'] = round(sum(rows) / len(rows), 1) if rows else 0
+    return result
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return time.perf_counter() - started, value
+
+
+def load_data(database, args, rng: random.Random) -> dict:
+    """写入数据集；insert_news 分批调用并计时，其余表直接批量写入"""
+    backend = database.get_backend()
+    insert_latencies = []
+    inserted = 0
+    for offset in range(0, args.news, args.batch):
+        batch = make_news(min(args.batch, args.news - offset), args.days, rng, offset)
+        seconds, count = timed(database.insert_news, batch)
+        insert_latencies.append(seconds)
+        inserted += count
+        if (offset // args.batch) % 20 == 0:
+            print(f"   新闻 {offset + len(batch)}/{args.news}")
+
+    tables = {
+        'reports': (('report_type', 'report_key', 'title', 'content', 'summary', 'sentiment_overall',
+                     'sentiment_cn', 'sentiment_us', 'total_news', 'hot_topics', 'major_events', 'stocks',
+                     'created_at'), make_reports(args.days, rng)),
+        'predictions': (('symbol', 'prediction_type', 'predicted_direction', 'confidence', 'predicted_at',
+                         'target_date', 'actual_direction', 'actual_change', 'is_correct', 'verified_at'),
+                        make_predictions(args.predictions, args.days, rng)),
+        'hot_searches': (('platform', 'rank', 'title', 'url', 'hot_value', 'category', 'collected_at'),
+                         make_hot_searches(args.hot_searches, args.days, rng)),
+    }
+    counts = {'news': inserted}
+    with database.get_connection() as conn:
+        for table, (columns, rows) in tables.items():
+            for start in range(0, len(rows), 10000):
+                backend.bulk_insert(conn, table, columns, rows[start:start + 10000])
+            counts[table] = len(rows)
+        conn.commit()
+        if backend.name == 'sqlite':
+            conn.execute('ANALYZE')
+        conn.commit()
+
+    stats = summarize(insert_latencies)
+    total = sum(insert_latencies)
+    stats['batch_size'] = args.batch
+    stats['rows_per_second'] = round(inserted / total, 1) if total else 0
+    return {'counts': counts, 'insert_news': stats}
+
+
+def run_queries(database, args, rng: random.Random) -> dict:
+    """每个查询函数用随机参数执行 args.queries 次"""
+    operations = {
+        'get_recent_news': lambda: database.get_recent_news(
+            hours=rng.choice([1, 6, 24]), source=rng.choice([None, *SOURCES])),
+        'get_reports': lambda: database.get_reports(
+            rng.choice([None, 'hourly', 'daily', 'weekly']), limit=20, offset=rng.randint(0, 4) * 20),
+        'get_prediction_accuracy': lambda: database.get_prediction_accuracy(
+            symbol=rng.choice([None, *SYMBOLS]), days=rng.choice([7, 30, 90])),
+        'get_latest_hot_searches': lambda: database.get_latest_hot_searches(
+            platform=rng.choice([None, *PLATFORMS]), limit=50),
+    }
+    results = {}
+    for name, call in operations.items():
+        for _ in range(min(args.warmup, args.queries)):
+            call()
+        latencies, rows = [], []
+        for _ in range(args.queries):
+            seconds, value = timed(call)
+            latencies.append(seconds)
+            rows.append(len(value) if isinstance(value, list) else value.get('total', 0))
+        results[name] = summarize(latencies, rows)
+        print(f"   {name}: p50 {results[name]['p50_ms']}ms  p95 {results[name]['p95_ms']}ms")
+    return results
+
+
+def compare(result: dict, baseline_path: str):
+    """打印与基线结果的 p50 / p95 对比"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    current = {'insert_news': result['insert_news'], **result['operations']}
+    previous = {'insert_news': baseline.get('insert_news', {}), **baseline.get('operations', {})}
+    print(f"\n与基线对比: {baseline_path}")
+    print(f"{'操作':<26}{'p50 基线':>12}{'p50 当前':>12}{'p95 基线':>12}{'p95 当前':>12}{'p95 变化':>10}")
+    for name, stats in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        change = (stats['p95_ms'] / old['p95_ms'] - 1) * 100 if old.get('p95_ms') else 0
+        print(f"{name:<26}{old['p50_ms']:>12}{stats['p50_ms']:>12}{old['p95_ms']:>12}{stats['p95_ms']:>12}"
+              f"{change:>+9.1f}%")
+
+
+def run_benchmark(args) -> dict:
+    import database
+
+    workdir = None
+    if not database.DATABASE_URL:
+        workdir = tempfile.mkdtemp(prefix='wrf-dbbench-')
+        database.DB_PATH = os.path.join(workdir, 'finance.db')
+        print(f"数据库: {database.DB_PATH}")
+    database.init_database()
+
+    rng = random.Random(args.seed)
+    print("1. 写入合成数据...")
+    started = time.perf_counter()
+    loaded = load_data(database, args, rng)
+    load_seconds = time.perf_counter() - started
+
+    print("2. 查询...")
+    operations = run_queries(database, args, random.Random(f'{args.seed}-queries'))
+
+    backend = database.get_backend()
+    result = {
+        'config': vars(args),
+        'environment': {
+            'backend': backend.name,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version if backend.name == 'sqlite' else None,
+            'platform': platform.platform(),
+            'generated_at': datetime.now().isoformat(),
+        },
+        'dataset': {
+            **loaded['counts'],
+            'load_seconds': round(load_seconds, 2),
+            'db_bytes': os.path.getsize(database.DB_PATH) if workdir else None,
+        },
+        'insert_news': loaded['insert_news'],
+        'operations': operations,
+    }
+    database.close_connections()
+    if workdir and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按可配置规模压测 database.py 的写入和热点查询')
+    parser.add_argument('--news', type=int, default=100000, help='新闻条数')
+    parser.add_argument('--predictions', type=int, default=20000, help='预测记录条数')
+    parser.add_argument('--hot-searches', type=int, default=50000, help='热搜条数（按每平台每次 50 条成批生成）')
+    parser.add_argument('--days', type=int, default=90, help='数据分布的天数（报告按实际频率生成）')
+    parser.add_argument('--batch', type=int, default=500, help='每次 insert_news 的新闻条数')
+    parser.add_argument('--queries', type=int, default=200, help='每个查询函数的执行次数')
+    parser.add_argument('--warmup', type=int, default=10, help='每个查询函数计时前的预热次数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keep', action='store_true', help='保留临时 SQLite 数据库文件')
+    parser.add_argument('--compare', help='与之前的结果 JSON 对比')
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    result = run_benchmark(args)
+
+    print(f"\n{'='*60}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.compare:
+        compare(result, args.compare)
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {output}")
+
+
+if __name__ == '__main__':
+    main()
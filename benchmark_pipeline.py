@@ -0,0 +1,222 @@
+"""
+流水线离线压测
+在本地模拟 LLM 服务上跑完整的 run_daily_report（合成采集数据、不发邮件），
+可选再跑 WeeklySummary.generate 和 MonthlyAnalysis.generate_monthly_analysis，
+输出每轮耗时、吞吐、各阶段耗时分布以及网关按调用方统计的延迟/token，便于发现性能回退。
+
+用法：
+    python benchmark_pipeline.py --iterations 3 --articles 200 --latency 0.5 --error-rate 0.05
+    python benchmark_pipeline.py --weekly --monthly --output data/benchmark.json
+    python benchmark_pipeline.py --base-url http://127.0.0.1:8800   # 使用已启动的 mock_llm_server
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from mock_llm_server import MockConfig, start_mock_server
+
+WORDS = [
+    'apple', 'tesla', 'nvidia', 'fed', 'rate', 'cut', 'hike', 'earnings', 'beat', 'miss', 'guidance',
+    'china', 'exports', 'tariff', 'oil', 'opec', 'gold', 'bond', 'yield', 'inflation', 'cpi', 'jobs',
+    'payrolls', 'merger', 'deal', 'ipo', 'bank', 'crypto', 'bitcoin', 'chip', 'ai', 'cloud', 'retail',
+    'sales', 'housing', 'market', 'rally', 'slump', 'record', 'profit', 'loss', 'layoffs', 'factory',
+    'pmi', 'dollar', 'yuan', 'euro', 'ecb', 'boj', 'stimulus', 'debt', 'default', 'upgrade', 'downgrade'
+]
+SOURCES = ['Reuters', 'Bloomberg', 'CNBC', 'WSJ', '财联社', '华尔街见闻', '新浪财经']
+
+
+def percentile(values, pct: float) -> float:
+    """线性插值百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def make_articles(count: int, rng: random.Random, run_id: str, dup_ratio: float):
+    """生成合成新闻，其中 dup_ratio 比例为其他来源的重复报道"""
+    articles = []
+    for i in range(count):
+        if articles and rng.random() < dup_ratio:
+            original = rng.choice(articles)
+            articles.append({**original, 'source': rng.choice(SOURCES),
+                             'url': f'https://example.com/{run_id}/{i}'})
+            continue
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 10))).capitalize()
+        articles.append({
+            'title': title,
+            'content': f'{title}. ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 150))),
+            'source': rng.choice(SOURCES),
+            'category': 'general',
+            'url': f'https://example.com/{run_id}/{i}',
+            'published_at': datetime.now().isoformat()
+        })
+    return articles
+
+
+class SyntheticCollector:
+    """替换 DataCollector：返回合成新闻，不访问网络"""
+
+    articles = []
+
+    def __init__(self, *args, **kwargs):
+        self.last_fetch_stats = {}
+
+    def fetch_latest(self, hours=24, max_per_source=15, full_window=False, **kwargs):
+        return list(self.articles)
+
+    def fetch_stock_specific_news(self):
+        return []
+
+    def commit_cursors(self, exclude=()):
+        pass
+
+
+class NoWebScraper:
+    def scrape_all(self):
+        return []
+
+
+class NullEmailSender:
+    """替换 EmailSender：只统计调用次数"""
+
+    sent = 0
+
+    def send(self, report, html_content=None):
+        NullEmailSender.sent += 1
+        return True
+
+
+def run_benchmark(args) -> dict:
+    import main
+    import database
+    from llm_gateway import get_llm_gateway
+
+    workdir = tempfile.mkdtemp(prefix='wrf-bench-')
+    os.chdir(workdir)
+    database.DB_PATH = os.path.join(workdir, 'finance.db')
+    # 看板快照同样写到临时目录，避免覆盖线上 data/dashboard.json
+    os.environ['DASHBOARD_SNAPSHOT_PATH'] = os.path.join(workdir, 'dashboard.json')
+    main.DataCollector = SyntheticCollector
+    main.WebScraper = NoWebScraper
+    main.EmailSender = NullEmailSender
+    print(f"工作目录: {workdir}")
+
+    rng = random.Random(args.seed)
+    runs = []
+    for i in range(args.iterations):
+        # --warm-cache 时复用同一批新闻，用于测量分析缓存命中后的耗时
+        run_id = 'warm' if args.warm_cache else f'run{i}'
+        SyntheticCollector.articles = make_articles(args.articles, random.Random(f'{args.seed}-{run_id}'),
+                                                    run_id, args.dup_ratio)
+        started = time.perf_counter()
+        main.run_daily_report()
+        elapsed = time.perf_counter() - started
+        runs.append(elapsed)
+        print(f"\n[benchmark] 第 {i + 1}/{args.iterations} 轮: {elapsed:.2f}s")
+
+    result = {
+        'config': vars(args),
+        'daily_report': {
+            'iterations': len(runs),
+            'articles_per_run': args.articles,
+            'seconds': [round(r, 3) for r in runs],
+            'p50': round(percentile(runs, 50), 3),
+            'p95': round(percentile(runs, 95), 3),
+            'max': round(max(runs), 3) if runs else 0,
+            'articles_per_second': round(args.articles * len(runs) / sum(runs), 2) if runs else 0,
+            'emails_rendered': NullEmailSender.sent
+        }
+    }
+
+    if args.weekly:
+        from weekly_summary import WeeklySummary
+        reports = [{
+            'sentiment': {'overall': rng.uniform(-1, 1), 'cn': rng.uniform(-1, 1), 'us': rng.uniform(-1, 1)},
+            'stocks': [{'symbol': s, 'name': s, 'direction': rng.choice(['上涨', '下跌', '中性'])}
+                       for s in ('AAPL', 'TSLA', 'NVDA', '600519')]
+        } for _ in range(14)]
+        started = time.perf_counter()
+        WeeklySummary().generate(reports)
+        result['weekly_summary'] = {'seconds': round(time.perf_counter() - started, 3)}
+
+    if args.monthly:
+        from monthly_analysis import MonthlyAnalysis
+        started = time.perf_counter()
+        analysis = MonthlyAnalysis().generate_monthly_analysis()
+        result['monthly_analysis'] = {'seconds': round(time.perf_counter() - started, 3),
+                                      'error': bool(analysis.get('error'))}
+
+    result['stages'] = database.get_pipeline_stage_summary('daily_report', days=1)
+    result['llm'] = get_llm_gateway().get_stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在本地模拟 LLM 服务上压测报告流水线')
+    parser.add_argument('--iterations', type=int, default=3, help='run_daily_report 运行轮数')
+    parser.add_argument('--articles', type=int, default=120, help='每轮合成新闻数')
+    parser.add_argument('--dup-ratio', type=float, default=0.1, help='重复报道比例')
+    parser.add_argument('--warm-cache', action='store_true', help='每轮使用相同新闻（测分析缓存命中）')
+    parser.add_argument('--weekly', action='store_true', help='同时压测周报生成')
+    parser.add_argument('--monthly', action='store_true', help='同时压测月度分析')
+    parser.add_argument('--latency', type=float, default=0.3, help='模拟服务固定延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=0, help='模拟生成速度')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟抖动比例')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='500 错误比例')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='429 错误比例')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='不完整 JSON 比例')
+    parser.add_argument('--recordings', help='回放用的录制文件（JSONL）')
+    parser.add_argument('--base-url', help='使用已启动的模拟服务，而不是进程内启动')
+    parser.add_argument('--rpm', type=int, default=0, help='网关每分钟请求上限，0 表示不限')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        server = start_mock_server(MockConfig(
+            latency=args.latency, tokens_per_second=args.tokens_per_second, jitter=args.jitter,
+            error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+            malformed_rate=args.malformed_rate, recordings=args.recordings, seed=args.seed
+        ))
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # 必须在导入 main / llm_gateway 之前设置
+    os.environ['DEEPSEEK_BASE_URL'] = base_url
+    os.environ['DEEPSEEK_API_KEY'] = os.environ.get('BENCHMARK_API_KEY', 'mock-key')
+    os.environ['DEEPSEEK_RPM'] = str(args.rpm)
+    os.environ.setdefault('DEEPSEEK_TPM', '0')
+    print(f"模拟 LLM 服务: {base_url}")
+
+    output = os.path.abspath(args.output) if args.output else None
+    result = run_benchmark(args)
+    if server:
+        result['mock_server'] = dict(server.config.stats)
+        server.shutdown()
+
+    print(f"\n{'='*60}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if output:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {output}")
+
+
+if __name__ == '__main__':
+    main()
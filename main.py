@@ -3,94 +3,227 @@ import sys
 from dotenv import load_dotenv
 import schedule
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import subprocess
 
 sys.path.append('src')
 from collector import DataCollector
 from web_scraper import WebScraper
 from processor import NLPProcessor
+from deduplicator import NewsDeduplicator
 from report_generator import ReportGenerator
 from report_generator_v2 import ReportGeneratorV2
 from email_sender import EmailSender
 from email_template import EmailTemplateGenerator
+from database import (init_database, bulk_insert_news, AnalysisWriter, refresh_sentiment_rollups,
+                      run_news_retention, purge_crypto_history, save_report, new_report_key,
+                      save_crypto_prices)
+from pipeline_metrics import PipelineMetrics
+from dashboard import publish_dashboard
 
 load_dotenv()
 
-def run_daily_report():
-    """执行每日报告生成流程"""
+# 加密货币行情采样：按固定间隔写入最新价表和分桶历史（/api/crypto/<symbol>/history），与 Web 访问量无关
+CRYPTO_SNAPSHOT_MINUTES = int(os.getenv('CRYPTO_SNAPSHOT_MINUTES', '1'))
+CRYPTO_TRACKED_SYMBOLS = [s.strip().upper() for s in
+                          os.getenv('CRYPTO_TRACKED_SYMBOLS', 'BTC,ETH,SOL,DOGE,XRP').split(',') if s.strip()]
+
+def run_daily_report(full_window: bool = False):
+    """执行每日报告生成流程
+
+    full_window: True 时忽略增量游标，重新分析最近24小时的全部RSS新闻（用于回补）
+    各阶段耗时、条数、token 和错误写入 pipeline_metrics 表（见 /api/metrics/pipeline）
+    """
     print(f"\n{'='*60}")
     print(f"开始生成报告 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*60}\n")
     
+    init_database()
+    metrics = PipelineMetrics('daily_report')
+    try:
+        status, items = _run_daily_report(metrics, full_window)
+    except Exception as e:
+        metrics.finish('error', error=str(e))
+        raise
+    metrics.finish(status, items=items)
+    metrics.print_summary()
+
+def _run_daily_report(metrics: PipelineMetrics, full_window: bool):
+    """run_daily_report 的各个阶段，返回 (运行状态, 分析条数)"""
     # 1. 数据采集
     print("1. 采集RSS新闻...")
     collector = DataCollector()
-    articles = collector.fetch_latest(hours=24, max_per_source=15)
+    with metrics.stage('collect.rss') as stage:
+        articles = collector.fetch_latest(hours=24, max_per_source=15, full_window=full_window)
+        stage.items = len(articles)
+    for source, stats in collector.last_fetch_stats.items():
+        metrics.record('collect.source', seconds=stats.get('latency', 0), items=stats.get('count', 0),
+                       error=stats.get('error'), label=source, parent='collect.rss', status=stats.get('status'))
     
     print("\n2. 爬取官方网站...")
     scraper = WebScraper()
-    web_articles = scraper.scrape_all()
+    with metrics.stage('collect.web') as stage:
+        web_articles = scraper.scrape_all()
+        stage.items = len(web_articles)
     articles.extend(web_articles)
 
     # 2a. 采集自选股新闻
-    web_articles = collector.fetch_stock_specific_news()
+    with metrics.stage('collect.stock_news') as stage:
+        web_articles = collector.fetch_stock_specific_news()
+        stage.items = len(web_articles)
     articles.extend(web_articles)
     
     print(f"\n   总计采集 {len(articles)} 条新闻")
     
+    # 2b. 去重：同一事件只送一条给 LLM
+    deduplicator = NewsDeduplicator()
+    with metrics.stage('dedup', input=len(articles)) as stage:
+        articles = deduplicator.deduplicate(articles)
+        stage.items = len(articles)
+        stage.detail.update(deduplicator.last_stats)
+    stats = deduplicator.last_stats
+    print(f"   去重后剩余 {stats['output']} 条 (完全重复 {stats['exact_duplicates']} 条, 近似重复 {stats['near_duplicates']} 条)")
+    
     if not articles:
         print("   无新数据，跳过处理")
-        return
+        return 'empty', 0
+    
+    # 2c. 入库（news 表及其全文索引），分析结果随后由后台线程写回
+    news_stored = False
+    with metrics.stage('store.news', input=len(articles)) as stage:
+        try:
+            stage.detail.update(bulk_insert_news(articles))
+            stage.items = stage.detail['inserted']
+            news_stored = True
+        except Exception as e:
+            # 入库失败不影响本次报告
+            stage.fail(str(e))
+            print(f"   ⚠ 新闻入库失败: {e}")
     
     # 2. 信息处理
     print("\n3. 分析新闻内容...")
-    processor = NLPProcessor()
-    processed = processor.process_batch(articles)
+    writer = AnalysisWriter()
+    processor = NLPProcessor(analysis_writer=writer)
+    with metrics.stage('analysis') as stage:
+        try:
+            processed = processor.process_batch(articles)
+        finally:
+            writer.close()
+        stage.items = len(processed)
+        stage.detail.update(processor.last_stats)
+        stage.detail['written'] = writer.written
+    _record_analysis_stages(metrics, processor, stage)
     print(f"   成功处理 {len(processed)} 条新闻")
+    if processor.last_stats:
+        print(f"   分析缓存命中率: {processor.last_stats['cache_hit_rate']:.0%}")
+    # 分析结果已写回，刷新本轮覆盖时间段的小时/天情绪汇总
+    with metrics.stage('store.rollup') as stage:
+        try:
+            stage.items = refresh_sentiment_rollups((datetime.now() - timedelta(hours=25)).isoformat())
+        except Exception as e:
+            stage.fail(str(e))
+            print(f"   ⚠ 刷新情绪汇总失败: {e}")
+    # 分析完成后再推进增量游标：新闻入库失败时整轮不提交，分析失败的文章不标记为已见，下次重新采集
+    if news_stored:
+        collector.commit_cursors(exclude=processor.last_failed)
     
     # 3. 生成报告
     print("4. 生成报告...")
     
+    # 文本和结构化报告共用一个报告键（导出文件名中的时间戳）
+    report_key = new_report_key('hourly')
+    
     # 生成纯文本报告（用于本地保存）
-    report_gen = ReportGenerator()
-    report_text = report_gen.generate(processed)
-    _save_local(report_text)
+    with metrics.stage('report.text') as stage:
+        stage.items = len(processed)
+        report_gen = ReportGenerator()
+        report_text = report_gen.generate(processed)
+        report_file = _save_local(report_text, report_key)
     
     # 生成结构化报告（用于可视化邮件和前端）
-    report_gen_v2 = ReportGeneratorV2()
-    report_data = report_gen_v2.generate(processed)
-    _save_json(report_data)
+    with metrics.stage('report.structured') as stage:
+        stage.items = len(processed)
+        report_gen_v2 = ReportGeneratorV2()
+        report_data = report_gen_v2.generate(processed)
+        report_data['meta']['analysis_cache'] = processor.last_stats
+        _save_json(report_data, report_key)
+    
+    # 报告入库，前端和汇总脚本从 reports 表读取；文件仅作为导出
+    report_time = datetime.now()
+    report_id = None
+    with metrics.stage('store.report') as stage:
+        try:
+            report_id = save_report('hourly', report_text, file_path=report_file, report_key=report_key,
+                        data=report_data, created_at=report_time)
+            stage.items = 1
+        except Exception as e:
+            stage.fail(str(e))
+            print(f"   ⚠ 报告入库失败: {e}")
+    
+    # 发布首页看板快照，/api/latest 直接返回，无需每次请求解析报告；
+    # 快照按报告 id 与 reports 表对应，报告未入库时不发布
+    with metrics.stage('store.dashboard') as stage:
+        try:
+            if report_id is None:
+                raise RuntimeError('报告未入库')
+            publish_dashboard(report_text, report_time, report_id)
+            stage.items = 1
+        except Exception as e:
+            stage.fail(str(e))
+            print(f"   ⚠ 看板快照发布失败: {e}")
     
     # 4. 发送邮件（使用HTML模板）
     print("5. 发送报告...")
     sender = EmailSender()
     
     # 生成HTML邮件并发送
-    template_gen = EmailTemplateGenerator()
-    html_content = template_gen.generate_email_html(report_data)
-    sender.send(report_text, html_content=html_content)
+    with metrics.stage('email.render') as stage:
+        template_gen = EmailTemplateGenerator()
+        html_content = template_gen.generate_email_html(report_data)
+        stage.detail['html_bytes'] = len(html_content or '')
+    with metrics.stage('email.send') as stage:
+        if not sender.send(report_text, html_content=html_content):
+            stage.fail('邮件未发送')
     
     print(f"\n{'='*60}")
     print("报告生成完成")
     print(f"{'='*60}\n")
+    return 'ok', len(processed)
 
-def _save_local(report: str):
+def _record_analysis_stages(metrics: PipelineMetrics, processor: NLPProcessor, analysis_stage):
+    """把 NLPProcessor 记录的筛选/逐批次明细写入流水线统计"""
+    llm_usage = analysis_stage.detail.get('llm', {})
+    filter_usage = llm_usage.get('processor.filter', {})
+    filter_stats = processor.last_filter_stats
+    if filter_stats:
+        metrics.record('analysis.filter', seconds=filter_stats['seconds'], items=filter_stats['output'],
+                       prompt_tokens=filter_usage.get('prompt', 0),
+                       completion_tokens=filter_usage.get('completion', 0),
+                       parent='analysis', input=filter_stats['input'])
+    for batch in processor.last_batch_stats:
+        if batch:
+            metrics.record('analysis.batch', seconds=batch['seconds'], items=batch['processed'],
+                           error=batch['error'], label=f"batch-{batch['batch']}", parent='analysis',
+                           articles=batch['articles'],
+                           estimated_prompt_tokens=batch['estimated_prompt_tokens'])
+
+def _save_local(report: str, report_key: str) -> str:
     """保存报告到本地"""
     os.makedirs('data/reports', exist_ok=True)
-    filename = f"data/reports/report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    filename = f"data/reports/report_{report_key}.txt"
     with open(filename, 'w', encoding='utf-8', errors='replace') as f:
         f.write(report)
     try:
         print(f"报告已保存: {filename}")
     except:
         print(f"Report saved: {filename}")
+    return filename
 
-def _save_json(report_data: dict):
-    """保存结构化报告为JSON（供前端读取）"""
+def _save_json(report_data: dict, report_key: str):
+    """导出结构化报告为JSON"""
     import json
     os.makedirs('data/reports_json', exist_ok=True)
-    filename = f"data/reports_json/report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    filename = f"data/reports_json/report_{report_key}.json"
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(report_data, f, ensure_ascii=False, indent=2)
     try:
@@ -137,6 +270,26 @@ def run_backtest_verification():
         import traceback
         traceback.print_exc()
 
+def run_news_maintenance():
+    """新闻表日常维护：旧正文归档到按月压缩库，过期行删除，情绪汇总保留；顺带清理过期的加密货币分桶历史"""
+    print(f"\n启动新闻数据维护 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    try:
+        init_database()
+        stats = run_news_retention()
+        print(f"   归档 {stats['archived']} 条（{stats['months']} 个月份），删除 {stats['deleted']} 条")
+        purged = purge_crypto_history()
+        print(f"   清理加密货币历史：分钟桶 {purged['minute']} 行，小时桶 {purged['hour']} 行")
+    except Exception as e:
+        print(f"新闻数据维护失败: {e}")
+
+def record_crypto_prices():
+    """采样一次加密货币行情，写入最新价表和分钟/小时/天历史桶"""
+    try:
+        from crypto_collector import CryptoCollector
+        save_crypto_prices(CryptoCollector().get_market_data(CRYPTO_TRACKED_SYMBOLS))
+    except Exception as e:
+        print(f"加密货币行情采样失败: {e}")
+
 def main():
     print("Wide Research for Finance - MVP v1.0")
     print("="*60)
@@ -155,6 +308,8 @@ def main():
         print("- 每天 08:00 和 20:00 运行周报分析")
         print("- 每天 09:00 更新月度分析（事件日历+预测修正）")
         print("- 每天 21:00 运行回测验证（验证预测准确率）")
+        print("- 每天 03:30 归档旧新闻正文并清理过期数据")
+        print(f"- 每 {CRYPTO_SNAPSHOT_MINUTES} 分钟采样加密货币行情")
 
         # 1. 小时报
         schedule.every().hour.at(":00").do(run_daily_report)
@@ -179,6 +334,13 @@ def main():
         
         # 5. 回测验证（每天晚上9点，验证历史预测的准确性）
         schedule.every().day.at("21:00").do(run_backtest_verification)
+        
+        # 6. 新闻数据维护（归档/清理，避开整点报告）
+        schedule.every().day.at("03:30").do(run_news_maintenance)
+
+        # 7. 加密货币行情采样（写入分桶历史）
+        init_database()
+        schedule.every(CRYPTO_SNAPSHOT_MINUTES).minutes.do(record_crypto_prices)
 
         print("后台运行中，按 Ctrl+C 停止\n")
         while True:
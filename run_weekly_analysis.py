@@ -1,12 +1,11 @@
 import os
 import sys
-import glob
-import json
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 sys.path.append('src')
 from weekly_summary import WeeklySummary
+from database import get_reports_since
 
 load_dotenv()
 
@@ -123,43 +122,32 @@ def parse_report(content):
     return data
 
 def get_weekly_reports():
-    """获取过去7天的报告，优先使用JSON格式"""
-    now = datetime.now()
-    week_ago = now - timedelta(days=7)
+    """从 reports 表获取过去7天的小时报告，优先使用结构化数据"""
+    week_ago = datetime.now() - timedelta(days=7)
+    reports = get_reports_since('hourly', week_ago)
     weekly = []
     
     # 优先使用JSON格式报告
-    json_reports = glob.glob('data/reports_json/report_*.json')
-    if json_reports:
-        for report_path in json_reports:
-            try:
-                mtime = datetime.fromtimestamp(os.path.getctime(report_path))
-                if mtime >= week_ago:
-                    with open(report_path, 'r', encoding='utf-8') as f:
-                        json_data = json.load(f)
-                        parsed = parse_json_report(json_data)
-                        if parsed and (parsed.get('stocks') or parsed.get('events')):
-                            weekly.append(parsed)
-            except Exception as e:
-                print(f"解析JSON报告失败 {report_path}: {e}")
-        
-        if weekly:
-            return weekly
+    for report in reports:
+        try:
+            parsed = parse_json_report(report.get('data'))
+            if parsed and (parsed.get('stocks') or parsed.get('events')):
+                weekly.append(parsed)
+        except Exception as e:
+            print(f"解析JSON报告失败 {report.get('report_key')}: {e}")
+    
+    if weekly:
+        return weekly
     
     # 回退到文本格式
-    txt_reports = glob.glob('data/reports/report_*.txt')
-    if txt_reports:
-        for report_path in txt_reports:
-            try:
-                mtime = datetime.fromtimestamp(os.path.getctime(report_path))
-                if mtime >= week_ago:
-                    with open(report_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        parsed = parse_report(content)
-                        if parsed:
-                            weekly.append(parsed)
-            except:
-                pass
+    for report in reports:
+        try:
+            if report.get('content'):
+                parsed = parse_report(report['content'])
+                if parsed:
+                    weekly.append(parsed)
+        except:
+            pass
     
     return weekly
 
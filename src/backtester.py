@@ -30,13 +30,45 @@ except ImportError:
 try:
     from database import (
         get_connection, save_prediction, verify_prediction, 
-        get_prediction_accuracy, get_reports
+        get_prediction_accuracy, get_reports_since, report_local_time
     )
     HAS_DATABASE = True
 except ImportError:
     HAS_DATABASE = False
 
 
+def _load_reports(report_type: str, pattern: str, days: int) -> List[Tuple[datetime, str, object]]:
+    """加载最近N天的报告，返回 [(生成时间, 来源, 内容)]，小时报告的内容为文本，其余为 JSON 数据
+
+    优先查询 reports 表；数据库不可用时回退到扫描导出文件（pattern）
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    if HAS_DATABASE:
+        try:
+            reports = []
+            for r in get_reports_since(report_type, cutoff):
+                payload = r['content'] if report_type == 'hourly' else r.get('data')
+                if payload:
+                    reports.append((report_local_time(r['created_at']),
+                                    r.get('file_path') or r['report_key'], payload))
+            return reports
+        except Exception as e:
+            print(f"读取 reports 表失败，改为扫描文件: {e}")
+    
+    reports = []
+    for filepath in glob.glob(pattern):
+        try:
+            mtime = datetime.fromtimestamp(os.path.getctime(filepath))
+            if mtime < cutoff:
+                continue
+            with open(filepath, 'r', encoding='utf-8') as f:
+                payload = json.load(f) if filepath.endswith('.json') else f.read()
+            reports.append((mtime, filepath, payload))
+        except Exception as e:
+            print(f"加载报告失败 {filepath}: {e}")
+    return reports
+
+
 class PriceDataFetcher:
     """价格数据获取器"""
     
@@ -196,28 +228,18 @@ class NewsBacktester:
     def load_historical_reports(self, days: int = 30) -> List[Dict]:
         """加载历史报告"""
         reports = []
-        cutoff = datetime.now() - timedelta(days=days)
-        
-        # 从文件加载
-        report_files = glob.glob(os.path.join(self.reports_dir, 'report_*.txt'))
         
-        for filepath in report_files:
+        for created_at, source, content in _load_reports(
+                'hourly', os.path.join(self.reports_dir, 'report_*.txt'), days):
             try:
-                mtime = datetime.fromtimestamp(os.path.getctime(filepath))
-                if mtime < cutoff:
-                    continue
-                
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
                 # 解析报告
                 parsed = self._parse_report_for_backtest(content)
-                parsed['file_path'] = filepath
-                parsed['date'] = mtime.strftime('%Y-%m-%d')
-                parsed['timestamp'] = mtime.isoformat()
+                parsed['file_path'] = source
+                parsed['date'] = created_at.strftime('%Y-%m-%d')
+                parsed['timestamp'] = created_at.isoformat()
                 reports.append(parsed)
             except Exception as e:
-                print(f"加载报告失败 {filepath}: {e}")
+                print(f"加载报告失败 {source}: {e}")
         
         # 按时间排序
         reports.sort(key=lambda x: x['timestamp'])
@@ -277,25 +299,13 @@ class NewsBacktester:
     def load_weekly_analyses(self, days: int = 60) -> List[Dict]:
         """加载周报分析数据"""
         analyses = []
-        cutoff = datetime.now() - timedelta(days=days)
         
-        analysis_files = glob.glob(os.path.join(self.weekly_dir, 'analysis_*.json'))
-        
-        for filepath in analysis_files:
-            try:
-                mtime = datetime.fromtimestamp(os.path.getctime(filepath))
-                if mtime < cutoff:
-                    continue
-                
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                data['file_path'] = filepath
-                data['date'] = mtime.strftime('%Y-%m-%d')
-                data['timestamp'] = mtime.isoformat()
-                analyses.append(data)
-            except Exception as e:
-                print(f"加载周报失败 {filepath}: {e}")
+        for created_at, source, data in _load_reports(
+                'weekly', os.path.join(self.weekly_dir, 'analysis_*.json'), days):
+            data['file_path'] = source
+            data['date'] = created_at.strftime('%Y-%m-%d')
+            data['timestamp'] = created_at.isoformat()
+            analyses.append(data)
         
         analyses.sort(key=lambda x: x['timestamp'])
         print(f"✓ 加载了 {len(analyses)} 份周报分析")
@@ -668,24 +678,12 @@ class WeeklyAnalysisBacktester:
     def load_weekly_analyses(self, days: int = 60) -> List[Dict]:
         """加载周报分析"""
         analyses = []
-        cutoff = datetime.now() - timedelta(days=days)
         
-        files = glob.glob(os.path.join(self.weekly_dir, 'analysis_*.json'))
-        
-        for filepath in files:
-            try:
-                mtime = datetime.fromtimestamp(os.path.getctime(filepath))
-                if mtime < cutoff:
-                    continue
-                
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                data['file_path'] = filepath
-                data['analysis_date'] = mtime.strftime('%Y-%m-%d')
-                analyses.append(data)
-            except Exception as e:
-                continue
+        for created_at, source, data in _load_reports(
+                'weekly', os.path.join(self.weekly_dir, 'analysis_*.json'), days):
+            data['file_path'] = source
+            data['analysis_date'] = created_at.strftime('%Y-%m-%d')
+            analyses.append(data)
         
         analyses.sort(key=lambda x: x.get('analysis_date', ''))
         return analyses
@@ -872,24 +870,12 @@ class MonthlyAnalysisBacktester:
     def load_monthly_analyses(self, days: int = 90) -> List[Dict]:
         """加载月度分析"""
         analyses = []
-        cutoff = datetime.now() - timedelta(days=days)
-        
-        files = glob.glob(os.path.join(self.monthly_dir, 'analysis_*.json'))
         
-        for filepath in files:
-            try:
-                mtime = datetime.fromtimestamp(os.path.getctime(filepath))
-                if mtime < cutoff:
-                    continue
-                
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                data['file_path'] = filepath
-                data['file_date'] = mtime.strftime('%Y-%m-%d')
-                analyses.append(data)
-            except:
-                continue
+        for created_at, source, data in _load_reports(
+                'monthly', os.path.join(self.monthly_dir, 'analysis_*.json'), days):
+            data['file_path'] = source
+            data['file_date'] = created_at.strftime('%Y-%m-%d')
+            analyses.append(data)
         
         analyses.sort(key=lambda x: x.get('generated_at', ''))
         return analyses
@@ -1,12 +1,190 @@
+import os
+import json
+import time
+import threading
 import feedparser
 import yaml
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Iterable
 from web_scraper import WebScraper # 引入WebScraper
 
+# 并发采集默认参数，可在 config/sources.yaml 的 fetch 段覆盖
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SOURCE_TIMEOUT = 15
+DEFAULT_GLOBAL_TIMEOUT = 45
+
+
+class FeedCache:
+    """RSS 条件请求缓存
+
+    按源 URL 保存 ETag / Last-Modified 以及上次解析出的条目，
+    源未更新（HTTP 304）时直接复用缓存条目，省去下载和 feedparser 解析。
+    """
+
+    # 只缓存条目中实际用到的字段，保证可以 JSON 序列化
+    ENTRY_FIELDS = ('id', 'title', 'link', 'summary', 'description')
+    MAX_ENTRIES = 100
+
+    def __init__(self, cache_file: str = 'data/feed_cache.json'):
+        self.cache_file = cache_file
+        self.cache: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load_cache()
+
+    def _load_cache(self):
+        """加载缓存"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.cache = json.load(f)
+        except Exception:
+            self.cache = {}
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """生成条件请求头"""
+        with self._lock:
+            cached = self.cache.get(url)
+        if not cached or not cached.get('entries'):
+            return {}
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def get_entries(self, url: str) -> List[Dict]:
+        """获取上次解析的条目"""
+        with self._lock:
+            cached = self.cache.get(url) or {}
+            return list(cached.get('entries', []))
+
+    def update(self, url: str, etag: Optional[str], last_modified: Optional[str], entries) -> None:
+        """记录新的校验值和条目；服务器不支持条件请求时不缓存"""
+        if not etag and not last_modified:
+            return
+        simplified = []
+        for entry in entries[:self.MAX_ENTRIES]:
+            item = {field: entry.get(field) for field in self.ENTRY_FIELDS if entry.get(field)}
+            published_parsed = entry.get('published_parsed')
+            if published_parsed:
+                item['published_parsed'] = list(published_parsed)[:9]
+            simplified.append(item)
+        with self._lock:
+            self.cache[url] = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'entries': simplified,
+                'updated_at': datetime.now().isoformat()
+            }
+            self._dirty = True
+
+    def save(self):
+        """有变更时写回磁盘"""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = json.dumps(self.cache, ensure_ascii=False)
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            tmp_file = self.cache_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"  ⚠ 保存RSS缓存失败: {e}")
+
+
+class FeedCursor:
+    """按源记录的增量游标
+
+    每个源保存最近见过的条目标识，下次采集只发出未见过的条目，避免重复送入 NLPProcessor。
+    不按发布时间设下限：没有发布时间的条目以采集时刻代替，与 feed 中的 UTC 时间不可比，
+    晚发布的条目也可能早于已见条目，是否为新条目只看标识。
+    游标先暂存，由调用方在下游处理成功后 commit，处理失败时下次会重新发出。
+    """
+
+    # 每个源保留的已见标识数，远大于单个源每轮解析的条目数（max_per_source * 2）
+    MAX_SEEN = 500
+
+    def __init__(self, cursor_file: str = 'data/feed_cursors.json'):
+        self.cursor_file = cursor_file
+        self.cursors: Dict[str, Dict] = {}
+        self._pending: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """加载游标"""
+        try:
+            if os.path.exists(self.cursor_file):
+                with open(self.cursor_file, 'r', encoding='utf-8') as f:
+                    self.cursors = json.load(f)
+        except Exception:
+            self.cursors = {}
+
+    @staticmethod
+    def entry_key(article: Dict) -> str:
+        """条目唯一标识：优先链接，其次标题"""
+        return article.get('url') or article.get('title', '')
+
+    def filter_new(self, source: str, articles: List[Dict]) -> List[Dict]:
+        """过滤掉该源已经发出过的条目"""
+        with self._lock:
+            cursor = self.cursors.get(source)
+        if not cursor:
+            return articles
+        seen = set(cursor.get('seen', []))
+        return [article for article in articles if self.entry_key(article) not in seen]
+
+    def stage(self, source: str, articles: List[Dict]):
+        """暂存本轮发出的条目，commit 后才推进游标"""
+        if not articles:
+            return
+        with self._lock:
+            self._pending.setdefault(source, []).extend(articles)
+
+    def commit(self, exclude: Iterable[Dict] = ()):
+        """推进所有暂存源的游标并写回磁盘
+
+        exclude 中的条目（如分析失败的文章）不标记为已见，下次采集时重新发出
+        """
+        skipped = {self.entry_key(article) for article in exclude}
+        with self._lock:
+            if not self._pending:
+                return
+            for source, articles in self._pending.items():
+                cursor = self.cursors.setdefault(source, {'seen': []})
+                # 旧版本按发布时间记录的高水位不再使用
+                cursor.pop('high_water', None)
+                seen = cursor.get('seen', [])
+                seen_set = set(seen)
+                for article in articles:
+                    key = self.entry_key(article)
+                    if key and key not in seen_set and key not in skipped:
+                        seen.append(key)
+                        seen_set.add(key)
+                cursor['seen'] = seen[-self.MAX_SEEN:]
+                cursor['updated_at'] = datetime.now().isoformat()
+            self._pending = {}
+            snapshot = json.dumps(self.cursors, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.cursor_file) or '.', exist_ok=True)
+            tmp_file = self.cursor_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_file, self.cursor_file)
+        except Exception as e:
+            print(f"  ⚠ 保存采集游标失败: {e}")
+
+
 class DataCollector:
-    def __init__(self, config_path='config/sources.yaml', user_config_path='src/user_config.yaml'):
+    def __init__(self, config_path='config/sources.yaml', user_config_path='src/user_config.yaml',
+                 feed_cache_path='data/feed_cache.json', cursor_path='data/feed_cursors.json'):
         with open(config_path, 'r', encoding='utf-8') as f:
             self.config = yaml.safe_load(f)
         try:
@@ -14,100 +192,228 @@ class DataCollector:
                 self.user_config = yaml.safe_load(f)
         except FileNotFoundError:
             self.user_config = {}
+        self.last_fetch_stats: Dict[str, Dict] = {}
+        self.feed_cache = FeedCache(feed_cache_path)
+        self.cursor = FeedCursor(cursor_path)
     
     def _fetch_feed_with_timeout(self, url: str, timeout: int = 15) -> dict:
-        """使用 requests 获取 RSS，带超时控制"""
+        """使用 requests 获取 RSS，带超时控制
+
+        timeout 是该源的总时长上限：除了连接/读取超时外，
+        下载过程中超过截止时间也会放弃，避免慢速源长时间占用线程。
+        带上次的 ETag / Last-Modified 发起条件请求，304 时返回缓存的条目。
+        """
+        deadline = time.monotonic() + timeout
         try:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
-            response = requests.get(url, timeout=timeout, headers=headers)
-            response.raise_for_status()
-            return feedparser.parse(response.content)
+            headers.update(self.feed_cache.conditional_headers(url))
+            with requests.get(url, timeout=timeout, headers=headers, stream=True) as response:
+                if response.status_code == 304:
+                    return feedparser.FeedParserDict(entries=self.feed_cache.get_entries(url), not_modified=True)
+                response.raise_for_status()
+                chunks = []
+                for chunk in response.iter_content(chunk_size=65536):
+                    if time.monotonic() > deadline:
+                        raise requests.Timeout(f"exceeded {timeout}s deadline")
+                    chunks.append(chunk)
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+            feed = feedparser.parse(b''.join(chunks))
+            self.feed_cache.update(url, etag, last_modified, feed.get('entries', []))
+            return feed
         except requests.Timeout:
             print(f"    超时: {url[:50]}...")
-            return feedparser.FeedParserDict()
+            return feedparser.FeedParserDict(fetch_error='timeout')
         except requests.RequestException as e:
             print(f"    请求失败: {str(e)[:50]}")
-            return feedparser.FeedParserDict()
-    
-    def fetch_latest(self, hours=24, max_per_source=15) -> List[Dict]:
-        """获取最近N小时的新闻"""
+            return feedparser.FeedParserDict(fetch_error='error')
+
+    def _parse_entries(self, source: Dict, feed, cutoff_time: datetime, max_per_source: int) -> List[Dict]:
+        """把单个源的 feed 条目转换为统一的文章格式"""
         articles = []
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        success_count = 0
-        
-        for source in self.config.get('rss_sources', []):
+        for entry in feed.get('entries', [])[:max_per_source*2]:  # 多取一些以防过滤
+            if len(articles) >= max_per_source:
+                break
+
             try:
-                feed = self._fetch_feed_with_timeout(source['url'], timeout=15)
-                count = 0
-                
-                for entry in feed.entries[:max_per_source*2]:  # 多取一些以防过滤
-                    if count >= max_per_source:
-                        break
-                    
-                    try:
-                        published_parsed = None
-                        if hasattr(entry, 'published_parsed'):
-                            published_parsed = entry.published_parsed
-                        elif isinstance(entry, dict) and 'published_parsed' in entry:
-                            published_parsed = entry['published_parsed']
-                        if published_parsed:
-                            safe_defaults = (1970, 1, 1, 0, 0, 0)
-                            date_parts = []
-                            for value, fallback in zip(published_parsed[:6], safe_defaults):
-                                if isinstance(value, (int, float, str)):
-                                    try:
-                                        date_parts.append(int(value))
-                                    except (TypeError, ValueError):
-                                        date_parts.append(fallback)
-                                else:
-                                    date_parts.append(fallback)
-                            pub_date = datetime(*date_parts)
+                published_parsed = None
+                if hasattr(entry, 'published_parsed'):
+                    published_parsed = entry.published_parsed
+                elif isinstance(entry, dict) and 'published_parsed' in entry:
+                    published_parsed = entry['published_parsed']
+                if published_parsed:
+                    safe_defaults = (1970, 1, 1, 0, 0, 0)
+                    date_parts = []
+                    for value, fallback in zip(published_parsed[:6], safe_defaults):
+                        if isinstance(value, (int, float, str)):
+                            try:
+                                date_parts.append(int(value))
+                            except (TypeError, ValueError):
+                                date_parts.append(fallback)
                         else:
-                            pub_date = datetime.now()
-                    except Exception:
-                        pub_date = datetime.now()
-                    
-                    if pub_date < cutoff_time:
-                        continue
-                    
-                    # Normalize entry fields to avoid AttributeError/TypeError when values are missing
-                    title = getattr(entry, 'title', None)
-                    if not title:
-                        title = entry.get('title', 'Untitled')
-
-                    summary_value = (
-                        entry.get('summary')
-                        or getattr(entry, 'summary', None)
-                        or entry.get('description')
-                        or getattr(entry, 'description', None)
-                        or ''
-                    )
-                    if not isinstance(summary_value, str):
-                        summary_value = str(summary_value)
-
-                    url = getattr(entry, 'link', None) or entry.get('link', '')
-
-                    articles.append({
-                        'title': title,
-                        'content': summary_value[:1000],
-                        'source': source['name'],
-                        'category': source.get('category', 'general'),
-                        'url': url,
-                        'published_at': pub_date.isoformat()
-                    })
-                    count += 1
-                
-                if count > 0:
-                    success_count += 1
-                    
-            except Exception as e:
-                print(f"  ⚠ {source['name']}: {str(e)[:50]}")
-        
-        print(f"  ✓ 成功采集 {len(articles)} 条新闻 (来自 {success_count} 个源)")
+                            date_parts.append(fallback)
+                    pub_date = datetime(*date_parts)
+                else:
+                    pub_date = datetime.now()
+            except Exception:
+                pub_date = datetime.now()
+
+            if pub_date < cutoff_time:
+                continue
+
+            # Normalize entry fields to avoid AttributeError/TypeError when values are missing
+            title = getattr(entry, 'title', None)
+            if not title:
+                title = entry.get('title', 'Untitled')
+
+            summary_value = (
+                entry.get('summary')
+                or getattr(entry, 'summary', None)
+                or entry.get('description')
+                or getattr(entry, 'description', None)
+                or ''
+            )
+            if not isinstance(summary_value, str):
+                summary_value = str(summary_value)
+
+            url = getattr(entry, 'link', None) or entry.get('link', '')
+
+            articles.append({
+                'title': title,
+                'content': summary_value[:1000],
+                'source': source['name'],
+                'category': source.get('category', 'general'),
+                'url': url,
+                'published_at': pub_date.isoformat()
+            })
         return articles
 
+    def _fetch_source(self, source: Dict, cutoff_time: datetime, max_per_source: int,
+                      source_timeout: float, full_window: bool = False) -> Dict:
+        """抓取并解析单个源，返回文章和耗时（在线程池中执行）"""
+        started = time.monotonic()
+        try:
+            feed = self._fetch_feed_with_timeout(source['url'], timeout=source_timeout)
+            articles = self._parse_entries(source, feed, cutoff_time, max_per_source)
+            if not full_window:
+                articles = self.cursor.filter_new(source['name'], articles)
+            status = feed.get('fetch_error') or ('ok' if articles else 'empty')
+            if feed.get('not_modified'):
+                status = 'not_modified'
+            error = None
+        except Exception as e:
+            articles = []
+            status = 'error'
+            error = str(e)[:100]
+            print(f"  ⚠ {source['name']}: {str(e)[:50]}")
+        return {
+            'source': source['name'],
+            'articles': articles,
+            'status': status,
+            'error': error,
+            'latency': round(time.monotonic() - started, 3)
+        }
+
+    def iter_latest(self, hours=24, max_per_source=15, max_workers=None,
+                    source_timeout=None, global_timeout=None, full_window=False) -> Iterator[Dict]:
+        """并发抓取所有 RSS 源，按完成顺序逐个产出每个源的结果
+
+        - max_workers: 同时抓取的源数量上限
+        - source_timeout: 单个源的截止时间（秒）
+        - global_timeout: 整轮采集的截止时间（秒），到期后不再等待未完成的源
+        - full_window: True 时忽略增量游标，重新发出时间窗口内的全部条目（用于回补）
+
+        未在 global_timeout 内完成的源会以 status='timeout' 产出，articles 为空。
+        游标只暂存实际产出的条目：超时后才完成的线程结果被丢弃，不会被 commit 标记为已见。
+        """
+        fetch_config = self.config.get('fetch', {}) or {}
+        max_workers = max_workers or fetch_config.get('max_workers', DEFAULT_MAX_WORKERS)
+        source_timeout = source_timeout or fetch_config.get('source_timeout', DEFAULT_SOURCE_TIMEOUT)
+        global_timeout = global_timeout or fetch_config.get('global_timeout', DEFAULT_GLOBAL_TIMEOUT)
+
+        sources = self.config.get('rss_sources', [])
+        if not sources:
+            return
+
+        cutoff_time = datetime.now() - timedelta(hours=hours)
+        global_deadline = time.monotonic() + global_timeout
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(sources)),
+                                      thread_name_prefix='rss-fetch')
+        pending = {
+            executor.submit(self._fetch_source, source, cutoff_time, max_per_source,
+                            source_timeout, full_window): source
+            for source in sources
+        }
+        try:
+            while pending:
+                remaining = global_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    result = future.result()
+                    self.cursor.stage(result['source'], result['articles'])
+                    yield result
+        finally:
+            # 已在运行的线程受 source_timeout 约束，不在这里阻塞等待
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for source in pending.values():
+            yield {
+                'source': source['name'],
+                'articles': [],
+                'status': 'timeout',
+                'error': f'global deadline {global_timeout}s exceeded',
+                'latency': None
+            }
+
+    def fetch_latest(self, hours=24, max_per_source=15, max_workers=None,
+                     source_timeout=None, global_timeout=None, full_window=False) -> List[Dict]:
+        """获取最近N小时的新闻（并发抓取，总耗时约等于最慢的源）
+
+        默认只返回各源上次 commit_cursors 之后的新条目；full_window=True 时返回窗口内全部条目。
+        每个源的状态和耗时保存在 self.last_fetch_stats 中。
+        """
+        results = {}
+        self.last_fetch_stats = {}
+        for result in self.iter_latest(hours, max_per_source, max_workers, source_timeout,
+                                       global_timeout, full_window):
+            results[result['source']] = result['articles']
+            self.last_fetch_stats[result['source']] = {
+                'status': result['status'],
+                'latency': result['latency'],
+                'count': len(result['articles']),
+                'error': result['error']
+            }
+
+        self.feed_cache.save()
+
+        # 按配置顺序合并，保证输出稳定
+        articles = []
+        for source in self.config.get('rss_sources', []):
+            articles.extend(results.get(source['name'], []))
+
+        success_count = sum(1 for stats in self.last_fetch_stats.values() if stats['count'] > 0)
+        timeout_count = sum(1 for stats in self.last_fetch_stats.values() if stats['status'] == 'timeout')
+        cached_count = sum(1 for stats in self.last_fetch_stats.values() if stats['status'] == 'not_modified')
+        print(f"  ✓ 成功采集 {len(articles)} 条新闻 (来自 {success_count} 个源, {cached_count} 个源未更新)")
+        if timeout_count:
+            print(f"  ⚠ {timeout_count} 个源未在截止时间内完成")
+        slowest = sorted(
+            ((name, stats['latency']) for name, stats in self.last_fetch_stats.items() if stats['latency'] is not None),
+            key=lambda x: x[1], reverse=True
+        )[:3]
+        if slowest:
+            print("  最慢的源: " + ", ".join(f"{name} {latency:.1f}s" for name, latency in slowest))
+        return articles
+
+    def commit_cursors(self, exclude: Iterable[Dict] = ()):
+        """下游处理成功后调用，推进各源的增量游标；exclude 中的条目下次重新发出"""
+        self.cursor.commit(exclude)
+
     def fetch_stock_specific_news(self) -> List[Dict]:
         """获取用户自选股相关新闻"""
         my_stocks = self.user_config.get('my_stocks', [])
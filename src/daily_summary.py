@@ -1,16 +1,13 @@
 import os
-import glob
 from datetime import datetime, timedelta
 from typing import List, Dict
 from collections import Counter
+from database import get_reports_since, save_report, new_report_key
 
 class DailySummary:
-    def __init__(self):
-        self.reports_dir = "data/reports"
-        
     def generate_12h_summary(self) -> str:
         """生成过去12小时的摘要报告"""
-        # 获取过去12小时的报告文件
+        # 获取过去12小时的报告
         reports = self._get_recent_reports(hours=12)
         
         if not reports:
@@ -18,39 +15,26 @@ class DailySummary:
         
         # 解析所有报告
         all_news = []
-        for report_path in reports:
-            news_items = self._parse_report(report_path)
+        for report in reports:
+            news_items = self._parse_report(report)
             all_news.extend(news_items)
         
         # 生成摘要
         summary = self._create_summary(all_news, len(reports))
         return summary
     
-    def _get_recent_reports(self, hours: int) -> List[str]:
-        """获取最近N小时的报告文件"""
+    def _get_recent_reports(self, hours: int) -> List[Dict]:
+        """从 reports 表获取最近N小时的小时报告，按时间正序"""
         cutoff_time = datetime.now() - timedelta(hours=hours)
-        reports = glob.glob(os.path.join(self.reports_dir, "report_*.txt"))
-        
-        recent_reports = []
-        for report in reports:
-            filename = os.path.basename(report)
-            try:
-                time_str = filename.replace('report_', '').replace('.txt', '')
-                report_time = datetime.strptime(time_str, '%Y%m%d_%H%M%S')
-                if report_time >= cutoff_time:
-                    recent_reports.append(report)
-            except:
-                continue
-        
-        return sorted(recent_reports)
+        reports = get_reports_since('hourly', cutoff_time)
+        return [r for r in reversed(reports) if r.get('content')]
     
-    def _parse_report(self, report_path: str) -> List[Dict]:
-        """解析单个报告文件"""
+    def _parse_report(self, report: Dict) -> List[Dict]:
+        """解析单个报告的文本内容"""
         news_items = []
         
         try:
-            with open(report_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = report['content']
             
             # 提取重大事件部分
             if '【重大事件提醒】' in content:
@@ -83,7 +67,7 @@ class DailySummary:
                     news_items.append(current_event)
         
         except Exception as e:
-            print(f"解析报告失败 {report_path}: {e}")
+            print(f"解析报告失败 {report.get('report_key')}: {e}")
         
         return news_items
     
@@ -198,11 +182,16 @@ class DailySummary:
         return summary
     
     def save_summary(self, summary: str):
-        """保存摘要报告"""
+        """保存摘要报告（入库并导出为文本文件）"""
+        report_key = new_report_key('daily')
         os.makedirs('data/summaries', exist_ok=True)
-        filename = f"data/summaries/summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        filename = f"data/summaries/summary_{report_key}.txt"
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(summary)
+        try:
+            save_report('daily', summary, file_path=filename, report_key=report_key)
+        except Exception as e:
+            print(f"摘要入库失败: {e}")
         try:
             print(f"摘要已保存: {filename}")
         except:
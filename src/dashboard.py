@@ -0,0 +1,330 @@
+"""
+首页看板快照
+从最新小时简报文本解析出首页（/api/latest）所需的统计、情绪、推荐、预测和热点，
+main.py 生成报告后即发布一份可直接返回的 JSON 快照，Web 端读取快照而不必每次请求都解析报告。
+
+用法：
+    publish_dashboard(report_text, created_at, report_id)   # 报告入库后
+    snapshot = read_dashboard_snapshot(latest_report_id)    # Web 端：(body, etag) 或 None
+
+快照记录生成它的报告 id，Web 端只在与 reports 表中最新报告一致时使用快照；
+报告入库后快照发布失败、或两个进程的快照路径不一致时，快照落后于数据库，按最新报告现场组装。
+
+快照默认写在数据库文件（database.DB_PATH）同目录下，调用时才确定路径，
+测试和压测脚本重定向 DB_PATH 后快照随之进入临时目录，不会覆盖线上快照。
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import database
+
+
+def dashboard_snapshot_path() -> str:
+    """看板快照文件路径：DASHBOARD_SNAPSHOT_PATH，未设置时为数据库所在目录下的 dashboard.json
+
+    Web 端与报告生成进程需共享该路径
+    """
+    return os.getenv('DASHBOARD_SNAPSHOT_PATH') or os.path.join(os.path.dirname(database.DB_PATH), 'dashboard.json')
+
+
+def parse_report(content):
+    """解析报告内容"""
+    if not content:
+        return {}
+    
+    lines = content.split('\n')
+    data = {
+        'title': '',
+        'sentiment': {'overall': 0, 'cn': 0, 'us': 0},
+        'sentiment_label': {'overall': '中性', 'cn': '中性', 'us': '中性'},
+        'hot_topics': [],
+        'major_events': [],
+        'stocks': [],
+        'total_news': 0
+    }
+    
+    # 解析标题
+    for line in lines:
+        if '财经新闻每小时简报' in line:
+            data['title'] = line.strip()
+            break
+    
+    # 解析新闻数量
+    for line in lines:
+        if '共分析' in line and '条新闻' in line:
+            try:
+                data['total_news'] = int(line.split('共分析')[1].split('条')[0].strip())
+            except:
+                pass
+    
+    # 解析情绪
+    def get_sentiment_label(score):
+        if score > 0.3:
+            return '积极'
+        elif score < -0.3:
+            return '消极'
+        return '中性'
+    
+    for i, line in enumerate(lines):
+        if '整体情绪' in line:
+            try:
+                score = float(line.split('指数:')[1].split(')')[0].strip())
+                data['sentiment']['overall'] = score
+                data['sentiment_label']['overall'] = get_sentiment_label(score)
+            except:
+                pass
+        if '中国市场' in line:
+            try:
+                score = float(line.split('指数:')[1].split(')')[0].strip())
+                data['sentiment']['cn'] = score
+                data['sentiment_label']['cn'] = get_sentiment_label(score)
+            except:
+                pass
+        if '美国市场' in line:
+            try:
+                score = float(line.split('指数:')[1].split(')')[0].strip())
+                data['sentiment']['us'] = score
+                data['sentiment_label']['us'] = get_sentiment_label(score)
+            except:
+                pass
+    
+    # 解析热点
+    in_hot = False
+    for line in lines:
+        if '【热点追踪】' in line:
+            in_hot = True
+            continue
+        if in_hot and line.strip().startswith('•'):
+            topic = line.strip().replace('•', '').strip()
+            data['hot_topics'].append(topic)
+        if in_hot and '【重大事件' in line:
+            break
+
+    # 解析重大事件
+    if '【重大事件提醒】' in content:
+        # 使用 split 获取 【重大事件提醒】 和 【其他新闻】 之间的内容
+        # 如果 【其他新闻】 不存在，则取到文件末尾
+        try:
+            events_section = content.split('【重大事件提醒】')[1].split('【其他新闻')[0]
+            
+            event_lines = events_section.strip().split('\n')
+            current_event = {}
+            
+            for line in event_lines:
+                line = line.strip()
+                if not line:
+                    continue
+
+                if line.startswith('[') and ']' in line:
+                    # 当遇到新的 source，保存上一个事件
+                    if current_event:
+                        data['major_events'].append(current_event)
+                    current_event = {'source': line.split(']')[0][1:].strip()}
+                elif line.startswith('标题:'):
+                    current_event['title'] = line.replace('标题:', '').strip()
+                elif line.startswith('摘要:'):
+                    current_event['summary'] = line.replace('摘要:', '').strip()
+                elif line.startswith('情绪:'):
+                    sentiment_line = line.replace('情绪:', '').strip()
+                    parts = [p.strip() for p in sentiment_line.split('|')]
+                    current_event['sentiment_overall'] = parts[0] if len(parts) > 0 else '中性'
+                    current_event['sentiment_cn'] = parts[1].replace('中国:', '') if len(parts) > 1 else '中性'
+                    current_event['sentiment_us'] = parts[2].replace('美国:', '') if len(parts) > 2 else '中性'
+            
+            # 添加最后一个事件
+            if current_event and 'title' in current_event:
+                 data['major_events'].append(current_event)
+        except IndexError:
+            pass # Section not found
+    
+    # 解析股票影响
+    for i, line in enumerate(lines):
+        if '股票影响:' in line:
+            stocks_str = line.split('股票影响:')[1].strip()
+            for stock in stocks_str.split('|'):
+                stock = stock.strip()
+                if '(' in stock and ')' in stock:
+                    symbol = stock.split('(')[0].strip()
+                    name = stock.split('(')[1].split(')')[0]
+                    direction = '上涨' if '↑' in stock else '下跌' if '↓' in stock else '中性'
+                    data['stocks'].append({
+                        'symbol': symbol,
+                        'name': name,
+                        'direction': direction
+                    })
+    
+    return data
+
+
+def recommend_stocks(parsed: Dict) -> Dict:
+    """从解析结果中挑出看涨的A股/美股（各取前5）"""
+    a_stocks = []
+    us_stocks = []
+    
+    for stock in parsed.get('stocks', []):
+        if stock['direction'] == '上涨':
+            # 简单判断：数字开头的是A股代码
+            if stock['symbol'].isdigit():
+                a_stocks.append(stock)
+            else:
+                us_stocks.append(stock)
+    
+    return {
+        'a_stocks': a_stocks[:5],
+        'us_stocks': us_stocks[:5]
+    }
+
+def predict_markets(parsed: Dict) -> Dict:
+    """根据各市场情绪指数给出大盘走势预测"""
+    sentiment = parsed.get('sentiment', {})
+    
+    def predict_trend(score):
+        if score > 0.3:
+            return '上涨'
+        elif score < -0.3:
+            return '下跌'
+        else:
+            return '震荡'
+    
+    def predict(name, score):
+        return {
+            'name': name,
+            'sentiment': score,
+            'trend': predict_trend(score),
+            'icon': '↑' if score > 0.3 else '↓' if score < -0.3 else '→'
+        }
+    
+    return {
+        'china': predict('A股', sentiment.get('cn', 0)),
+        'us': predict('美股', sentiment.get('us', 0)),
+        'global': predict('全球', sentiment.get('overall', 0))
+    }
+
+def build_dashboard(content: Optional[str], timestamp: str, parsed: Dict = None) -> Dict:
+    """组装首页看板数据
+
+    content 为小时简报文本，timestamp 为报告生成时间（'YYYY-MM-DD HH:MM:SS'）；
+    parsed 为已解析的结果（可选，省去重复解析）
+    """
+    data = {
+        'timestamp': timestamp,
+        'stats': {
+            'total_news': 0,
+            'positive_news': 0,
+            'negative_news': 0
+        },
+        'sentiment': {
+            'score': 0,
+            'label': 'Neutral',
+            'breakdown': {'positive': 0, 'neutral': 0, 'negative': 0}
+        },
+        'recommendations': {'a_shares': [], 'us_shares': []},
+        'market_prediction': [],
+        'hot_topics': []
+    }
+
+    if not content:
+        return data
+
+    if parsed is None:
+        parsed = parse_report(content)
+    
+    # 填充统计数据
+    data['stats']['total_news'] = parsed.get('total_news', 0)
+    # 简单估算正负面新闻数量 based on sentiment
+    sentiment_score = parsed.get('sentiment', {}).get('overall', 0)
+    data['stats']['positive_news'] = int(data['stats']['total_news'] * (0.5 + sentiment_score/2)) if sentiment_score > 0 else int(data['stats']['total_news'] * 0.3)
+    
+    # 填充情绪数据
+    # 模拟 breakdown 数据，因为 parse_report 目前只返回单一数值
+    overall_score = parsed.get('sentiment', {}).get('overall', 0)
+    cn_score = parsed.get('sentiment', {}).get('cn', 0)
+    us_score = parsed.get('sentiment', {}).get('us', 0)
+    
+    pos_pct = int(50 + overall_score * 50)
+    neg_pct = int(20 - overall_score * 20)
+    neu_pct = 100 - pos_pct - neg_pct
+    
+    data['sentiment'] = {
+        'score': overall_score,
+        'label': parsed.get('sentiment_label', {}).get('overall', '中性'),
+        'breakdown': {
+            'cn': cn_score,
+            'us': us_score,
+            'positive': max(0, pos_pct),
+            'neutral': max(0, neu_pct),
+            'negative': max(0, neg_pct)
+        }
+    }
+    
+    # 填充推荐
+    recs = recommend_stocks(parsed)
+    data['recommendations'] = {
+        'a_shares': recs.get('a_stocks', []),
+        'us_shares': recs.get('us_stocks', [])
+    }
+    
+    # 填充预测
+    data['market_prediction'] = [
+        {'name': v['name'], 'icon': v['icon'], 'trend': v['trend'], 'sentiment': f"指数: {v['sentiment']}"}
+        for v in predict_markets(parsed).values()
+    ]
+    
+    # 填充热点
+    data['hot_topics'] = parsed.get('hot_topics', [])
+    
+    # Add raw content for display
+    data['content'] = content
+
+    return data
+
+def dump_dashboard(data: Dict) -> Tuple[bytes, str]:
+    """序列化看板数据，返回 (JSON 字节, 内容哈希 ETag)"""
+    body = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()
+
+def publish_dashboard(content: str, created_at: datetime, report_id: int, path: str = None) -> str:
+    """生成并原子写入看板快照（先写临时文件再替换），返回 ETag
+
+    report_id 为报告在 reports 表中的 id，与看板数据一起写入快照文件
+    """
+    path = path or dashboard_snapshot_path()
+    data = build_dashboard(content, created_at.strftime('%Y-%m-%d %H:%M:%S'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'report_id': report_id, 'dashboard': data}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return dump_dashboard(data)[1]
+
+# ((path, mtime_ns, size), report_id, body, etag)：快照文件未变化时直接返回内存中的内容
+_snapshot_cache = None
+
+def read_dashboard_snapshot(report_id: int, path: str = None) -> Optional[Tuple[bytes, str]]:
+    """读取看板快照，返回 (JSON 字节, ETag)
+
+    快照不存在、无法解析或不是由 report_id 这份报告生成时返回 None
+    """
+    global _snapshot_cache
+    path = path or dashboard_snapshot_path()
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    cached = _snapshot_cache
+    if not cached or cached[0] != key:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            body, etag = dump_dashboard(snapshot['dashboard'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        cached = _snapshot_cache = (key, snapshot.get('report_id'), body, etag)
+    if cached[1] != report_id:
+        return None
+    return cached[2], cached[3]
@@ -1,16 +1,24 @@
 """
 数据库模型和操作
-使用 SQLite 作为本地存储，方便开发和部署
-如需生产环境可切换到 PostgreSQL
+默认使用 SQLite 作为本地存储，方便开发和部署；
+生产环境设置 DATABASE_URL=postgresql://... 切换到 PostgreSQL（见 db_backends.py），函数签名不变
 """
 
 import sqlite3
 import json
 import os
-from datetime import datetime, timedelta
+import sys
+import glob
+import queue
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional
 from contextlib import contextmanager
 
+import db_backends
+from db_backends import StorageBackend, DB_BUSY_TIMEOUT_MS
+
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'finance.db')
 
 def get_db_path():
@@ -20,23 +28,60 @@ def get_db_path():
         os.makedirs(db_dir)
     return DB_PATH
 
+# 数据保留：超过 N 天的新闻正文移入按月压缩归档库，超过 M 天的整行从热表删除（情绪汇总表保留）
+NEWS_CONTENT_RETENTION_DAYS = int(os.getenv('NEWS_CONTENT_RETENTION_DAYS', '30'))
+NEWS_RETENTION_DAYS = int(os.getenv('NEWS_RETENTION_DAYS', '365'))
+ARCHIVE_DIR = os.getenv('NEWS_ARCHIVE_DIR')  # 默认为数据库同目录下的 archive/
+
+# 加密货币历史按分钟/小时/天分桶（桶键为 UTC 时间前缀，如 2025-01-01T08:30），分钟桶和小时桶定期清理，天桶永久保留
+CRYPTO_HISTORY_GRANULARITIES = {'minute': 16, 'hour': 13, 'day': 10}
+CRYPTO_MINUTE_RETENTION_DAYS = int(os.getenv('CRYPTO_MINUTE_RETENTION_DAYS', '2'))
+CRYPTO_HOUR_RETENTION_DAYS = int(os.getenv('CRYPTO_HOUR_RETENTION_DAYS', '90'))
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+
+def get_backend() -> StorageBackend:
+    """当前存储后端：DATABASE_URL 为 postgresql:// 时使用 PostgreSQL，否则使用 DB_PATH 的 SQLite"""
+    if DATABASE_URL.startswith(('postgres://', 'postgresql://')):
+        return db_backends.get_backend(DATABASE_URL)
+    return db_backends.get_backend(get_db_path())
+
+
 @contextmanager
 def get_connection():
-    """获取数据库连接的上下文管理器"""
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row  # 使查询结果可以用字段名访问
-    try:
+    """获取数据库连接的上下文管理器（从连接池借出，退出时归还）"""
+    with get_backend().connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+
+def close_connections():
+    """关闭所有连接池中的空闲连接"""
+    db_backends.close_all_backends()
+
+
+def _utc_now() -> str:
+    """与列默认值 CURRENT_TIMESTAMP 相同格式的 UTC 时间"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _utc_cutoff(**delta) -> str:
+    """N 小时/天之前的 UTC 时间，用于和 CURRENT_TIMESTAMP 写入的列比较"""
+    return (datetime.now(timezone.utc) - timedelta(**delta)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _utc_text(dt: datetime) -> str:
+    """本地时间（naive）或带时区的时间 -> UTC 'YYYY-MM-DD HH:MM:SS'"""
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
 
 def init_database():
     """初始化数据库表结构"""
+    backend = get_backend()
     with get_connection() as conn:
         cursor = conn.cursor()
         
         # 新闻表 - 存储采集的原始新闻
-        cursor.execute('''
+        cursor.execute(backend.ddl('''
             CREATE TABLE IF NOT EXISTS news (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 url_hash TEXT UNIQUE,
@@ -56,10 +101,10 @@ def init_database():
                 is_processed INTEGER DEFAULT 0,
                 related_stocks TEXT
             )
-        ''')
+        '''))
         
         # 报告表 - 存储生成的报告
-        cursor.execute('''
+        cursor.execute(backend.ddl('''
             CREATE TABLE IF NOT EXISTS reports (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 report_type TEXT NOT NULL,
@@ -76,10 +121,10 @@ def init_database():
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 file_path TEXT
             )
-        ''')
+        '''))
         
         # 自选股表
-        cursor.execute('''
+        cursor.execute(backend.ddl('''
             CREATE TABLE IF NOT EXISTS watchlist (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 symbol TEXT NOT NULL UNIQUE,
@@ -89,10 +134,10 @@ def init_database():
                 added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 is_active INTEGER DEFAULT 1
             )
-        ''')
+        '''))
         
         # 股票数据表 - 存储行情数据
-        cursor.execute('''
+        cursor.execute(backend.ddl('''
             CREATE TABLE IF NOT EXISTS stock_prices (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 symbol TEXT NOT NULL,
@@ -102,10 +147,10 @@ def init_database():
                 market_cap REAL,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
+        '''))
         
-        # 虚拟货币表
-        cursor.execute('''
+        # 虚拟货币快照表（v5 起只作为迁移来源，行情写入 crypto_latest 和 crypto_history_*）
+        cursor.execute(backend.ddl('''
             CREATE TABLE IF NOT EXISTS crypto_prices (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 symbol TEXT NOT NULL,
@@ -117,10 +162,10 @@ def init_database():
                 market_cap REAL,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
+        '''))
         
         # 热搜表
-        cursor.execute('''
+        cursor.execute(backend.ddl('''
             CREATE TABLE IF NOT EXISTS hot_searches (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 platform TEXT NOT NULL,
@@ -131,10 +176,10 @@ def init_database():
                 category TEXT,
                 collected_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
-        ''')
+        '''))
         
         # 预测记录表 - 用于回测
-        cursor.execute('''
+        cursor.execute(backend.ddl('''
             CREATE TABLE IF NOT EXISTS predictions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 symbol TEXT NOT NULL,
@@ -148,7 +193,37 @@ def init_database():
                 is_correct INTEGER,
                 verified_at DATETIME
             )
-        ''')
+        '''))
+        
+        # LLM 分析缓存表 - 按新闻哈希和提示词版本缓存深度分析结果
+        cursor.execute(backend.ddl('''
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                url_hash TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                analysis TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (url_hash, prompt_version)
+            )
+        '''))
+        
+        # 流水线阶段统计表 - 每次运行每个阶段一行（stage='total' 为整次运行）
+        cursor.execute(backend.ddl('''
+            CREATE TABLE IF NOT EXISTS pipeline_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                pipeline TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                label TEXT,
+                started_at DATETIME,
+                duration_ms REAL,
+                items INTEGER DEFAULT 0,
+                prompt_tokens INTEGER DEFAULT 0,
+                completion_tokens INTEGER DEFAULT 0,
+                status TEXT,
+                error TEXT,
+                detail TEXT
+            )
+        '''))
         
         # 创建索引
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_news_url_hash ON news(url_hash)')
@@ -159,11 +234,344 @@ def init_database():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_watchlist_symbol ON watchlist(symbol)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_hot_platform ON hot_searches(platform, collected_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_predictions_symbol ON predictions(symbol)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_cache_created ON analysis_cache(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pipeline_metrics_run ON pipeline_metrics(run_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pipeline_metrics_stage ON pipeline_metrics(pipeline, stage, started_at)')
         
         conn.commit()
+        apply_migrations(conn)
         print("✓ 数据库初始化完成")
 
 
+# ============== 结构迁移 ==============
+
+# 情绪汇总：bucket 为 published_at 的前 13 位（小时 YYYY-MM-DDTHH）或前 10 位（天 YYYY-MM-DD）
+_ROLLUP_INSERT_SQL = '''
+    INSERT INTO news_sentiment_{granularity}
+    (bucket, news_count, processed_count, sentiment_overall, sentiment_cn, sentiment_us, high_impact_count)
+    SELECT replace(substr(published_at, 1, {width}), ' ', 'T') AS bucket,
+           COUNT(*),
+           SUM(is_processed),
+           AVG(CASE WHEN is_processed = 1 THEN sentiment_overall END),
+           AVG(CASE WHEN is_processed = 1 THEN sentiment_cn END),
+           AVG(CASE WHEN is_processed = 1 THEN sentiment_us END),
+           SUM(CASE WHEN impact_level = '高' THEN 1 ELSE 0 END)
+    FROM news
+    WHERE published_at IS NOT NULL AND published_at != '' AND {where}
+    GROUP BY bucket
+'''
+
+# 报告入库之前各类报告只导出为文件（目录相对 data/）：(类型, 目录, 文件名前缀, 扩展名)
+_REPORT_FILES = [
+    ('hourly', 'reports', 'report', '.txt'),
+    ('hourly', 'reports_json', 'report', '.json'),
+    ('daily', 'summaries', 'summary', '.txt'),
+    ('weekly', 'weekly', 'analysis', '.json'),
+    ('monthly', 'monthly', 'analysis', '.json'),
+]
+
+def _import_report_files(conn):
+    """把 data/ 下已有的报告文件导入 reports 表，已存在的 (类型, 报告键) 跳过"""
+    data_dir = os.path.dirname(DB_PATH)
+    root = os.path.dirname(data_dir)
+    reports = {}  # (类型, 报告键) -> {'content', 'data', 'file_path', 'created_at'}
+    for report_type, subdir, prefix, ext in _REPORT_FILES:
+        for path in glob.glob(os.path.join(data_dir, subdir, f'{prefix}_*{ext}')):
+            key = os.path.basename(path)[len(prefix) + 1:-len(ext)]
+            try:
+                created_at = datetime.strptime(key, '%Y%m%d_%H%M%S')
+            except ValueError:
+                created_at = datetime.fromtimestamp(os.path.getmtime(path))
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = json.load(f) if ext == '.json' else f.read()
+            except Exception as e:
+                print(f"  导入报告文件失败 {path}: {e}")
+                continue
+            # 小时报告的 txt 和 json 分别取时间戳，可能相差一两秒，合并到同一份报告
+            if report_type == 'hourly' and ext == '.json':
+                gaps = {k: abs((r['created_at'] - created_at).total_seconds())
+                        for (t, k), r in reports.items() if t == 'hourly' and r['data'] is None}
+                nearest = min(gaps, key=gaps.get, default=None)
+                if nearest is not None and gaps[nearest] <= 60:
+                    key = nearest
+            report = reports.setdefault((report_type, key), {
+                'content': None, 'data': None, 'file_path': os.path.relpath(path, root), 'created_at': created_at})
+            if ext == '.json':
+                report['data'] = payload
+                if report['content'] is None and report_type != 'hourly':
+                    report['content'] = json.dumps(payload, ensure_ascii=False)
+            else:
+                report['content'] = payload
+                report['file_path'] = os.path.relpath(path, root)
+    if not reports:
+        return
+    rows = [_report_row(report_type, r['content'], None, r['file_path'], key, r['data'], r['created_at'])
+            for (report_type, key), r in sorted(reports.items(), key=lambda item: item[1]['created_at'])]
+    conn.executemany(get_backend().insert_ignore_sql('reports', _REPORT_COLUMNS, ('report_type', 'report_key')), rows)
+    print(f"  ✓ 已导入 {len(rows)} 份历史报告文件")
+
+_CRYPTO_LATEST_COLUMNS = ('symbol', 'name', 'price_usd', 'price_cny', 'change_24h',
+                          'volume_24h', 'market_cap', 'updated_at')
+
+# 每个币种一行，采集时整行覆盖
+_CRYPTO_LATEST_DDL = '''CREATE TABLE IF NOT EXISTS crypto_latest (
+    symbol TEXT PRIMARY KEY,
+    name TEXT,
+    price_usd REAL,
+    price_cny REAL,
+    change_24h REAL,
+    volume_24h REAL,
+    market_cap REAL,
+    updated_at DATETIME
+)'''
+
+def _crypto_history_ddl(granularity: str, suffix: str = '') -> str:
+    # 每个 (币种, 桶) 一行 OHLC，按主键聚簇存放，同一币种的历史是连续的一段
+    return f'''CREATE TABLE IF NOT EXISTS crypto_history_{granularity} (
+        symbol TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume_24h REAL,
+        samples INTEGER DEFAULT 1,
+        PRIMARY KEY (symbol, bucket)
+    ){suffix}'''
+
+def _crypto_history_buckets(rows) -> Dict[str, Dict[tuple, list]]:
+    """把按时间排序的 (symbol, timestamp, price, volume) 聚合成各粒度的 {(symbol, bucket): [o, h, l, c, volume, n]}"""
+    buckets = {granularity: {} for granularity in CRYPTO_HISTORY_GRANULARITIES}
+    for symbol, timestamp, price, volume in rows:
+        for granularity, width in CRYPTO_HISTORY_GRANULARITIES.items():
+            key = (symbol, timestamp[:width].replace(' ', 'T'))
+            bucket = buckets[granularity].get(key)
+            if bucket is None:
+                buckets[granularity][key] = [price, price, price, price, volume, 1]
+            else:
+                bucket[1] = max(bucket[1], price)
+                bucket[2] = min(bucket[2], price)
+                bucket[3] = price
+                bucket[4] = volume
+                bucket[5] += 1
+    return buckets
+
+def _seed_crypto_store(conn):
+    """用 crypto_prices 中已有的快照生成最新价表和分桶历史"""
+    rows = conn.execute('''
+        SELECT symbol, name, price_usd, price_cny, change_24h, volume_24h, market_cap, timestamp
+        FROM crypto_prices WHERE price_usd IS NOT NULL AND timestamp IS NOT NULL ORDER BY id
+    ''').fetchall()
+    if not rows:
+        return
+    backend = get_backend()
+    latest = {row['symbol']: tuple(row[c] for c in _CRYPTO_LATEST_COLUMNS[:-1]) + (row['timestamp'],)
+              for row in rows}
+    conn.executemany(backend.upsert_sql('crypto_latest', _CRYPTO_LATEST_COLUMNS, ('symbol',)),
+                     list(latest.values()))
+    buckets = _crypto_history_buckets(
+        (row['symbol'], str(row['timestamp']), row['price_usd'], row['volume_24h']) for row in rows)
+    for granularity, values in buckets.items():
+        conn.executemany(
+            f'INSERT INTO crypto_history_{granularity} '
+            '(symbol, bucket, open, high, low, close, volume_24h, samples) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [key + tuple(value) for key, value in values.items()])
+
+# 按版本号顺序执行，已执行的版本记录在 schema_migrations 表中；只能追加新版本，不要修改已发布的版本
+# 语句按 SQLite 写法，建表类型由后端转换；方言差异较大的版本用 {'sqlite': [...], 'postgres': [...]}
+# 语句也可以是函数 fn(conn)，用于数据迁移，和同版本的 DDL 在同一事务中执行
+_NEWS_FTS_DDL = [
+    # 外部内容表：只存倒排索引，正文仍在 news 表，rowid 即 news.id
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS news_fts USING fts5(
+        title, summary, content, content='news', content_rowid='id', tokenize='trigram'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS news_fts_insert AFTER INSERT ON news BEGIN
+        INSERT INTO news_fts(rowid, title, summary, content)
+        VALUES (new.id, new.title, new.summary, new.content);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS news_fts_delete AFTER DELETE ON news BEGIN
+        INSERT INTO news_fts(news_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, old.title, old.summary, old.content);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS news_fts_update AFTER UPDATE OF title, summary, content ON news BEGIN
+        INSERT INTO news_fts(news_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, old.title, old.summary, old.content);
+        INSERT INTO news_fts(rowid, title, summary, content)
+        VALUES (new.id, new.title, new.summary, new.content);
+    END''',
+    "INSERT INTO news_fts(news_fts) VALUES ('rebuild')",
+]
+
+def _fts_trigram_supported(conn) -> bool:
+    """当前 SQLite 是否编译了 FTS5 且支持 trigram 分词器（SQLite >= 3.34）"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='trigram')")
+        conn.execute('DROP TABLE temp.fts_probe')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def _create_news_fts(conn):
+    """建立新闻全文索引；SQLite 不支持 FTS5 trigram 时跳过，search_news 退化为 LIKE 检索"""
+    if not _fts_trigram_supported(conn):
+        print(f"  ⚠ SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram 分词（需要 3.34+），"
+              f"跳过全文索引，新闻检索使用 LIKE")
+        return
+    for statement in _NEWS_FTS_DDL:
+        conn.execute(statement)
+
+def _has_news_fts(conn) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'news_fts'"
+    ).fetchone() is not None
+
+MIGRATIONS = [
+    (1, '热点查询的二级索引', [
+        # get_unprocessed_news: 只索引未处理的新闻，处理完自动移出索引
+        'CREATE INDEX IF NOT EXISTS idx_news_unprocessed ON news(published_at) WHERE is_processed = 0',
+        # get_recent_news(source=...): 等值列在前、范围列在后
+        'CREATE INDEX IF NOT EXISTS idx_news_source_published ON news(source, published_at)',
+        # get_latest_hot_searches(platform=None)
+        'CREATE INDEX IF NOT EXISTS idx_hot_collected ON hot_searches(collected_at, rank)',
+        # get_crypto_prices
+        'CREATE INDEX IF NOT EXISTS idx_crypto_timestamp ON crypto_prices(timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_crypto_symbol_timestamp ON crypto_prices(symbol, timestamp)',
+        # get_reports(report_type=...): 避免按 created_at 临时排序
+        'CREATE INDEX IF NOT EXISTS idx_reports_type_created ON reports(report_type, created_at)',
+        # get_prediction_accuracy
+        'CREATE INDEX IF NOT EXISTS idx_predictions_symbol_predicted ON predictions(symbol, predicted_at)',
+        'CREATE INDEX IF NOT EXISTS idx_predictions_predicted ON predictions(predicted_at)',
+        # idx_news_source 被 (source, published_at) 覆盖
+        'DROP INDEX IF EXISTS idx_news_source',
+        'ANALYZE',
+    ]),
+    (2, '新闻全文检索（FTS5 trigram，中英文混合）', {'sqlite': [
+        _create_news_fts,
+    ], 'postgres': [
+        # PostgreSQL 用 pg_trgm 的 GIN 索引加速 ILIKE
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        'CREATE INDEX IF NOT EXISTS idx_news_title_trgm ON news USING gin (title gin_trgm_ops)',
+        'CREATE INDEX IF NOT EXISTS idx_news_summary_trgm ON news USING gin (summary gin_trgm_ops)',
+        'CREATE INDEX IF NOT EXISTS idx_news_content_trgm ON news USING gin (content gin_trgm_ops)',
+    ]}),
+    (3, '新闻归档标记和情绪汇总表', [
+        'ALTER TABLE news ADD COLUMN archived_at DATETIME',
+        'CREATE INDEX IF NOT EXISTS idx_news_unarchived ON news(published_at) WHERE archived_at IS NULL',
+        *[f'''CREATE TABLE IF NOT EXISTS news_sentiment_{granularity} (
+            bucket TEXT PRIMARY KEY,
+            news_count INTEGER DEFAULT 0,
+            processed_count INTEGER DEFAULT 0,
+            sentiment_overall REAL,
+            sentiment_cn REAL,
+            sentiment_us REAL,
+            high_impact_count INTEGER DEFAULT 0
+        )''' for granularity in ('hourly', 'daily')],
+        # 用现有数据建立初始汇总
+        *[_ROLLUP_INSERT_SQL.format(granularity=granularity, width=width, where='1 = 1')
+          for granularity, width in (('hourly', 13), ('daily', 10))],
+    ]),
+    (4, '报告入库：报告键、结构化数据，导入历史报告文件', [
+        # report_key 即导出文件名中的时间戳，前端按它查询单份报告
+        'ALTER TABLE reports ADD COLUMN report_key TEXT',
+        'ALTER TABLE reports ADD COLUMN data TEXT',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_type_key ON reports(report_type, report_key)',
+        _import_report_files,
+    ]),
+    (5, '加密货币最新价表和分钟/小时/天分桶历史', {
+        'sqlite': [
+            _CRYPTO_LATEST_DDL,
+            # WITHOUT ROWID：行直接存在主键 B 树里，按 (symbol, bucket) 范围读取只访问连续的页
+            *[_crypto_history_ddl(granularity, ' WITHOUT ROWID') for granularity in CRYPTO_HISTORY_GRANULARITIES],
+            _seed_crypto_store,
+        ],
+        'postgres': [
+            _CRYPTO_LATEST_DDL,
+            *[_crypto_history_ddl(granularity) for granularity in CRYPTO_HISTORY_GRANULARITIES],
+            _seed_crypto_store,
+        ],
+    }),
+]
+
+def apply_migrations(conn) -> List[int]:
+    """执行尚未应用的迁移，每个版本一个事务，返回本次执行的版本号"""
+    backend = get_backend()
+    conn.execute(backend.ddl('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    '''))
+    conn.commit()
+    applied = {row['version'] for row in conn.execute('SELECT version FROM schema_migrations').fetchall()}
+    executed = []
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        if isinstance(statements, dict):
+            statements = statements[backend.name]
+        try:
+            backend.begin(conn)
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(backend.ddl(statement))
+            conn.execute('INSERT INTO schema_migrations (version, description) VALUES (?, ?)',
+                         (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"  ✓ 数据库迁移 v{version}: {description}")
+        executed.append(version)
+    return executed
+
+
+# 热点查询及示例参数，用于检查执行计划（SQL 与下方对应函数保持一致）
+HOT_QUERIES = {
+    'get_unprocessed_news': lambda: (_UNPROCESSED_NEWS_SQL, (100,)),
+    'get_recent_news': lambda: _recent_news_query('2000-01-01'),
+    'get_recent_news(source)': lambda: _recent_news_query('2000-01-01', 'reuters'),
+    'get_latest_hot_searches': lambda: _latest_hot_searches_query(None, '2000-01-01 00:00:00', 50),
+    'get_latest_hot_searches(platform)': lambda: _latest_hot_searches_query('weibo', '2000-01-01 00:00:00', 50),
+    # 不带 symbols 的 get_crypto_prices 读取整张 crypto_latest（每个币种一行），不在检查之列
+    'get_crypto_prices(symbols)': lambda: _crypto_prices_query(['BTC', 'ETH'], '2000-01-01 00:00:00'),
+    'get_crypto_history': lambda: _crypto_history_query('BTC', 'hour', None, None),
+    'get_reports(type)': lambda: _reports_query('daily', 20, 0),
+    'get_reports(types)': lambda: _reports_query(['hourly', 'daily', 'weekly'], 20, 0),
+    'get_reports_after': lambda: (_REPORTS_AFTER_SQL, (0,)),
+    'get_reports_since': lambda: _reports_since_query('hourly', '2000-01-01 00:00:00', None),
+    'get_report_by_key': lambda: (_REPORT_BY_KEY_SQL, ('weekly', '20251115_221203')),
+    'get_prediction_accuracy(symbol)': lambda: _prediction_accuracy_query('AAPL', '2000-01-01'),
+    'get_prediction_accuracy': lambda: _prediction_accuracy_query(None, '2000-01-01'),
+}
+
+def explain_query(conn, sql: str, params: tuple = ()) -> List[str]:
+    """返回 EXPLAIN QUERY PLAN 的每一步描述"""
+    return [row['detail'] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+def check_query_plans() -> Dict[str, List[str]]:
+    """检查热点查询是否退化为全表扫描，返回 {查询名: 执行计划}，仅包含有问题的查询（仅 SQLite）
+
+    HOT_QUERIES 的每一项用查询函数自身的 SQL 构造函数生成语句，查询改动后检查随之生效
+    """
+    if get_backend().name != 'sqlite':
+        raise RuntimeError('执行计划检查只支持 SQLite 后端')
+    problems = {}
+    with get_connection() as conn:
+        tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for name, build in HOT_QUERIES.items():
+            sql, params = build()
+            plan = explain_query(conn, sql, params)
+            # 'SCAN news' 是全表扫描；'SCAN news USING INDEX ...' 是按索引顺序读取；子查询结果的 SCAN 不算
+            if any(step.startswith('SCAN ') and ' USING ' not in step
+                   and step.split()[1] in tables for step in plan):
+                problems[name] = plan
+    return problems
+
+
 # ============== 新闻相关操作 ==============
 
 def get_news_hash(url: str, title: str) -> str:
@@ -172,142 +580,706 @@ def get_news_hash(url: str, title: str) -> str:
     content = f"{url}{title}"
     return hashlib.md5(content.encode()).hexdigest()
 
-def insert_news(news_list: List[Dict]) -> int:
-    """批量插入新闻，返回新增数量"""
-    inserted = 0
+def bulk_insert_news(news_list: List[Dict]) -> Dict[str, int]:
+    """批量导入新闻：一次计算哈希，单事务写入（SQLite executemany / PostgreSQL COPY）
+
+    返回 {'inserted': 新增数, 'ignored': 已存在或批内重复被忽略的数量}
+    """
+    if not news_list:
+        return {'inserted': 0, 'ignored': 0}
+    now = datetime.now().isoformat()
+    rows = [(
+        get_news_hash(news.get('url', ''), news.get('title', '')),
+        news.get('title', ''),
+        news.get('content', ''),
+        news.get('source', ''),
+        news.get('category', ''),
+        news.get('url', ''),
+        news.get('published_at') or now
+    ) for news in news_list]
     with get_connection() as conn:
-        cursor = conn.cursor()
-        for news in news_list:
-            url_hash = get_news_hash(news.get('url', ''), news.get('title', ''))
-            try:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO news 
-                    (url_hash, title, content, source, category, url, published_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    url_hash,
-                    news.get('title', ''),
-                    news.get('content', ''),
-                    news.get('source', ''),
-                    news.get('category', ''),
-                    news.get('url', ''),
-                    news.get('published_at', datetime.now().isoformat())
-                ))
-                if cursor.rowcount > 0:
-                    inserted += 1
-            except Exception as e:
-                print(f"插入新闻失败: {e}")
+        inserted = get_backend().bulk_insert(
+            conn, 'news', ('url_hash', 'title', 'content', 'source', 'category', 'url', 'published_at'),
+            rows, conflict=('url_hash',)
+        )
         conn.commit()
-    return inserted
+    return {'inserted': inserted, 'ignored': len(rows) - inserted}
+
+def insert_news(news_list: List[Dict]) -> int:
+    """批量插入新闻，返回新增数量"""
+    return bulk_insert_news(news_list)['inserted']
+
+_UNPROCESSED_NEWS_SQL = 'SELECT * FROM news WHERE is_processed = 0 ORDER BY published_at DESC LIMIT ?'
 
 def get_unprocessed_news(limit: int = 100) -> List[Dict]:
     """获取未处理的新闻"""
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM news WHERE is_processed = 0 
-            ORDER BY published_at DESC LIMIT ?
-        ''', (limit,))
+        cursor.execute(_UNPROCESSED_NEWS_SQL, (limit,))
         return [dict(row) for row in cursor.fetchall()]
 
-def update_news_analysis(news_id: int, analysis: Dict):
-    """更新新闻的AI分析结果"""
+def _analysis_row(analysis: Dict) -> tuple:
+    """分析结果 -> UPDATE 参数（兼容 process_batch 输出的 sentiment / stock_impact 字段名）"""
+    return (
+        analysis.get('summary', ''),
+        analysis.get('sentiment_overall', analysis.get('sentiment', 0)),
+        analysis.get('sentiment_cn', 0),
+        analysis.get('sentiment_us', 0),
+        analysis.get('impact_level', ''),
+        analysis.get('event_type', ''),
+        json.dumps(analysis.get('related_stocks', analysis.get('stock_impact', [])), ensure_ascii=False)
+    )
+
+_UPDATE_ANALYSIS_SQL = '''
+    UPDATE news SET 
+        summary = ?,
+        sentiment_overall = ?,
+        sentiment_cn = ?,
+        sentiment_us = ?,
+        impact_level = ?,
+        event_type = ?,
+        related_stocks = ?,
+        is_processed = 1
+    WHERE {key} = ?
+'''
+
+def update_news_analyses(analyses: List[Dict]) -> int:
+    """批量写入AI分析结果（单事务 executemany），返回更新行数
+
+    带 id 的按主键更新，否则按 url/title 计算的 url_hash 更新，可直接传入 process_batch 的输出
+    """
+    by_id, by_hash = [], []
+    for analysis in analyses:
+        row = _analysis_row(analysis)
+        if analysis.get('id') is not None:
+            by_id.append(row + (analysis['id'],))
+        else:
+            by_hash.append(row + (get_news_hash(analysis.get('url', ''), analysis.get('title', '')),))
+    if not by_id and not by_hash:
+        return 0
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE news SET 
-                summary = ?,
-                sentiment_overall = ?,
-                sentiment_cn = ?,
-                sentiment_us = ?,
-                impact_level = ?,
-                event_type = ?,
-                related_stocks = ?,
-                is_processed = 1
-            WHERE id = ?
-        ''', (
-            analysis.get('summary', ''),
-            analysis.get('sentiment_overall', 0),
-            analysis.get('sentiment_cn', 0),
-            analysis.get('sentiment_us', 0),
-            analysis.get('impact_level', ''),
-            analysis.get('event_type', ''),
-            json.dumps(analysis.get('related_stocks', []), ensure_ascii=False),
-            news_id
-        ))
+        updated = 0
+        if by_id:
+            updated += conn.executemany(_UPDATE_ANALYSIS_SQL.format(key='id'), by_id).rowcount
+        if by_hash:
+            updated += conn.executemany(_UPDATE_ANALYSIS_SQL.format(key='url_hash'), by_hash).rowcount
         conn.commit()
+    return updated
+
+def update_news_analysis(news_id: int, analysis: Dict):
+    """更新新闻的AI分析结果"""
+    update_news_analyses([{**analysis, 'id': news_id}])
+
+
+class AnalysisWriter:
+    """后台写入线程：submit() 只入队立即返回，积压的结果合并成一次 update_news_analyses 写入
+
+    用于深度分析阶段，每个批次完成后提交，数据库写入不占用 LLM 调用的关键路径
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='analysis-writer', daemon=True)
+        self._thread.start()
+        self.written = 0
+        self.errors = 0
+
+    def submit(self, analyses: List[Dict]):
+        if analyses:
+            self._queue.put(list(analyses))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batches = [item]
+            # 把已积压的批次一起取出，合并为一个事务
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = [a for batch in batches if batch is not None for a in batch]
+            try:
+                if pending:
+                    self.written += update_news_analyses(pending)
+            except Exception as e:
+                self.errors += 1
+                print(f"  ⚠ 写入分析结果失败: {e}")
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+            if any(batch is None for batch in batches):
+                return
+
+    def flush(self):
+        """等待已提交的结果全部写入"""
+        self._queue.join()
+
+    def close(self):
+        """写完剩余结果后停止后台线程"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+def _recent_news_query(cutoff: str, source: str = None) -> tuple:
+    if source:
+        return ('SELECT * FROM news WHERE published_at > ? AND source = ? ORDER BY published_at DESC',
+                (cutoff, source))
+    return 'SELECT * FROM news WHERE published_at > ? ORDER BY published_at DESC', (cutoff,)
 
 def get_recent_news(hours: int = 24, source: str = None) -> List[Dict]:
     """获取最近N小时的新闻"""
     with get_connection() as conn:
         cursor = conn.cursor()
         cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
-        
-        if source:
-            cursor.execute('''
-                SELECT * FROM news WHERE published_at > ? AND source = ?
-                ORDER BY published_at DESC
-            ''', (cutoff, source))
-        else:
-            cursor.execute('''
-                SELECT * FROM news WHERE published_at > ?
-                ORDER BY published_at DESC
-            ''', (cutoff,))
-        
+        cursor.execute(*_recent_news_query(cutoff, source))
         return [dict(row) for row in cursor.fetchall()]
 
+def search_news(query: str, since: str = None, limit: int = 50) -> List[Dict]:
+    """全文检索新闻标题/摘要/正文，按相关度排序
 
-# ============== 报告相关操作 ==============
+    query 按空白拆成多个词，全部命中才返回（AND）。trigram 分词要求词长至少 3 个字符，
+    更短的词（如两个汉字的"苹果"）退化为 LIKE 过滤。since 为 ISO 时间，只返回之后发布的新闻。
+    PostgreSQL 后端全部用 ILIKE（pg_trgm 索引加速），按发布时间排序；
+    SQLite 不支持 trigram 而未建全文索引时也全部用 LIKE。
+    """
+    terms = [t for t in (query or '').split() if t]
+    if not terms:
+        return []
+    if get_backend().name == 'postgres':
+        long_terms, short_terms, like = [], terms, 'ILIKE'
+    else:
+        with get_connection() as conn:
+            has_fts = _has_news_fts(conn)
+        long_terms = [t for t in terms if len(t) >= 3] if has_fts else []
+        short_terms = [t for t in terms if len(t) < 3] if has_fts else terms
+        like = 'LIKE'
+
+    conditions, params = [], []
+    if long_terms:
+        conditions.append('news_fts MATCH ?')
+        params.append(' '.join('"' + t.replace('"', '""') + '"' for t in long_terms))
+    for term in short_terms:
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append(f"(news.title {like} ? ESCAPE '\\' OR news.summary {like} ? ESCAPE '\\' "
+                          f"OR news.content {like} ? ESCAPE '\\')")
+        params.extend([pattern] * 3)
+    if since:
+        conditions.append('news.published_at > ?')
+        params.append(since)
+
+    if long_terms:
+        sql = f'''
+            SELECT news.*, bm25(news_fts) AS rank FROM news_fts
+            JOIN news ON news.id = news_fts.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY rank, news.published_at DESC LIMIT ?
+        '''
+    else:
+        sql = f'''
+            SELECT news.*, 0 AS rank FROM news
+            WHERE {' AND '.join(conditions)}
+            ORDER BY news.published_at DESC LIMIT ?
+        '''
+    params.append(limit)
+    with get_connection() as conn:
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+
+# ============== 数据保留与情绪汇总 ==============
+
+def refresh_sentiment_rollups(since: str = None) -> int:
+    """重算 since（ISO 时间）之后的小时/天情绪汇总，since 为空时全量重建，返回写入的小时桶数
+
+    只应对仍在热表中的时间段调用：已从 news 删除的旧数据，其汇总行保持不变。
+    """
+    with get_connection() as conn:
+        changes = {}
+        for granularity, width in (('hourly', 13), ('daily', 10)):
+            if since:
+                bucket = since.replace(' ', 'T')[:width]
+                conn.execute(f'DELETE FROM news_sentiment_{granularity} WHERE bucket >= ?', (bucket,))
+                sql = _ROLLUP_INSERT_SQL.format(granularity=granularity, width=width, where='published_at >= ?')
+                params = (bucket,)
+            else:
+                conn.execute(f'DELETE FROM news_sentiment_{granularity}')
+                sql = _ROLLUP_INSERT_SQL.format(granularity=granularity, width=width, where='1 = 1')
+                params = ()
+            changes[granularity] = conn.execute(sql, params).rowcount
+        conn.commit()
+    return changes['hourly']
+
+def get_sentiment_rollup(granularity: str = 'daily', since: str = None, until: str = None) -> List[Dict]:
+    """读取预聚合的情绪走势（granularity: hourly / daily），按时间升序"""
+    if granularity not in ('hourly', 'daily'):
+        raise ValueError(f"不支持的粒度: {granularity}")
+    width = 13 if granularity == 'hourly' else 10
+    conditions, params = [], []
+    if since:
+        conditions.append('bucket >= ?')
+        params.append(since.replace(' ', 'T')[:width])
+    if until:
+        conditions.append('bucket <= ?')
+        params.append(until.replace(' ', 'T')[:width])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    with get_connection() as conn:
+        cursor = conn.execute(f'SELECT * FROM news_sentiment_{granularity} {where} ORDER BY bucket', params)
+        return [dict(row) for row in cursor.fetchall()]
+
+def _archive_dir() -> str:
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(get_db_path()), 'archive')
+
+def _archive_path(month: str) -> str:
+    return os.path.join(_archive_dir(), f'news_{month}.db')
+
+def _open_archive(month: str) -> sqlite3.Connection:
+    """打开（必要时创建）某月的归档库，正文以 zlib 压缩存储"""
+    os.makedirs(_archive_dir(), exist_ok=True)
+    conn = sqlite3.connect(_archive_path(month), timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS news_archive (
+            url_hash TEXT PRIMARY KEY,
+            news_id INTEGER,
+            title TEXT,
+            summary TEXT,
+            source TEXT,
+            category TEXT,
+            url TEXT,
+            published_at DATETIME,
+            collected_at DATETIME,
+            sentiment_overall REAL,
+            sentiment_cn REAL,
+            sentiment_us REAL,
+            impact_level TEXT,
+            event_type TEXT,
+            related_stocks TEXT,
+            content BLOB
+        )
+    ''')
+    return conn
+
+def archive_old_news(content_days: int = NEWS_CONTENT_RETENTION_DAYS, chunk_size: int = 1000) -> Dict[str, int]:
+    """把发布超过 content_days 天的新闻写入按月归档库，并清空热表中的正文
 
-def save_report(report_type: str, content: str, parsed_data: Dict, file_path: str = None) -> int:
-    """保存报告到数据库"""
+    先提交归档库再更新热表，中途失败最多导致下次重复归档（INSERT OR IGNORE），不会丢数据。
+    """
+    cutoff = (datetime.now() - timedelta(days=content_days)).isoformat()
+    archived = 0
+    months = set()
+    while True:
+        with get_connection() as conn:
+            rows = [dict(row) for row in conn.execute('''
+                SELECT * FROM news WHERE archived_at IS NULL AND published_at < ?
+                ORDER BY published_at LIMIT ?
+            ''', (cutoff, chunk_size)).fetchall()]
+        if not rows:
+            break
+        by_month: Dict[str, List[Dict]] = {}
+        for row in rows:
+            by_month.setdefault((row['published_at'] or '')[:7] or 'unknown', []).append(row)
+        for month, month_rows in by_month.items():
+            archive = _open_archive(month)
+            try:
+                archive.executemany('''
+                    INSERT OR IGNORE INTO news_archive
+                    (url_hash, news_id, title, summary, source, category, url, published_at, collected_at,
+                     sentiment_overall, sentiment_cn, sentiment_us, impact_level, event_type, related_stocks, content)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(
+                    r['url_hash'], r['id'], r['title'], r['summary'], r['source'], r['category'], r['url'],
+                    r['published_at'], r['collected_at'], r['sentiment_overall'], r['sentiment_cn'],
+                    r['sentiment_us'], r['impact_level'], r['event_type'], r['related_stocks'],
+                    zlib.compress((r['content'] or '').encode('utf-8'))
+                ) for r in month_rows])
+                archive.commit()
+            finally:
+                archive.close()
+            months.add(month)
+        with get_connection() as conn:
+            conn.executemany(
+                'UPDATE news SET content = NULL, archived_at = ? WHERE id = ?',
+                [(_utc_now(), r['id']) for r in rows]
+            )
+            conn.commit()
+        archived += len(rows)
+    return {'archived': archived, 'months': len(months)}
+
+def purge_old_news(days: int = NEWS_RETENTION_DAYS) -> int:
+    """删除发布超过 days 天且已归档的新闻行，返回删除数量"""
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    with get_connection() as conn:
+        cursor = conn.execute(
+            'DELETE FROM news WHERE archived_at IS NOT NULL AND published_at < ?', (cutoff,)
+        )
+        conn.commit()
+        return cursor.rowcount
+
+def load_archived_news(month: str) -> List[Dict]:
+    """读取某月（YYYY-MM）归档的新闻，正文已解压"""
+    if not os.path.exists(_archive_path(month)):
+        return []
+    archive = _open_archive(month)
+    try:
+        rows = [dict(row) for row in archive.execute('SELECT * FROM news_archive ORDER BY published_at')]
+    finally:
+        archive.close()
+    for row in rows:
+        row['content'] = zlib.decompress(row['content']).decode('utf-8') if row['content'] else ''
+    return rows
+
+def run_news_retention(content_days: int = NEWS_CONTENT_RETENTION_DAYS,
+                       days: int = NEWS_RETENTION_DAYS) -> Dict[str, int]:
+    """日常维护：刷新近期汇总 -> 归档旧正文 -> 删除过期行
+
+    删除前先刷新汇总，保证被删除的时间段已有汇总行；释放的页由后续写入复用，数据库文件大小保持稳定。
+    """
+    days = max(days, content_days)
+    refresh_sentiment_rollups((datetime.now() - timedelta(days=days + 1)).isoformat())
+    stats = archive_old_news(content_days)
+    stats['deleted'] = purge_old_news(days)
+    if get_backend().name == 'sqlite':
+        with get_connection() as conn:
+            conn.execute('PRAGMA optimize')
+    return stats
+
+
+# ============== LLM 分析缓存 ==============
+
+def get_cached_analyses(url_hashes: List[str], prompt_version: str, ttl_hours: int = 72) -> Dict[str, Dict]:
+    """批量读取未过期的分析缓存，返回 {url_hash: analysis}"""
+    if not url_hashes:
+        return {}
+    results = {}
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO reports 
-            (report_type, title, content, summary, sentiment_overall, sentiment_cn, 
-             sentiment_us, total_news, hot_topics, major_events, stocks, file_path)
+        # SQLite 单条语句参数个数有限，分块查询
+        for i in range(0, len(url_hashes), 500):
+            chunk = url_hashes[i:i + 500]
+            placeholders = ','.join(['?' for _ in chunk])
+            cursor.execute(f'''
+                SELECT url_hash, analysis FROM analysis_cache
+                WHERE prompt_version = ? AND url_hash IN ({placeholders})
+                AND created_at > ?
+            ''', [prompt_version, *chunk, _utc_cutoff(hours=ttl_hours)])
+            for row in cursor.fetchall():
+                try:
+                    results[row['url_hash']] = json.loads(row['analysis'])
+                except (TypeError, ValueError):
+                    continue
+    return results
+
+def save_cached_analyses(analyses: Dict[str, Dict], prompt_version: str):
+    """写入分析缓存（同一哈希和版本覆盖旧值）"""
+    if not analyses:
+        return
+    now = _utc_now()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(get_backend().upsert_sql(
+            'analysis_cache', ('url_hash', 'prompt_version', 'analysis', 'created_at'),
+            ('url_hash', 'prompt_version')
+        ), [
+            (url_hash, prompt_version, json.dumps(analysis, ensure_ascii=False), now)
+            for url_hash, analysis in analyses.items()
+        ])
+        conn.commit()
+
+def purge_analysis_cache(ttl_hours: int = 72) -> int:
+    """删除过期的分析缓存，返回删除数量"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'DELETE FROM analysis_cache WHERE created_at <= ?',
+            (_utc_cutoff(hours=ttl_hours),)
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+# ============== 流水线统计 ==============
+
+def save_pipeline_metrics(run_id: str, pipeline: str, records: List[Dict]):
+    """保存一次流水线运行的阶段记录（PipelineMetrics.finish 生成）"""
+    if not records:
+        return
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO pipeline_metrics
+            (run_id, pipeline, stage, label, started_at, duration_ms, items,
+             prompt_tokens, completion_tokens, status, error, detail)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            report_type,
-            parsed_data.get('title', ''),
-            content,
-            parsed_data.get('summary', ''),
-            parsed_data.get('sentiment', {}).get('overall', 0),
-            parsed_data.get('sentiment', {}).get('cn', 0),
-            parsed_data.get('sentiment', {}).get('us', 0),
-            parsed_data.get('total_news', 0),
-            json.dumps(parsed_data.get('hot_topics', []), ensure_ascii=False),
-            json.dumps(parsed_data.get('major_events', []), ensure_ascii=False),
-            json.dumps(parsed_data.get('stocks', []), ensure_ascii=False),
-            file_path
-        ))
+        ''', [(
+            run_id,
+            pipeline,
+            r['stage'],
+            r.get('label', ''),
+            r.get('started_at'),
+            r.get('duration_ms', 0),
+            r.get('items', 0),
+            r.get('prompt_tokens', 0),
+            r.get('completion_tokens', 0),
+            r.get('status', 'ok'),
+            r.get('error'),
+            json.dumps(r.get('detail') or {}, ensure_ascii=False)
+        ) for r in records])
         conn.commit()
-        return cursor.lastrowid
 
-def get_reports(report_type: str = None, limit: int = 20, offset: int = 0) -> List[Dict]:
-    """获取报告列表"""
+def get_pipeline_runs(pipeline: str = 'daily_report', limit: int = 24) -> List[Dict]:
+    """获取最近 N 次运行及其全部阶段记录（新的在前）"""
     with get_connection() as conn:
         cursor = conn.cursor()
-        
-        if report_type:
-            cursor.execute('''
-                SELECT id, report_type, title, summary, sentiment_overall, sentiment_cn,
-                       sentiment_us, total_news, created_at, file_path
-                FROM reports WHERE report_type = ?
-                ORDER BY created_at DESC LIMIT ? OFFSET ?
-            ''', (report_type, limit, offset))
-        else:
-            cursor.execute('''
-                SELECT id, report_type, title, summary, sentiment_overall, sentiment_cn,
-                       sentiment_us, total_news, created_at, file_path
-                FROM reports ORDER BY created_at DESC LIMIT ? OFFSET ?
-            ''', (limit, offset))
-        
-        results = []
+        cursor.execute('''
+            SELECT run_id FROM pipeline_metrics
+            WHERE pipeline = ? AND stage = 'total'
+            ORDER BY started_at DESC LIMIT ?
+        ''', (pipeline, limit))
+        run_ids = [row['run_id'] for row in cursor.fetchall()]
+        if not run_ids:
+            return []
+        placeholders = ','.join(['?' for _ in run_ids])
+        cursor.execute(f'''
+            SELECT * FROM pipeline_metrics WHERE run_id IN ({placeholders}) ORDER BY id
+        ''', run_ids)
+        runs = {run_id: {'run_id': run_id, 'stages': []} for run_id in run_ids}
+        for row in cursor.fetchall():
+            record = dict(row)
+            try:
+                record['detail'] = json.loads(record['detail']) if record['detail'] else {}
+            except ValueError:
+                record['detail'] = {}
+            run = runs[record['run_id']]
+            if record['stage'] == 'total':
+                run.update({
+                    'started_at': record['started_at'],
+                    'duration_ms': record['duration_ms'],
+                    'items': record['items'],
+                    'prompt_tokens': record['prompt_tokens'],
+                    'completion_tokens': record['completion_tokens'],
+                    'status': record['status'],
+                    'error': record['error']
+                })
+            else:
+                run['stages'].append(record)
+        return [runs[run_id] for run_id in run_ids]
+
+def get_pipeline_stage_summary(pipeline: str = 'daily_report', days: int = 7) -> List[Dict]:
+    """最近 N 天各阶段的耗时分布（次数/平均/p50/p95/最大）、token 和错误数"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT stage, duration_ms, items, prompt_tokens, completion_tokens, status
+            FROM pipeline_metrics
+            WHERE pipeline = ? AND started_at > ?
+        ''', (pipeline, (datetime.now() - timedelta(days=days)).isoformat()))
+        grouped: Dict[str, List] = {}
         for row in cursor.fetchall():
-            results.append(dict(row))
-        return results
+            grouped.setdefault(row['stage'], []).append(row)
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+    summary = []
+    for stage, rows in grouped.items():
+        durations = sorted(r['duration_ms'] or 0 for r in rows)
+        summary.append({
+            'stage': stage,
+            'count': len(rows),
+            'avg_ms': round(sum(durations) / len(durations), 1),
+            'p50_ms': pct(durations, 0.5),
+            'p95_ms': pct(durations, 0.95),
+            'max_ms': durations[-1],
+            'avg_items': round(sum(r['items'] or 0 for r in rows) / len(rows), 1),
+            'prompt_tokens': sum(r['prompt_tokens'] or 0 for r in rows),
+            'completion_tokens': sum(r['completion_tokens'] or 0 for r in rows),
+            'errors': sum(1 for r in rows if r['status'] == 'error')
+        })
+    summary.sort(key=lambda s: s['avg_ms'], reverse=True)
+    return summary
+
+
+# ============== 报告相关操作 ==============
+
+REPORT_TYPES = ('hourly', 'daily', 'weekly', 'monthly')
+_REPORT_TITLES = {'hourly': '每小时简报', 'daily': '每日摘要', 'weekly': '周度分析', 'monthly': '月度分析'}
+
+_REPORT_COLUMNS = ('report_type', 'report_key', 'title', 'content', 'summary', 'sentiment_overall',
+                   'sentiment_cn', 'sentiment_us', 'total_news', 'hot_topics', 'major_events',
+                   'stocks', 'data', 'file_path', 'created_at')
+
+# 列表查询不取 content / data 两个大字段
+_REPORT_LIST_COLUMNS = ('id, report_type, report_key, title, summary, sentiment_overall, sentiment_cn, '
+                        'sentiment_us, total_news, created_at, file_path')
+
+def _report_fields(report_type: str, data: Dict) -> Dict:
+    """从结构化报告（ReportGeneratorV2 / 周报 / 月报 JSON）中提取列表展示用的字段"""
+    if not data:
+        return {'title': _REPORT_TITLES.get(report_type, '')}
+    if report_type == 'hourly':
+        sentiment = data.get('sentiment', {})
+        return {
+            'title': _REPORT_TITLES['hourly'],
+            'sentiment': {region: sentiment.get(region, {}).get('score', 0) for region in ('overall', 'cn', 'us')},
+            'total_news': data.get('meta', {}).get('total_news', 0),
+            'hot_topics': [e.get('name', '') for e in data.get('entities', [])[:10]],
+            'major_events': [{'title': e.get('title', ''), 'source': e.get('source', ''),
+                              'summary': e.get('summary', '')}
+                             for e in data.get('events', {}).get('high_impact', [])],
+            'stocks': [{'symbol': s.get('symbol', ''), 'name': s.get('name', ''),
+                        'direction': s.get('prediction', '')}
+                       for s in data.get('stock_impacts', [])],
+        }
+    return {
+        'title': data.get('month') or _REPORT_TITLES.get(report_type, ''),
+        'summary': data.get('summary', '') if isinstance(data.get('summary'), str) else '',
+        'stocks': data.get('stocks', []) if isinstance(data.get('stocks'), list) else [],
+    }
+
+def _report_row(report_type: str, content: str, parsed_data: Dict, file_path: str,
+                report_key: str, data: Dict, created_at: datetime) -> tuple:
+    parsed_data = parsed_data or _report_fields(report_type, data)
+    sentiment = parsed_data.get('sentiment', {})
+    return (
+        report_type,
+        report_key or created_at.strftime('%Y%m%d_%H%M%S'),
+        parsed_data.get('title', ''),
+        content,
+        parsed_data.get('summary', ''),
+        sentiment.get('overall', 0),
+        sentiment.get('cn', 0),
+        sentiment.get('us', 0),
+        parsed_data.get('total_news', 0),
+        json.dumps(parsed_data.get('hot_topics', []), ensure_ascii=False),
+        json.dumps(parsed_data.get('major_events', []), ensure_ascii=False),
+        json.dumps(parsed_data.get('stocks', []), ensure_ascii=False),
+        json.dumps(data, ensure_ascii=False) if data is not None else None,
+        file_path,
+        _utc_text(created_at),
+    )
+
+def new_report_key(report_type: str, at: datetime = None) -> str:
+    """生成新报告的报告键（本地时间 YYYYmmdd_HHMMSS）
+
+    (report_type, report_key) 唯一，同一秒内已有同类型报告时依次追加 _2、_3 …，
+    生成后用于导出文件名和 save_report
+    """
+    base = (at or datetime.now()).strftime('%Y%m%d_%H%M%S')
+    with get_connection() as conn:
+        taken = {row['report_key'] for row in conn.execute(
+            "SELECT report_key FROM reports WHERE report_type = ? AND (report_key = ? OR report_key LIKE ?)",
+            (report_type, base, f'{base}_%')
+        ).fetchall()}
+    key, n = base, 1
+    while key in taken:
+        n += 1
+        key = f'{base}_{n}'
+    return key
+
+def save_report(report_type: str, content: str, parsed_data: Dict = None, file_path: str = None,
+                report_key: str = None, data: Dict = None, created_at: datetime = None) -> int:
+    """保存报告到数据库
+
+    report_key 与导出文件名中的时间戳一致（如 20251115_221203，由 new_report_key 生成），同类型内唯一，
+    作为前端的报告 ID；
+    data 为结构化报告（JSON）；created_at 默认当前时间，naive 时间按本地时间处理，入库时统一转为 UTC，
+    与 CURRENT_TIMESTAMP 列默认值和保留期/汇总按 UTC 比较的约定一致。
+    parsed_data 为空时从 data 中提取标题、情绪等列表字段。
+    """
+    row = _report_row(report_type, content, parsed_data, file_path, report_key, data,
+                      created_at or datetime.now())
+    with get_connection() as conn:
+        report_id = get_backend().insert_returning_id(conn, f'''
+            INSERT INTO reports ({', '.join(_REPORT_COLUMNS)})
+            VALUES ({', '.join('?' for _ in _REPORT_COLUMNS)})
+        ''', row)
+        conn.commit()
+        return report_id
+
+def _decode_report(row) -> Dict:
+    """解析报告行中的 JSON 字段"""
+    result = dict(row)
+    for field in ['hot_topics', 'major_events', 'stocks', 'data']:
+        if result.get(field):
+            try:
+                result[field] = json.loads(result[field])
+            except:
+                pass
+    return result
+
+def _report_type_filter(report_type) -> tuple:
+    """report_type 可以是单个类型或类型列表，返回 (WHERE 子句, 参数)"""
+    if not report_type:
+        return '', ()
+    if isinstance(report_type, str):
+        return 'WHERE report_type = ?', (report_type,)
+    return f"WHERE report_type IN ({', '.join('?' for _ in report_type)})", tuple(report_type)
+
+def _reports_query(report_type, limit: Optional[int], offset: int) -> tuple:
+    where, params = _report_type_filter(report_type)
+    sql = f'SELECT {_REPORT_LIST_COLUMNS} FROM reports {where} ORDER BY created_at DESC'
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params += (limit, offset)
+    return sql, params
+
+def get_reports(report_type=None, limit: Optional[int] = 20, offset: int = 0) -> List[Dict]:
+    """获取报告列表（按 created_at 倒序，不含正文）；report_type 可以是类型列表，limit=None 不分页"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(*_reports_query(report_type, limit, offset))
+        return [dict(row) for row in cursor.fetchall()]
+
+def count_reports(report_type=None) -> int:
+    """报告数量，用于分页"""
+    where, params = _report_type_filter(report_type)
+    with get_connection() as conn:
+        return conn.execute(f'SELECT COUNT(*) AS cnt FROM reports {where}', params).fetchone()['cnt']
+
+_REPORTS_AFTER_SQL = f'SELECT {_REPORT_LIST_COLUMNS} FROM reports WHERE id > ? ORDER BY id'
+
+def get_reports_after(last_id: int = 0) -> List[Dict]:
+    """按 id 递增获取 id 大于 last_id 的报告（不含正文），用于增量同步报告目录"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(_REPORTS_AFTER_SQL, (last_id,))
+        return [dict(row) for row in cursor.fetchall()]
+
+def _reports_since_query(report_type: str, since: str, limit: Optional[int]) -> tuple:
+    sql = 'SELECT * FROM reports WHERE report_type = ? AND created_at >= ? ORDER BY created_at DESC'
+    params = (report_type, since)
+    if limit:
+        sql += ' LIMIT ?'
+        params += (limit,)
+    return sql, params
+
+def get_reports_since(report_type: str, since: datetime, limit: int = None) -> List[Dict]:
+    """获取某个时间（naive 按本地时间）之后的完整报告，按 created_at 倒序"""
+    sql, params = _reports_since_query(report_type, _utc_text(since), limit)
+    with get_connection() as conn:
+        return [_decode_report(row) for row in conn.execute(sql, params).fetchall()]
+
+def report_local_time(created_at: str) -> datetime:
+    """reports.created_at（UTC）-> 本地时间（naive），用于展示和按日期归组"""
+    utc = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return utc.astimezone().replace(tzinfo=None)
+
+def get_latest_report(report_type: str) -> Optional[Dict]:
+    """获取某类型最新的一份完整报告"""
+    with get_connection() as conn:
+        row = conn.execute(
+            'SELECT * FROM reports WHERE report_type = ? ORDER BY created_at DESC LIMIT 1',
+            (report_type,)
+        ).fetchone()
+        return _decode_report(row) if row else None
+
+_REPORT_BY_KEY_SQL = 'SELECT * FROM reports WHERE report_type = ? AND report_key = ?'
+
+def get_report_by_key(report_type: str, report_key: str) -> Optional[Dict]:
+    """根据报告键（导出文件名中的时间戳）获取报告详情"""
+    with get_connection() as conn:
+        row = conn.execute(_REPORT_BY_KEY_SQL, (report_type, report_key)).fetchone()
+        return _decode_report(row) if row else None
 
 def get_report_by_id(report_id: int) -> Optional[Dict]:
     """根据ID获取报告详情"""
@@ -315,17 +1287,7 @@ def get_report_by_id(report_id: int) -> Optional[Dict]:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM reports WHERE id = ?', (report_id,))
         row = cursor.fetchone()
-        if row:
-            result = dict(row)
-            # 解析JSON字段
-            for field in ['hot_topics', 'major_events', 'stocks']:
-                if result.get(field):
-                    try:
-                        result[field] = json.loads(result[field])
-                    except:
-                        pass
-            return result
-        return None
+        return _decode_report(row) if row else None
 
 
 # ============== 自选股相关操作 ==============
@@ -335,10 +1297,9 @@ def add_to_watchlist(symbol: str, name: str = None, market: str = None, category
     with get_connection() as conn:
         cursor = conn.cursor()
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO watchlist (symbol, name, market, category)
-                VALUES (?, ?, ?, ?)
-            ''', (symbol.upper(), name, market, category))
+            cursor.execute(get_backend().upsert_sql(
+                'watchlist', ('symbol', 'name', 'market', 'category'), ('symbol',)
+            ), (symbol.upper(), name, market, category))
             conn.commit()
             return True
         except Exception as e:
@@ -374,86 +1335,128 @@ def get_watchlist(category: str = None) -> List[Dict]:
 
 def save_hot_searches(platform: str, items: List[Dict]):
     """保存热搜数据"""
+    if not items:
+        return
     with get_connection() as conn:
-        cursor = conn.cursor()
-        for item in items:
-            cursor.execute('''
-                INSERT INTO hot_searches (platform, rank, title, url, hot_value, category)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                platform,
-                item.get('rank', 0),
-                item.get('title', ''),
-                item.get('url', ''),
-                item.get('hot_value', 0),
-                item.get('category', '')
-            ))
+        get_backend().bulk_insert(conn, 'hot_searches', (
+            'platform', 'rank', 'title', 'url', 'hot_value', 'category'
+        ), [(
+            platform,
+            item.get('rank', 0),
+            item.get('title', ''),
+            item.get('url', ''),
+            item.get('hot_value', 0),
+            item.get('category', '')
+        ) for item in items])
         conn.commit()
 
+def _latest_hot_searches_query(platform: Optional[str], cutoff: str, limit: int) -> tuple:
+    if platform:
+        return ('SELECT * FROM hot_searches WHERE platform = ? AND collected_at > ? '
+                'ORDER BY collected_at DESC, rank ASC LIMIT ?', (platform, cutoff, limit))
+    return ('SELECT * FROM hot_searches WHERE collected_at > ? '
+            'ORDER BY collected_at DESC, rank ASC LIMIT ?', (cutoff, limit))
+
 def get_latest_hot_searches(platform: str = None, limit: int = 50) -> List[Dict]:
     """获取最新热搜"""
     with get_connection() as conn:
         cursor = conn.cursor()
-        if platform:
-            cursor.execute('''
-                SELECT * FROM hot_searches 
-                WHERE platform = ? AND collected_at > datetime('now', '-2 hours')
-                ORDER BY collected_at DESC, rank ASC LIMIT ?
-            ''', (platform, limit))
-        else:
-            cursor.execute('''
-                SELECT * FROM hot_searches 
-                WHERE collected_at > datetime('now', '-2 hours')
-                ORDER BY collected_at DESC, rank ASC LIMIT ?
-            ''', (limit,))
+        cursor.execute(*_latest_hot_searches_query(platform, _utc_cutoff(hours=2), limit))
         return [dict(row) for row in cursor.fetchall()]
 
 
 # ============== 虚拟货币相关操作 ==============
 
+def _crypto_history_upsert_sql(granularity: str) -> str:
+    """写入一个价格样本：桶不存在时新建，存在时合并最高/最低价并更新收盘价"""
+    table = f'crypto_history_{granularity}'
+    greatest, least = ('MAX', 'MIN') if get_backend().name == 'sqlite' else ('GREATEST', 'LEAST')
+    return f'''
+        INSERT INTO {table} (symbol, bucket, open, high, low, close, volume_24h, samples)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT (symbol, bucket) DO UPDATE SET
+            high = {greatest}({table}.high, excluded.high),
+            low = {least}({table}.low, excluded.low),
+            close = excluded.close,
+            volume_24h = excluded.volume_24h,
+            samples = {table}.samples + 1
+    '''
+
 def save_crypto_prices(prices: List[Dict]):
-    """保存加密货币价格"""
+    """保存加密货币价格：覆盖最新价表，并合并进分钟/小时/天历史桶"""
+    prices = [p for p in prices or [] if p.get('symbol') and p.get('price_usd') is not None]
+    if not prices:
+        return
+    now = _utc_now()
     with get_connection() as conn:
-        cursor = conn.cursor()
-        for price in prices:
-            cursor.execute('''
-                INSERT INTO crypto_prices 
-                (symbol, name, price_usd, price_cny, change_24h, volume_24h, market_cap)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                price.get('symbol', ''),
-                price.get('name', ''),
-                price.get('price_usd', 0),
-                price.get('price_cny', 0),
-                price.get('change_24h', 0),
-                price.get('volume_24h', 0),
-                price.get('market_cap', 0)
-            ))
+        conn.executemany(get_backend().upsert_sql('crypto_latest', _CRYPTO_LATEST_COLUMNS, ('symbol',)), [(
+            price['symbol'],
+            price.get('name', ''),
+            price['price_usd'],
+            price.get('price_cny', 0),
+            price.get('change_24h', 0),
+            price.get('volume_24h', 0),
+            price.get('market_cap', 0),
+            now
+        ) for price in prices])
+        for granularity, width in CRYPTO_HISTORY_GRANULARITIES.items():
+            bucket = now[:width].replace(' ', 'T')
+            conn.executemany(_crypto_history_upsert_sql(granularity), [(
+                price['symbol'], bucket, price['price_usd'], price['price_usd'], price['price_usd'],
+                price['price_usd'], price.get('volume_24h', 0)
+            ) for price in prices])
         conn.commit()
 
+def _crypto_prices_query(symbols: Optional[List[str]], cutoff: str) -> tuple:
+    where, params = 'updated_at > ?', (cutoff,)
+    if symbols:
+        where = f"symbol IN ({','.join('?' for _ in symbols)}) AND {where}"
+        params = (*symbols, *params)
+    return (f'''
+        SELECT symbol, name, price_usd, price_cny, change_24h, volume_24h, market_cap,
+               updated_at AS timestamp
+        FROM crypto_latest WHERE {where}
+        ORDER BY market_cap DESC
+    ''', params)
+
 def get_crypto_prices(symbols: List[str] = None) -> List[Dict]:
-    """获取加密货币最新价格"""
+    """获取加密货币最新价格（1 小时内更新过的币种）"""
     with get_connection() as conn:
         cursor = conn.cursor()
-        if symbols:
-            placeholders = ','.join(['?' for _ in symbols])
-            cursor.execute(f'''
-                SELECT * FROM crypto_prices 
-                WHERE symbol IN ({placeholders})
-                AND timestamp > datetime('now', '-1 hour')
-                ORDER BY timestamp DESC
-            ''', symbols)
-        else:
-            cursor.execute('''
-                SELECT DISTINCT symbol, name, price_usd, price_cny, change_24h, 
-                       volume_24h, market_cap, MAX(timestamp) as timestamp
-                FROM crypto_prices 
-                WHERE timestamp > datetime('now', '-1 hour')
-                GROUP BY symbol
-                ORDER BY market_cap DESC
-            ''')
+        cursor.execute(*_crypto_prices_query(symbols, _utc_cutoff(hours=1)))
+        return [dict(row) for row in cursor.fetchall()]
+
+def _crypto_history_query(symbol: str, granularity: str, since: Optional[str], until: Optional[str]) -> tuple:
+    width = CRYPTO_HISTORY_GRANULARITIES[granularity]
+    return (f'''
+        SELECT bucket, open, high, low, close, volume_24h, samples
+        FROM crypto_history_{granularity}
+        WHERE symbol = ? AND bucket >= ? AND bucket <= ?
+        ORDER BY bucket
+    ''', (symbol, (since or '0000')[:width].replace(' ', 'T'), (until or '9999')[:width].replace(' ', 'T')))
+
+def get_crypto_history(symbol: str, granularity: str = 'hour', since: str = None, until: str = None) -> List[Dict]:
+    """按时间正序获取某个币种的 OHLC 历史；since/until 为 UTC 时间（ISO 格式，按桶键前缀比较）"""
+    if granularity not in CRYPTO_HISTORY_GRANULARITIES:
+        raise ValueError(f"不支持的粒度: {granularity}")
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(*_crypto_history_query(symbol, granularity, since, until))
         return [dict(row) for row in cursor.fetchall()]
 
+def purge_crypto_history(minute_days: int = CRYPTO_MINUTE_RETENTION_DAYS,
+                         hour_days: int = CRYPTO_HOUR_RETENTION_DAYS) -> Dict[str, int]:
+    """删除过期的分钟桶和小时桶（天桶保留），返回各粒度删除的行数"""
+    deleted = {}
+    with get_connection() as conn:
+        for granularity, days in (('minute', minute_days), ('hour', hour_days)):
+            width = CRYPTO_HISTORY_GRANULARITIES[granularity]
+            cutoff = _utc_cutoff(days=days)[:width].replace(' ', 'T')
+            deleted[granularity] = conn.execute(
+                f'DELETE FROM crypto_history_{granularity} WHERE bucket < ?', (cutoff,)).rowcount
+        conn.commit()
+    return deleted
+
 
 # ============== 预测记录相关操作（回测用）==============
 
@@ -461,14 +1464,13 @@ def save_prediction(symbol: str, direction: str, confidence: float,
                    target_date: str, prediction_type: str = 'news_based') -> int:
     """保存预测记录"""
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+        prediction_id = get_backend().insert_returning_id(conn, '''
             INSERT INTO predictions 
             (symbol, prediction_type, predicted_direction, confidence, target_date)
             VALUES (?, ?, ?, ?, ?)
         ''', (symbol, prediction_type, direction, confidence, target_date))
         conn.commit()
-        return cursor.lastrowid
+        return prediction_id
 
 def verify_prediction(prediction_id: int, actual_direction: str, actual_change: float):
     """验证预测结果"""
@@ -483,35 +1485,30 @@ def verify_prediction(prediction_id: int, actual_direction: str, actual_change:
                     actual_direction = ?,
                     actual_change = ?,
                     is_correct = ?,
-                    verified_at = CURRENT_TIMESTAMP
+                    verified_at = ?
                 WHERE id = ?
-            ''', (actual_direction, actual_change, is_correct, prediction_id))
+            ''', (actual_direction, actual_change, is_correct, _utc_now(), prediction_id))
             conn.commit()
 
+def _prediction_accuracy_query(symbol: Optional[str], cutoff: str) -> tuple:
+    where, params = 'verified_at IS NOT NULL AND predicted_at > ?', (cutoff,)
+    if symbol:
+        where, params = f'symbol = ? AND {where}', (symbol, cutoff)
+    return (f'''
+        SELECT 
+            COUNT(*) as total,
+            SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct,
+            AVG(confidence) as avg_confidence
+        FROM predictions 
+        WHERE {where}
+    ''', params)
+
 def get_prediction_accuracy(symbol: str = None, days: int = 30) -> Dict:
     """获取预测准确率统计"""
     with get_connection() as conn:
         cursor = conn.cursor()
         cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-        
-        if symbol:
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct,
-                    AVG(confidence) as avg_confidence
-                FROM predictions 
-                WHERE symbol = ? AND verified_at IS NOT NULL AND predicted_at > ?
-            ''', (symbol, cutoff))
-        else:
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN is_correct = 1 THEN 1 ELSE 0 END) as correct,
-                    AVG(confidence) as avg_confidence
-                FROM predictions 
-                WHERE verified_at IS NOT NULL AND predicted_at > ?
-            ''', (cutoff,))
+        cursor.execute(*_prediction_accuracy_query(symbol, cutoff))
         
         row = cursor.fetchone()
         if row and row['total'] > 0:
@@ -527,3 +1524,10 @@ def get_prediction_accuracy(symbol: str = None, days: int = 30) -> Dict:
 # 初始化数据库
 if __name__ == '__main__':
     init_database()
+    if '--check-plans' in sys.argv:
+        problems = check_query_plans()
+        for name, plan in problems.items():
+            print(f"✗ {name} 全表扫描: {' | '.join(plan)}")
+        if problems:
+            sys.exit(1)
+        print(f"✓ {len(HOT_QUERIES)} 条热点查询均使用索引")
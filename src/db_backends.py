@@ -0,0 +1,360 @@
+"""
+存储后端
+database.py 的所有函数通过这里的后端获取连接，SQL 统一按 SQLite 写法（? 占位符）编写，
+方言差异（建表类型、upsert、自增主键返回、批量导入）由后端负责：
+- SQLiteBackend: 本地文件，WAL 模式 + 连接池（默认）
+- PostgresBackend: 设置 DATABASE_URL=postgresql://... 时使用，psycopg 3 连接池 + COPY 批量导入，
+  供多个 Web worker 和采集节点共享同一个数据库
+
+时间列在两种后端中都按文本存储（'YYYY-MM-DD HH:MM:SS' 或 ISO 格式），
+比较、截取（substr）和排序的行为保持一致。
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+# 连接池参数：WAL 模式下读写互不阻塞，busy_timeout 让写锁冲突时等待而不是立即报 database is locked
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', '16384'))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+
+class StorageBackend(ABC):
+    """后端基类：同一线程内嵌套调用 connection() 复用同一连接（引用计数），最外层退出时归还
+
+    子类必须实现连接的借出/归还和各方言方法，缺少任何一个都无法实例化
+    """
+
+    name = ''
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @abstractmethod
+    def _checkout(self):
+        """借出一个连接"""
+
+    @abstractmethod
+    def _checkin(self, conn):
+        """归还连接（未提交的事务回滚）"""
+
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._checkin(conn)
+
+    def close_all(self):
+        """关闭空闲连接"""
+
+    # ---- 方言 ----
+
+    def ddl(self, sql: str) -> str:
+        """把按 SQLite 写的建表/改表语句转换为本后端的类型"""
+        return sql
+
+    def begin(self, conn):
+        """显式开启事务（迁移需要 DDL 也在事务内）"""
+
+    @abstractmethod
+    def insert_returning_id(self, conn, sql: str, params: Sequence) -> int:
+        """执行单行 INSERT 并返回自增主键"""
+
+    @abstractmethod
+    def insert_ignore_sql(self, table: str, columns: Sequence[str], conflict: Sequence[str]) -> str:
+        """冲突时忽略的 INSERT 语句"""
+
+    def upsert_sql(self, table: str, columns: Sequence[str], keys: Sequence[str]) -> str:
+        """按 keys 冲突时原地更新其余列的 INSERT 语句
+
+        SQLite（3.24+）和 PostgreSQL 都支持 ON CONFLICT ... DO UPDATE：保留原行的主键和未列出的列，
+        不像 INSERT OR REPLACE 那样先删除再插入
+        """
+        updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c not in keys)
+        action = f'DO UPDATE SET {updates}' if updates else 'DO NOTHING'
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT ({', '.join(keys)}) {action}")
+
+    @abstractmethod
+    def bulk_insert(self, conn, table: str, columns: Sequence[str], rows: List[tuple],
+                    conflict: Sequence[str] = None) -> int:
+        """批量写入（conflict 非空时忽略冲突行），返回实际插入行数；不提交"""
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite 连接池
+
+    线程退出 with 块后连接回到空闲池，供后续请求线程复用（Flask threaded 模式每个请求一个新线程），
+    空闲连接数超过 max_idle 时直接关闭。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str, max_idle: int = DB_POOL_SIZE):
+        super().__init__()
+        self.path = path
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False  # 连接会在线程间传递，但同一时刻只被一个线程持有
+        )
+        conn.row_factory = sqlite3.Row  # 使查询结果可以用字段名访问
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')  # WAL 下 NORMAL 足够安全，且每次提交不再 fsync
+        conn.execute(f'PRAGMA cache_size=-{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={DB_MMAP_SIZE}')
+        conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def _check_fork(self):
+        # 子进程不能继承父进程的 SQLite 连接，丢弃后重新建立
+        if self._pid != os.getpid():
+            self._idle = []
+            self._lock = threading.Lock()
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+    def _checkout(self) -> sqlite3.Connection:
+        self._check_fork()
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        return conn or self._connect()
+
+    def _checkin(self, conn: sqlite3.Connection):
+        # 调用方忘记 commit 或中途异常时回滚，避免把未完成的写事务（和写锁）带回池里
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                conn.close()
+                return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def begin(self, conn):
+        conn.execute('BEGIN')
+
+    def insert_returning_id(self, conn, sql: str, params: Sequence) -> int:
+        return conn.execute(sql, params).lastrowid
+
+    def insert_ignore_sql(self, table, columns, conflict):
+        return (f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})")
+
+    def bulk_insert(self, conn, table, columns, rows, conflict=None):
+        if conflict:
+            sql = self.insert_ignore_sql(table, columns, conflict)
+        else:
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        # executemany 的 rowcount 是各行 changes() 之和（不含触发器的改动）
+        return conn.executemany(sql, rows).rowcount
+
+
+# ============== PostgreSQL ==============
+
+@lru_cache(maxsize=512)
+def _to_pg_sql(sql: str) -> str:
+    """? 占位符 -> %s（SQL 里的 % 需转义为 %%）"""
+    return sql.replace('%', '%%').replace('?', '%s')
+
+
+class PostgresCursor:
+    """把 ? 占位符转换为 psycopg 的 %s，其余接口与 sqlite3.Cursor 一致
+
+    PostgreSQL 没有 lastrowid，需要自增主键时统一用 backend.insert_returning_id（RETURNING id）
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params: Sequence = ()):
+        if params:
+            self._cursor.execute(_to_pg_sql(sql), params)
+        else:
+            self._cursor.execute(sql)
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self._cursor.executemany(_to_pg_sql(sql), list(seq_of_params))
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+
+class PostgresConnection:
+    """psycopg 连接的 sqlite3.Connection 风格包装"""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def cursor(self) -> PostgresCursor:
+        return PostgresCursor(self.raw.cursor())
+
+    def execute(self, sql: str, params: Sequence = ()) -> PostgresCursor:
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params) -> PostgresCursor:
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    @property
+    def in_transaction(self) -> bool:
+        from psycopg.pq import TransactionStatus
+        return self.raw.info.transaction_status != TransactionStatus.IDLE
+
+
+# SQLite 建表类型 -> PostgreSQL（时间列保持文本，见模块说明）
+_PG_DDL_RULES = [
+    (re.compile(r'\bINTEGER PRIMARY KEY AUTOINCREMENT\b'), 'BIGSERIAL PRIMARY KEY'),
+    (re.compile(r'\bDATETIME DEFAULT CURRENT_TIMESTAMP\b'),
+     "TEXT DEFAULT to_char(timezone('UTC', now()), 'YYYY-MM-DD HH24:MI:SS')"),
+    (re.compile(r'\bDATETIME\b'), 'TEXT'),
+    (re.compile(r'\bDATE\b'), 'TEXT'),
+    (re.compile(r'\bINTEGER\b'), 'BIGINT'),
+    (re.compile(r'\bREAL\b'), 'DOUBLE PRECISION'),
+    (re.compile(r'\bBLOB\b'), 'BYTEA'),
+]
+
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL 连接池（psycopg_pool），批量导入走 COPY"""
+
+    name = 'postgres'
+
+    def __init__(self, dsn: str, max_size: int = DB_POOL_SIZE):
+        super().__init__()
+        try:
+            from psycopg.rows import dict_row
+            from psycopg_pool import ConnectionPool
+        except ImportError as e:
+            raise ImportError('使用 PostgreSQL 需要安装 psycopg 和 psycopg-pool: '
+                              'pip install "psycopg[binary]" psycopg-pool') from e
+        self.pool = ConnectionPool(
+            dsn, min_size=1, max_size=max_size,
+            kwargs={'row_factory': dict_row}, open=True, name='finance-db'
+        )
+
+    def _checkout(self) -> PostgresConnection:
+        return PostgresConnection(self.pool.getconn())
+
+    def _checkin(self, conn: PostgresConnection):
+        # 与 SQLite 一致：未提交的事务回滚，不做隐式提交
+        if conn.in_transaction:
+            conn.rollback()
+        self.pool.putconn(conn.raw)
+
+    def close_all(self):
+        self.pool.close()
+
+    def ddl(self, sql: str) -> str:
+        for pattern, replacement in _PG_DDL_RULES:
+            sql = pattern.sub(replacement, sql)
+        return sql
+
+    def insert_returning_id(self, conn, sql: str, params: Sequence) -> int:
+        return conn.execute(f'{sql.rstrip()} RETURNING id', params).fetchone()['id']
+
+    def insert_ignore_sql(self, table, columns, conflict):
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT ({', '.join(conflict)}) DO NOTHING")
+
+    def bulk_insert(self, conn, table, columns, rows, conflict=None):
+        cols = ', '.join(columns)
+        with conn.raw.cursor() as cursor:
+            if not conflict:
+                with cursor.copy(f'COPY {table} ({cols}) FROM STDIN') as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                return len(rows)
+            # 有唯一约束时先 COPY 进临时表，再一条 INSERT ... ON CONFLICT DO NOTHING 合并
+            stage = f'_stage_{table}'
+            cursor.execute(f'CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA')
+            with cursor.copy(f'COPY {stage} ({cols}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+            cursor.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} "
+                           f"ON CONFLICT ({', '.join(conflict)}) DO NOTHING")
+            inserted = cursor.rowcount
+            cursor.execute(f'DROP TABLE {stage}')
+            return inserted
+
+
+_backends: Dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(target: str) -> StorageBackend:
+    """按连接串或 SQLite 文件路径返回（缓存的）后端实例"""
+    backend = _backends.get(target)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(target)
+            if backend is None:
+                if target.startswith(('postgres://', 'postgresql://')):
+                    backend = PostgresBackend(target)
+                else:
+                    backend = SQLiteBackend(target)
+                _backends[target] = backend
+    return backend
+
+
+def close_all_backends():
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        backend.close_all()
@@ -0,0 +1,176 @@
+"""
+新闻去重模块
+在送入 LLM 之前去掉重复和近似重复的新闻，避免同一事件被多家媒体报道时重复付费分析：
+1. 精确去重：url_hash（与 news 表的唯一键一致）以及规范化后的标题
+2. 近似去重：标题词元 shingle（英文按单词、中文按单字，取一元和二元组合）的 MinHash + LSH 分桶找候选，Jaccard 相似度超过阈值视为同一事件
+"""
+
+import re
+import random
+import hashlib
+from typing import List, Dict, Optional, Set, Tuple
+
+from database import get_news_hash
+
+# MinHash 使用的哈希族 (a * h + b) mod p，固定种子保证每次运行结果一致
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(32)]
+
+
+class NewsDeduplicator:
+    """新闻去重器"""
+
+    NUM_PERM = len(_PERMUTATIONS)
+    # 32 个签名分成 16 段（每段 2 行）：Jaccard 0.5 的两条标题约 99% 概率落入同一桶
+    BANDS = 16
+
+    def __init__(self, threshold: float = 0.6):
+        """
+        Args:
+            threshold: 判定为近似重复的 Jaccard 相似度下限
+        """
+        self.threshold = threshold
+        self.last_stats: Dict[str, int] = {}
+
+    @staticmethod
+    def normalize_title(title: str) -> str:
+        """规范化标题：小写、去掉标点和空白"""
+        title = (title or '').lower()
+        return re.sub(r'[\W_]+', '', title)
+
+    @staticmethod
+    def tokenize(title: str) -> List[str]:
+        """英文/数字按单词切分，中文按单字切分"""
+        return re.findall(r'[a-z0-9]+|[\u4e00-\u9fff]', (title or '').lower())
+
+    def shingles(self, tokens: List[str]) -> Set[int]:
+        """一元 + 二元词元 shingle 集合（以 64 位哈希表示）"""
+        grams = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+        return {
+            int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big')
+            for gram in grams
+        }
+
+    def minhash(self, shingles: Set[int]) -> List[int]:
+        """计算 MinHash 签名"""
+        return [
+            min((a * h + b) % _PRIME for h in shingles)
+            for a, b in _PERMUTATIONS
+        ]
+
+    def _bands(self, signature: List[int]) -> List[tuple]:
+        rows = self.NUM_PERM // self.BANDS
+        return [(i, tuple(signature[i * rows:(i + 1) * rows])) for i in range(self.BANDS)]
+
+    @staticmethod
+    def _richness(article: Dict) -> int:
+        return len(article.get('content') or '')
+
+    def _title_signature(self, title: str) -> Tuple[Set[int], Optional[List[int]]]:
+        """标题的 shingle 集合和 MinHash 签名（少于两个词元时不做近似去重，签名为 None）"""
+        tokens = self.tokenize(title)
+        shingles = self.shingles(tokens)
+        return shingles, self.minhash(shingles) if len(tokens) >= 2 else None
+
+    def _index(self, index: int, shingles: Set[int], signature: Optional[List[int]],
+               shingle_sets: List[List[Set[int]]], buckets: Dict[tuple, List[int]]):
+        """把一个标题登记到保留条目 index 的近似索引"""
+        shingle_sets[index].append(shingles)
+        if signature is not None:
+            for band in self._bands(signature):
+                bucket = buckets.setdefault(band, [])
+                if index not in bucket:
+                    bucket.append(index)
+
+    def deduplicate(self, articles: List[Dict]) -> List[Dict]:
+        """去重并返回保留的新闻（保持首次出现的顺序）
+
+        同一簇中保留内容最丰富的一条，其余来源记录在 also_reported_by 字段。
+        返回的是副本，不修改传入的新闻。
+        """
+        kept: List[Dict] = []
+        seen_hashes: Dict[str, int] = {}
+        seen_titles: Dict[str, int] = {}
+        shingle_sets: List[List[Set[int]]] = []  # 每个保留条目登记过的标题 shingle 集合
+        buckets: Dict[tuple, List[int]] = {}
+        exact = near = 0
+
+        for article in articles:
+            url_hash = get_news_hash(article.get('url', ''), article.get('title', ''))
+            norm_title = self.normalize_title(article.get('title', ''))
+
+            shingles = signature = None
+            match = seen_hashes.get(url_hash)
+            if match is None and norm_title:
+                match = seen_titles.get(norm_title)
+            if match is not None:
+                exact += 1
+            else:
+                shingles, signature = self._title_signature(article.get('title', ''))
+                if signature is not None:
+                    match = self._find_near(shingles, signature, shingle_sets, buckets)
+                    if match is not None:
+                        near += 1
+            if match is not None:
+                if self._merge(kept, match, article):
+                    # 替换进来的条目按其标题重新登记近似索引，之后与新标题相近的转载也能命中
+                    if shingles is None:
+                        shingles, signature = self._title_signature(article.get('title', ''))
+                    self._index(match, shingles, signature, shingle_sets, buckets)
+                # 并入（可能替换了保留条目）的新闻也登记精确键，之后完全相同的转载直接命中
+                seen_hashes.setdefault(url_hash, match)
+                if norm_title:
+                    seen_titles.setdefault(norm_title, match)
+                continue
+
+            index = len(kept)
+            kept.append(dict(article))
+            shingle_sets.append([])
+            self._index(index, shingles, signature, shingle_sets, buckets)
+            seen_hashes[url_hash] = index
+            if norm_title:
+                seen_titles[norm_title] = index
+
+        self.last_stats = {
+            'input': len(articles),
+            'exact_duplicates': exact,
+            'near_duplicates': near,
+            'output': len(kept)
+        }
+        return kept
+
+    def _find_near(self, shingles: Set[int], signature: List[int], shingle_sets: List[List[Set[int]]],
+                   buckets: Dict[tuple, List[int]]) -> Optional[int]:
+        """在同桶候选中找 Jaccard 相似度最高且超过阈值的条目（与条目登记过的任一标题比较）"""
+        best_index, best_score = None, self.threshold
+        checked = set()
+        for band in self._bands(signature):
+            for index in buckets.get(band, []):
+                if index in checked:
+                    continue
+                checked.add(index)
+                for other in shingle_sets[index]:
+                    score = len(shingles & other) / len(shingles | other)
+                    if score >= best_score:
+                        best_index, best_score = index, score
+        return best_index
+
+    def _merge(self, kept: List[Dict], index: int, duplicate: Dict) -> bool:
+        """把重复新闻并入已保留的条目，重复新闻内容更丰富时替换保留条目并返回 True"""
+        current = kept[index]
+        if self._richness(duplicate) > self._richness(current):
+            replacement = {**duplicate, 'also_reported_by': list(current.get('also_reported_by', []))}
+            self._add_source(replacement, current.get('source'))
+            kept[index] = replacement
+            return True
+        self._add_source(current, duplicate.get('source'))
+        return False
+
+    @staticmethod
+    def _add_source(article: Dict, source: Optional[str]):
+        """记录同时报道的来源（新建列表，不修改原条目共享的 also_reported_by）"""
+        sources = article.get('also_reported_by', [])
+        if not source or source == article.get('source') or source in sources:
+            return
+        article['also_reported_by'] = sources + [source]
@@ -18,10 +18,13 @@ class EmailSender:
         Args:
             report: 纯文本报告（作为备用）
             html_content: HTML格式报告（优先使用）
+            
+        Returns:
+            是否发送成功
         """
         if not all([self.from_email, self.password, self.to_email]):
             print("邮件配置不完整")
-            return
+            return False
         
         msg = MIMEMultipart('alternative')
         msg['From'] = self.from_email or ""
@@ -71,6 +74,7 @@ class EmailSender:
                     server.send_message(msg)
             
             print("✅ 邮件发送成功")
+            return True
         except smtplib.SMTPAuthenticationError:
             print("❌ 邮件发送失败: 认证失败，请检查邮箱密码/授权码")
             print("提示: QQ/163邮箱需要使用授权码而非登录密码")
@@ -83,6 +87,7 @@ class EmailSender:
         except Exception as e:
             print(f"❌ 邮件发送失败: {e}")
             print("提示: 请检查 .env 文件中的邮箱配置")
+        return False
     
     def send_structured_report(self, report_data: Dict[str, Any]):
         """发送结构化报告
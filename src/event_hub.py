@@ -0,0 +1,165 @@
+"""
+事件推送中心（Server-Sent Events）
+Web 端进程内的发布/订阅：新报告、实时快讯等由后台线程发布，浏览器通过 /api/events 订阅，
+不必轮询各个接口；上游采集由 PeriodicPublisher 按固定间隔进行一次，与在线客户端数量无关。
+
+用法：
+    hub = EventHub()
+    hub.publish('report', {'id': '20251115_221203', 'type': 'hourly'})
+    return Response(hub.stream(['report']), mimetype='text/event-stream')
+
+    feed = PeriodicPublisher(hub, 'realtime', collector.fetch_all_realtime, interval=30)
+    data, fetched_at = feed.latest()
+"""
+
+import os
+import json
+import time
+import queue
+import hashlib
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+# 每个订阅者最多积压的事件数，消费过慢时丢弃最旧的事件
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '100'))
+# 无事件时发送心跳注释的间隔（秒），用于保持代理连接并及时发现断开的客户端
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', '15'))
+
+
+class EventHub:
+    """进程内事件广播，每个订阅者一个有界队列；订阅时补发每类事件的最新一条"""
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Dict[queue.Queue, Optional[frozenset]] = {}
+        self._last: Dict[str, Tuple[int, str, str]] = {}  # event -> (id, event, data)
+        self._next_id = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event: str, data) -> int:
+        """发布事件，返回事件 id"""
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        with self._lock:
+            self._next_id += 1
+            message = (self._next_id, event, payload)
+            self._last[event] = message
+            targets = [q for q, events in self._subscribers.items() if events is None or event in events]
+        for q in targets:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+        return message[0]
+
+    def subscribe(self, events: Iterable[str] = None, replay: bool = True) -> queue.Queue:
+        """订阅事件（events 为空表示全部），返回接收 (id, event, data) 的队列"""
+        q = queue.Queue(maxsize=self.queue_size)
+        wanted = frozenset(events) if events else None
+        with self._lock:
+            if replay:
+                for message in sorted(self._last.values()):
+                    if wanted is None or message[1] in wanted:
+                        q.put_nowait(message)
+            self._subscribers[q] = wanted
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.pop(q, None)
+
+    def stream(self, events: Iterable[str] = None, keepalive: float = SSE_KEEPALIVE_SECONDS) -> Iterator[str]:
+        """按 SSE 格式输出事件的生成器，客户端断开后自动取消订阅"""
+        q = self.subscribe(events)
+        try:
+            # 建议客户端断线后 3 秒重连
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event_id, event, payload = q.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'id: {event_id}\nevent: {event}\ndata: {payload}\n\n'
+        finally:
+            self.unsubscribe(q)
+
+
+class PeriodicPublisher:
+    """后台线程按固定间隔调用 fetch，结果变化时发布事件；最近一次结果同时供普通接口直接返回
+
+    没有订阅者也没有接口读取时后台线程自动退出，不再请求上游
+    """
+
+    def __init__(self, hub: EventHub, event: str, fetch: Callable[[], object], interval: float):
+        self.hub = hub
+        self.event = event
+        self.fetch = fetch
+        self.interval = interval
+        self._latest: Optional[Tuple[object, datetime]] = None
+        self._fetched_at = 0.0
+        self._digest = None
+        self._accessed_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """启动后台采集线程（重复调用无副作用）"""
+        self._accessed_at = time.monotonic()
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=f'publisher-{self.event}', daemon=True)
+            self._thread.start()
+
+    def _idle(self) -> bool:
+        """没有 SSE 订阅者且一段时间内没有接口读取结果"""
+        return self.hub.subscriber_count == 0 and time.monotonic() - self._accessed_at > self.interval * 2
+
+    def _run(self):
+        # 空闲时退出，下次 start() / latest() 时重新启动
+        while not self._idle():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"{self.event} 后台采集失败: {e}")
+            time.sleep(self.interval)
+
+    def _fresh(self) -> bool:
+        return self._latest is not None and time.monotonic() - self._fetched_at < self.interval * 2
+
+    def refresh(self):
+        """采集一次，结果变化时发布事件"""
+        with self._refresh_lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        data = self.fetch()
+        fetched_at = datetime.now()
+        self._latest = (data, fetched_at)
+        self._fetched_at = time.monotonic()
+        digest = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        if digest != self._digest:
+            self._digest = digest
+            self.hub.publish(self.event, {'data': data, 'timestamp': fetched_at.isoformat()})
+
+    def latest(self) -> Tuple[object, datetime]:
+        """最近一次采集结果 (data, 采集时间)；没有或已过期（后台线程异常）时同步采集一次
+
+        并发请求在锁上等待同一次采集，不会各自请求上游
+        """
+        self.start()
+        if not self._fresh():
+            with self._refresh_lock:
+                if not self._fresh():
+                    self._refresh_locked()
+        return self._latest
@@ -0,0 +1,135 @@
+"""
+API 响应缓存层
+在 Flask after_request 中统一处理：
+- 按响应内容哈希设置强 ETag，If-None-Match 命中时返回 304（视图已设置 ETag 的沿用视图的值）
+- 按 Accept-Encoding 协商 brotli / gzip 压缩，压缩结果按 (ETag, 编码) 缓存，轮询同一内容不重复压缩
+- 按路由类别设置 Cache-Control
+
+brotli 为可选依赖（pip install brotli），未安装时只使用 gzip。
+
+用法：
+    app = Flask(__name__)
+    init_http_cache(app)
+"""
+
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小于该字节数的响应不压缩
+HTTP_COMPRESS_MIN_BYTES = int(os.getenv('HTTP_COMPRESS_MIN_BYTES', '1024'))
+# 缓存的压缩结果份数
+HTTP_COMPRESS_CACHE_SIZE = int(os.getenv('HTTP_COMPRESS_CACHE_SIZE', '128'))
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'text/html', 'text/plain', 'text/css'}
+
+# 路由前缀 -> Cache-Control，按顺序取第一个匹配；只用于 200/304 响应
+CACHE_POLICIES = [
+    ('/api/watchlist', 'private, no-cache'),
+    ('/api/reports/history', 'no-cache'),
+    ('/api/reports/', 'public, max-age=86400'),       # 单份报告入库后不再修改
+    ('/api/realtime', 'public, max-age=15'),          # 实时行情/快讯：短时间内多个客户端共享
+    ('/api/hot-searches', 'public, max-age=60'),
+    ('/api/crypto/', 'public, max-age=30'),
+    ('/api/stocks/', 'public, max-age=30'),
+    ('/api/', 'no-cache'),                            # 报告派生数据：每次用 ETag 校验，新报告立即可见
+    ('/assets/', 'public, max-age=31536000, immutable'),  # Vite 构建产物，文件名带内容哈希
+]
+DEFAULT_CACHE_POLICY = 'no-cache'
+
+_compressed_lock = threading.Lock()
+_compressed = OrderedDict()  # (ETag, 编码) -> 压缩后的字节（LRU）
+
+
+def cache_policy(path: str) -> str:
+    """某个路径的 Cache-Control"""
+    for prefix, policy in CACHE_POLICIES:
+        if path.startswith(prefix):
+            return policy
+    return DEFAULT_CACHE_POLICY
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=9)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _compressed_body(etag: str, body: bytes, encoding: str) -> bytes:
+    """取 (ETag, 编码) 对应的压缩结果，未缓存时压缩并放入 LRU"""
+    key = (etag, encoding)
+    with _compressed_lock:
+        data = _compressed.get(key)
+        if data is not None:
+            _compressed.move_to_end(key)
+            return data
+    data = _compress(body, encoding)
+    with _compressed_lock:
+        _compressed[key] = data
+        while len(_compressed) > HTTP_COMPRESS_CACHE_SIZE:
+            _compressed.popitem(last=False)
+    return data
+
+
+def _negotiate_encoding() -> str:
+    """按客户端 Accept-Encoding 的权重选择 br / gzip，都不接受时返回空字符串"""
+    offers = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offers) or ''
+
+
+def _apply(response):
+    if request.method not in ('GET', 'HEAD'):
+        response.headers.setdefault('Cache-Control', 'no-store')
+        return response
+    if response.status_code == 304:
+        response.headers.setdefault('Cache-Control', cache_policy(request.path))
+        return response
+    if response.status_code != 200:
+        response.headers.setdefault('Cache-Control', 'no-cache')
+        return response
+    response.headers.setdefault('Cache-Control', cache_policy(request.path))
+
+    # 静态文件（send_file）自带 ETag/Last-Modified，流式响应（SSE 等）不能缓冲
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
+
+    body = response.get_data()
+    etag, _ = response.get_etag()
+    if not etag:
+        etag = hashlib.sha256(body).hexdigest()
+
+    encoding = ''
+    if response.mimetype in COMPRESSIBLE_MIMETYPES and len(body) >= HTTP_COMPRESS_MIN_BYTES:
+        response.vary.add('Accept-Encoding')
+        encoding = _negotiate_encoding()
+    # 不同编码是不同的表示，强 ETag 需要区分
+    if encoding:
+        etag = f'{etag}-{encoding}'
+    response.set_etag(etag)
+
+    if request.if_none_match.contains(etag) or request.if_none_match.star_tag:
+        response.status_code = 304
+        response.set_data(b'')
+        for header in ('Content-Type', 'Content-Length'):
+            response.headers.pop(header, None)
+        return response
+
+    if encoding:
+        response.set_data(_compressed_body(etag, body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_http_cache(app):
+    """在 Flask 应用上注册响应缓存处理"""
+    app.after_request(_apply)
+    return app
@@ -0,0 +1,272 @@
+"""
+LLM 调用网关
+processor / weekly_summary / monthly_analysis / translator 共用一个 AsyncOpenAI 客户端（复用 HTTP 连接池），
+由网关统一负责：
+- 全局并发上限（asyncio.Semaphore）
+- 每分钟请求数 / token 数限流
+- 带随机抖动的指数退避重试
+- 按调用方统计延迟和 token 用量
+
+网关在后台线程里运行自己的事件循环：异步代码直接 await chat()，
+同步代码（Flask 视图、调度任务、线程池）调用 chat_sync()，多个线程的请求都在同一个事件循环上并发执行。
+"""
+
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import List, Dict, Optional
+
+try:
+    import openai
+    from openai import AsyncOpenAI
+    HAS_OPENAI = True
+except ImportError:
+    HAS_OPENAI = False
+
+# 以下默认值可用环境变量覆盖（创建网关时读取）：
+# DEEPSEEK_BASE_URL / LLM_MAX_CONCURRENCY / DEEPSEEK_RPM / DEEPSEEK_TPM
+DEFAULT_BASE_URL = 'https://api.deepseek.com'
+DEFAULT_MODEL = "deepseek-chat"
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_RPM = 0         # 每分钟请求数上限，0 表示不限（与原先直接调用 API 一致，需要时用 DEEPSEEK_RPM 开启）
+DEFAULT_TPM = 0         # 每分钟 token 上限，0 表示不限
+# 网络错误、超时、限流和服务端错误只在网关重试，调用方只需处理回复内容无效的情况
+DEFAULT_RETRIES = 2
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 20.0
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文约 0.6 token/字，其他字符约 0.3 token/字"""
+    if not text:
+        return 0
+    cjk = len(re.findall(r'[\u4e00-\u9fff]', text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+class RateLimiter:
+    """滑动窗口限流器，同时限制每分钟请求数和 token 数（线程安全）"""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0, window: float = 60.0):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.window = window
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def try_acquire(self, tokens: int = 0) -> float:
+        """尝试占用配额：成功返回 0，否则返回建议等待的秒数"""
+        if not self.rpm and not self.tpm:
+            return 0
+        # 单次请求超过整个 TPM 时按 TPM 计，避免永远等待
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            rpm_ok = not self.rpm or len(self._events) < self.rpm
+            tpm_ok = not self.tpm or self._tokens_in_window + tokens <= self.tpm
+            if rpm_ok and tpm_ok:
+                self._events.append((now, tokens))
+                self._tokens_in_window += tokens
+                return 0
+            wait = self.window - (now - self._events[0][0]) if self._events else 0.1
+        return max(wait, 0.05)
+
+    def acquire(self, tokens: int = 0):
+        """阻塞直到窗口内有足够的请求和 token 配额"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0):
+        """acquire 的协程版本，等待期间不阻塞事件循环"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+class CallerStats:
+    """单个调用方的累计统计"""
+
+    RECENT = 200
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_latency = 0.0
+        self.latencies = deque(maxlen=self.RECENT)
+
+    def to_dict(self) -> Dict:
+        recent = sorted(self.latencies)
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'avg_latency': round(self.total_latency / self.calls, 3) if self.calls else 0,
+            'p95_latency': round(p95, 3)
+        }
+
+
+class LLMGateway:
+    """共享的异步 LLM 网关"""
+
+    def __init__(self, api_key: str = None, base_url: str = None, max_concurrency: int = None,
+                 requests_per_minute: int = None, tokens_per_minute: int = None, timeout: float = 120.0):
+        self.api_key = api_key or os.getenv('DEEPSEEK_API_KEY')
+        self.base_url = base_url or os.getenv('DEEPSEEK_BASE_URL', DEFAULT_BASE_URL)
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(
+            int(os.getenv('DEEPSEEK_RPM', DEFAULT_RPM)) if requests_per_minute is None else requests_per_minute,
+            int(os.getenv('DEEPSEEK_TPM', DEFAULT_TPM)) if tokens_per_minute is None else tokens_per_minute
+        )
+        self._stats: Dict[str, CallerStats] = {}
+        self._stats_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def available(self) -> bool:
+        """是否已配置 API 且安装了 openai 库"""
+        return HAS_OPENAI and bool(self.api_key)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动后台事件循环线程（只启动一次）"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='llm-gateway', daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _ensure_client(self):
+        """在网关事件循环内创建客户端和信号量"""
+        if self._client is None:
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=self.timeout,
+                max_retries=0  # 重试由网关统一处理
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _caller_stats(self, caller: str) -> CallerStats:
+        with self._stats_lock:
+            if caller not in self._stats:
+                self._stats[caller] = CallerStats()
+            return self._stats[caller]
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """网络错误、超时、限流和服务端错误才重试"""
+        retryable = tuple(
+            getattr(openai, name) for name in
+            ('APIConnectionError', 'APITimeoutError', 'RateLimitError', 'InternalServerError')
+            if HAS_OPENAI and hasattr(openai, name)
+        )
+        return isinstance(error, retryable) or isinstance(error, asyncio.TimeoutError)
+
+    async def _chat(self, caller: str, messages: List[Dict], model: str = DEFAULT_MODEL,
+                    temperature: float = 0.3, max_tokens: int = 2000, timeout: float = None,
+                    retries: int = DEFAULT_RETRIES) -> Optional[str]:
+        """在网关事件循环内执行请求"""
+        if not self.available:
+            raise RuntimeError("未配置 DEEPSEEK_API_KEY 或未安装 openai")
+        self._ensure_client()
+        stats = self._caller_stats(caller)
+        prompt_estimate = sum(estimate_tokens(m.get('content') or '') for m in messages)
+
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire_async(prompt_estimate + max_tokens)
+            started = time.monotonic()
+            try:
+                async with self._semaphore:
+                    response = await self._client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        timeout=timeout or self.timeout
+                    )
+            except Exception as e:
+                if attempt < retries and self._is_retryable(e):
+                    attempt += 1
+                    with self._stats_lock:
+                        stats.retries += 1
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                    await asyncio.sleep(delay)
+                    continue
+                with self._stats_lock:
+                    stats.calls += 1
+                    stats.errors += 1
+                raise
+
+            latency = time.monotonic() - started
+            usage = getattr(response, 'usage', None)
+            with self._stats_lock:
+                stats.calls += 1
+                stats.total_latency += latency
+                stats.latencies.append(latency)
+                if usage:
+                    stats.prompt_tokens += getattr(usage, 'prompt_tokens', 0) or 0
+                    stats.completion_tokens += getattr(usage, 'completion_tokens', 0) or 0
+            return response.choices[0].message.content if response.choices else None
+
+    async def chat(self, caller: str, messages: List[Dict], **kwargs) -> Optional[str]:
+        """发送一次对话请求，返回回复文本（可能为 None）
+
+        请求总是在网关自己的事件循环上执行，因此可以从任意事件循环 await。
+
+        Args:
+            caller: 调用方名称，用于分项统计
+            **kwargs: model / temperature / max_tokens / timeout / retries
+        """
+        future = asyncio.run_coroutine_threadsafe(self._chat(caller, messages, **kwargs), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def chat_sync(self, caller: str, messages: List[Dict], **kwargs) -> Optional[str]:
+        """chat 的同步版本：提交到网关事件循环并阻塞等待结果"""
+        future = asyncio.run_coroutine_threadsafe(self._chat(caller, messages, **kwargs), self._ensure_loop())
+        return future.result()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """按调用方返回统计快照"""
+        with self._stats_lock:
+            return {caller: stats.to_dict() for caller, stats in self._stats.items()}
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_llm_gateway() -> LLMGateway:
+    """获取进程内共享的 LLM 网关"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
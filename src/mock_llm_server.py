@@ -0,0 +1,357 @@
+"""
+本地模拟 LLM 服务（OpenAI 兼容的 /chat/completions 接口）
+用于离线压测 processor / weekly_summary / monthly_analysis，不产生 DeepSeek 调用费用：
+- 回放录制的响应（JSONL，按完整消息哈希或提示词片段匹配），没有录制时按提示词类型合成合法响应
+- 可配置延迟（固定延迟 + 按输出 token 的生成耗时 + 随机抖动）
+- 按比例注入 429 / 500 错误和不完整的 JSON
+- 可选录制模式：转发到真实上游并把响应写入录制文件
+
+用法：
+    python src/mock_llm_server.py --port 8800 --latency 0.5 --error-rate 0.05 --malformed-rate 0.05
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8800 python main.py
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from llm_gateway import estimate_tokens
+
+
+def messages_key(messages: List[Dict]) -> str:
+    """录制/回放用的消息指纹"""
+    raw = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseLibrary:
+    """录制的响应库
+
+    每行一个 JSON：{"key": 消息指纹, "match": 提示词片段, "content": 响应文本}，
+    key 和 match 至少有一个；回放时优先按 key 精确匹配，其次按 match 子串匹配。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.by_key: Dict[str, str] = {}
+        self.by_match: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    if item.get('key'):
+                        self.by_key[item['key']] = item['content']
+                    if item.get('match'):
+                        self.by_match.append((item['match'], item['content']))
+
+    def __len__(self):
+        return len(self.by_key) + len(self.by_match)
+
+    def lookup(self, messages: List[Dict]) -> Optional[str]:
+        content = self.by_key.get(messages_key(messages))
+        if content is not None:
+            return content
+        text = '\n'.join(m.get('content') or '' for m in messages)
+        for match, content in self.by_match:
+            if match in text:
+                return content
+        return None
+
+    def record(self, messages: List[Dict], content: str):
+        """追加一条录制结果"""
+        if not self.path:
+            return
+        key = messages_key(messages)
+        with self._lock:
+            self.by_key[key] = content
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'content': content}, ensure_ascii=False) + '\n')
+
+
+def synthesize_response(messages: List[Dict], rng: random.Random) -> str:
+    """按提示词类型合成结构合法的响应"""
+    prompt = messages[-1].get('content') or '' if messages else ''
+    system = messages[0].get('content') or '' if messages else ''
+
+    # processor 深度分析：每篇 [文章N] 返回一个对象
+    article_count = len(re.findall(r'\[文章\d+\]', prompt))
+    if article_count:
+        return json.dumps([{
+            'index': i + 1,
+            'summary': f'模拟摘要{i + 1}',
+            'sentiment': round(rng.uniform(-1, 1), 2),
+            'sentiment_cn': round(rng.uniform(-1, 1), 2),
+            'sentiment_us': round(rng.uniform(-1, 1), 2),
+            'key_entities': ['模拟公司'],
+            'event_type': rng.choice(['财报', '政策', '并购', '其他']),
+            'impact_level': rng.choice(['高', '中', '低']),
+            'stock_impact': []
+        } for i in range(article_count)], ensure_ascii=False)
+
+    # processor 标题筛选：返回序号数组
+    if '快速判断以下新闻标题' in prompt:
+        total = len(re.findall(r'^\d+\. ', prompt, re.M))
+        picked = sorted(rng.sample(range(1, total + 1), min(20, total))) if total else []
+        return json.dumps(picked)
+
+    # 周报
+    if '一周市场总体分析' in prompt:
+        return json.dumps({
+            'stocks': [{'symbol': 'AAPL', 'name': '苹果', 'prediction': '上涨',
+                        'confidence': '中', 'reason': '模拟分析'}],
+            'summary': '模拟周度分析'
+        }, ensure_ascii=False)
+
+    # 月报主分析 / JSON 修复
+    if 'macro_overview' in prompt or 'JSON修复' in system:
+        return json.dumps({
+            'macro_overview': {'global_economy': '模拟', 'central_banks': '模拟', 'geopolitics': '模拟'},
+            'event_analysis': [],
+            'sector_rotation': {'overweight': [], 'underweight': [], 'watch': []},
+            'stock_recommendations': {'buy': [], 'sell': [], 'hold': []},
+            'key_dates': [],
+            'risk_warnings': {'main_uncertainties': [], 'black_swan_alerts': [], 'position_management': '模拟'},
+            'summary': '模拟月度分析'
+        }, ensure_ascii=False)
+
+    # 月报事件识别 / 影响评估
+    if 'impact_score' in prompt or '重大经济/金融事件' in prompt:
+        return '[]'
+
+    # 月报事件修正、追问等：自由文本或 JSON 对象
+    if '{' in prompt and '}' in prompt:
+        return '{}'
+    return '模拟回复'
+
+
+def corrupt_json(content: str, rng: random.Random) -> str:
+    """制造不完整/不规范的 JSON：截断、尾随逗号或包在 markdown 代码块里"""
+    mode = rng.choice(('truncate', 'trailing_comma', 'fenced'))
+    if mode == 'truncate' and len(content) > 10:
+        return content[:rng.randint(len(content) // 3, len(content) - 2)]
+    if mode == 'trailing_comma':
+        return re.sub(r'([}\]])\s*([}\]])$', r'\1,\2', content) if content.endswith((']', '}')) else content + ','
+    return f'```json\n{content}\n```\n以上为分析结果。'
+
+
+class MockConfig:
+    """模拟服务参数"""
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 0, jitter: float = 0.2,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, malformed_rate: float = 0.0,
+                 recordings: Optional[str] = None, upstream: Optional[str] = None,
+                 upstream_key: Optional[str] = None, seed: Optional[int] = None):
+        """
+        Args:
+            latency: 每个请求的固定延迟（秒）
+            tokens_per_second: 模拟生成速度，>0 时按输出 token 数追加延迟
+            jitter: 延迟的随机抖动比例（0.2 表示 ±20%）
+            error_rate: 返回 500 的比例
+            rate_limit_rate: 返回 429 的比例
+            malformed_rate: 返回不完整 JSON 的比例
+            recordings: 录制文件路径（JSONL）
+            upstream: 录制模式的上游地址，设置后未命中录制的请求会转发并写入录制文件
+            upstream_key: 上游 API key
+            seed: 随机种子，便于复现
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.library = ResponseLibrary(recordings)
+        self.upstream = upstream.rstrip('/') if upstream else None
+        self.upstream_key = upstream_key
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = {'requests': 0, 'replayed': 0, 'synthesized': 0, 'recorded': 0,
+                      'errors_500': 0, 'errors_429': 0, 'malformed': 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, name: str):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """处理 OpenAI 兼容的 chat completions 请求"""
+
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def config(self) -> MockConfig:
+        return self.server.config
+
+    def log_message(self, format, *args):
+        pass  # 压测时不逐条打印访问日志
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/stats'):
+            with self.config.stats_lock:
+                self._send_json(200, dict(self.config.stats))
+        else:
+            self._send_json(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': {'message': 'invalid json', 'type': 'invalid_request_error'}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found', 'type': 'invalid_request_error'}})
+            return
+
+        config = self.config
+        config.count('requests')
+        messages = request.get('messages') or []
+
+        if config.roll(config.rate_limit_rate):
+            config.count('errors_429')
+            self._send_json(429, {'error': {'message': 'mock rate limit', 'type': 'rate_limit_error'}},
+                            {'Retry-After': '1'})
+            return
+        if config.roll(config.error_rate):
+            config.count('errors_500')
+            time.sleep(config.latency)
+            self._send_json(500, {'error': {'message': 'mock server error', 'type': 'server_error'}})
+            return
+
+        content = config.library.lookup(messages)
+        if content is not None:
+            config.count('replayed')
+        elif config.upstream:
+            try:
+                content = self._forward(request)
+            except Exception as e:
+                self._send_json(502, {'error': {'message': f'upstream error: {e}', 'type': 'server_error'}})
+                return
+            config.library.record(messages, content)
+            config.count('recorded')
+        else:
+            with config.rng_lock:
+                content = synthesize_response(messages, config.rng)
+            config.count('synthesized')
+
+        if config.roll(config.malformed_rate):
+            with config.rng_lock:
+                content = corrupt_json(content, config.rng)
+            config.count('malformed')
+
+        prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in messages)
+        completion_tokens = estimate_tokens(content)
+        if not config.upstream:
+            delay = config.latency
+            if config.tokens_per_second > 0:
+                delay += completion_tokens / config.tokens_per_second
+            with config.rng_lock:
+                delay *= 1 + config.rng.uniform(-config.jitter, config.jitter)
+            time.sleep(max(delay, 0))
+
+        self._send_json(200, {
+            'id': f'mock-{time.time_ns()}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        })
+
+    def _forward(self, request: Dict) -> str:
+        """录制模式：把请求转发到真实上游"""
+        req = urllib.request.Request(
+            f'{self.config.upstream}/chat/completions',
+            data=json.dumps(request).encode('utf-8'),
+            headers={'Content-Type': 'application/json',
+                     'Authorization': f'Bearer {self.config.upstream_key}'}
+        )
+        with urllib.request.urlopen(req, timeout=180) as resp:
+            data = json.loads(resp.read())
+        return data['choices'][0]['message']['content'] or ''
+
+
+def start_mock_server(config: MockConfig = None, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """在后台线程启动模拟服务，返回 server（server.server_address[1] 为实际端口）"""
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    server.config = config or MockConfig()
+    thread = threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟 LLM 服务（OpenAI 兼容）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency', type=float, default=0.2, help='固定延迟（秒）')
+    parser.add_argument('--tokens-per-second', type=float, default=0, help='模拟生成速度，0 表示不按 token 计时')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟抖动比例')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='500 错误比例')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='429 错误比例')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='不完整 JSON 比例')
+    parser.add_argument('--recordings', help='录制文件（JSONL）')
+    parser.add_argument('--record-upstream', help='录制模式：转发到该上游（如 https://api.deepseek.com）')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, jitter=args.jitter,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate, recordings=args.recordings,
+        upstream=args.record_upstream, upstream_key=os.getenv('DEEPSEEK_API_KEY'), seed=args.seed
+    )
+    server = ThreadingHTTPServer((args.host, args.port), MockLLMHandler)
+    server.daemon_threads = True
+    server.config = config
+    print(f"模拟 LLM 服务已启动: http://{args.host}:{args.port} (录制 {len(config.library)} 条)")
+    print(f"使用方式: DEEPSEEK_BASE_URL=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n已停止")
+        print(json.dumps(config.stats, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
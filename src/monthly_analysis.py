@@ -14,8 +14,8 @@ import re
 import requests
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
-from openai import OpenAI
-import glob
+from llm_gateway import get_llm_gateway
+from database import save_report, get_latest_report, get_reports_since, new_report_key
 
 
 class MonthlyAnalysis:
@@ -150,13 +150,7 @@ class MonthlyAnalysis:
     
     def __init__(self):
         self.api_key = os.getenv('DEEPSEEK_API_KEY')
-        self.client = None
-        if self.api_key:
-            self.client = OpenAI(
-                api_key=self.api_key, 
-                base_url="https://api.deepseek.com",
-                timeout=120.0  # 增加超时时间到120秒
-            )
+        self.llm = get_llm_gateway()
         
         # 对话历史（用于追问）
         self.conversation_history: List[Dict] = []
@@ -177,15 +171,17 @@ class MonthlyAnalysis:
         events = []
         
         # 从历史报告中提取与事件相关的新闻
-        json_reports = glob.glob('data/reports_json/report_*.json')
-        json_reports.sort(key=os.path.getctime, reverse=True)
+        try:
+            json_reports = get_reports_since('hourly', datetime.now() - timedelta(days=31), limit=30)  # 最近30份报告
+        except Exception as e:
+            print(f"  读取历史报告失败: {e}")
+            json_reports = []
         
         # 收集最近的新闻
         recent_news = []
-        for report_path in json_reports[:30]:  # 最近30份报告
+        for row in json_reports:
             try:
-                with open(report_path, 'r', encoding='utf-8') as f:
-                    report = json.load(f)
+                report = row.get('data') or {}
                 
                 for event_type in ['high_impact', 'other']:
                     for news in report.get('events', {}).get(event_type, []):
@@ -197,7 +193,7 @@ class MonthlyAnalysis:
                 continue
         
         # 如果没有足够的新闻数据，跳过自动识别
-        if len(recent_news) < 5 or not self.client:
+        if len(recent_news) < 5 or not self.llm.available:
             print("  新闻数据不足，跳过自动识别")
             return events
         
@@ -219,14 +215,14 @@ class MonthlyAnalysis:
 如果没找到，返回 []"""
 
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'monthly.events',
                 model="deepseek-chat",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.2,
                 max_tokens=1500
             )
             
-            content = response.choices[0].message.content if response.choices else None
             if content:
                 # 提取JSON数组
                 start = content.find('[')
@@ -241,7 +237,7 @@ class MonthlyAnalysis:
     
     def _identify_high_impact_events(self, events: List[Dict]) -> List[Dict]:
         """用AI判断哪些事件会对股市产生重大影响"""
-        if not events or not self.client or len(events) < 2:
+        if not events or not self.llm.available or len(events) < 2:
             return events
         
         events_desc = "\n".join([f"- {e.get('date', '')}: {e.get('name', '')} ({e.get('importance', 'medium')})" for e in events[:15]])
@@ -254,14 +250,14 @@ class MonthlyAnalysis:
 [{{"date": "日期", "name": "名称", "impact_score": 8, "expected_direction": "bullish/bearish/neutral", "analysis": "简短分析"}}]"""
 
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'monthly.impact',
                 model="deepseek-chat",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.2,
                 max_tokens=1500
             )
             
-            content = response.choices[0].message.content if response.choices else None
             if content:
                 start = content.find('[')
                 end = content.rfind(']')
@@ -285,11 +281,12 @@ class MonthlyAnalysis:
     
     def _fix_json_with_ai(self, broken_json: str, events: List[Dict]) -> Optional[Dict]:
         """使用AI修复格式错误的JSON"""
-        if not self.client:
+        if not self.llm.available:
             return None
         
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'monthly.json_repair',
                 model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": "你是一个JSON修复专家。用户会给你一个格式有问题的JSON字符串，请修复它并返回有效的JSON。只返回修复后的JSON，不要有任何其他文字。"},
@@ -299,7 +296,6 @@ class MonthlyAnalysis:
                 max_tokens=6000
             )
             
-            content = response.choices[0].message.content if response.choices else None
             if content:
                 content = content.strip()
                 if content.startswith('```json'):
@@ -379,7 +375,7 @@ class MonthlyAnalysis:
                 seen_keys.add(key)
         
         # 4. 评估事件影响程度并排序
-        if all_events and self.client:
+        if all_events and self.llm.available:
             print("正在评估事件对市场的影响...")
             all_events = self._identify_high_impact_events(all_events)
         
@@ -400,18 +396,17 @@ class MonthlyAnalysis:
             key = e.get("id") or e.get("name", "")
             news_by_event[key] = []
         
-        # 获取过去N天的JSON报告
-        json_reports = glob.glob('data/reports_json/report_*.json')
+        # 获取过去N天的结构化报告
         cutoff = datetime.now() - timedelta(days=days_back)
+        try:
+            json_reports = get_reports_since('hourly', cutoff)
+        except Exception as e:
+            print(f"  读取历史报告失败: {e}")
+            json_reports = []
         
-        for report_path in json_reports:
+        for row in json_reports:
             try:
-                mtime = datetime.fromtimestamp(os.path.getctime(report_path))
-                if mtime < cutoff:
-                    continue
-                
-                with open(report_path, 'r', encoding='utf-8') as f:
-                    report = json.load(f)
+                report = row.get('data') or {}
                 
                 # 检查每个事件的关键词
                 all_news = []
@@ -446,22 +441,19 @@ class MonthlyAnalysis:
     
     def aggregate_weekly_data(self, days: int = 30) -> Dict:
         """聚合过去N天的周报数据"""
-        weekly_files = glob.glob('data/weekly/analysis_*.json')
-        weekly_files.sort(key=os.path.getctime, reverse=True)
-        
         cutoff = datetime.now() - timedelta(days=days)
+        try:
+            weekly_reports = get_reports_since('weekly', cutoff, limit=8)  # 最近8份周报（约2个月）
+        except Exception as e:
+            print(f"  读取周报失败: {e}")
+            weekly_reports = []
         
         all_stocks = {}
         summaries = []
         
-        for filepath in weekly_files[:8]:  # 最近8份周报（约2个月）
+        for report in weekly_reports:
             try:
-                mtime = datetime.fromtimestamp(os.path.getctime(filepath))
-                if mtime < cutoff:
-                    continue
-                    
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = report.get('data') or {}
                 
                 summaries.append(data.get('summary', ''))
                 
@@ -733,7 +725,7 @@ class MonthlyAnalysis:
   "summary": "月度总结（一段话概括）"
 }}"""
         
-        if not self.client:
+        if not self.llm.available:
             return {
                 "error": True,
                 "message": "未配置 DeepSeek API",
@@ -741,7 +733,8 @@ class MonthlyAnalysis:
             }
         
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'monthly.analysis',
                 model="deepseek-chat",
                 messages=[
                     {"role": "system", "content": "你是一位资深金融分析师，擅长宏观分析和投资策略制定。请提供专业、客观、可操作的分析建议。请严格返回有效的JSON格式，不要包含任何注释或额外文字。"},
@@ -751,7 +744,6 @@ class MonthlyAnalysis:
                 max_tokens=8000
             )
             
-            content = response.choices[0].message.content if response.choices else None
             if content:
                 # 清理可能的markdown代码块标记
                 content = content.strip()
@@ -815,7 +807,7 @@ class MonthlyAnalysis:
     
     def chat(self, user_message: str) -> str:
         """对话式追问"""
-        if not self.client:
+        if not self.llm.available:
             return "未配置 DeepSeek API，无法进行对话"
         
         if not self.current_analysis:
@@ -832,14 +824,15 @@ class MonthlyAnalysis:
         })
         
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'monthly.chat',
                 model="deepseek-chat",
                 messages=messages,
                 temperature=0.4,
                 max_tokens=2000
             )
             
-            assistant_reply = response.choices[0].message.content if response.choices else "抱歉，无法生成回复"
+            assistant_reply = content or "抱歉，无法生成回复"
             
             # 更新对话历史
             self.conversation_history.append({"role": "user", "content": user_message})
@@ -862,26 +855,26 @@ class MonthlyAnalysis:
         output_dir = os.path.join('data', 'monthly')
         os.makedirs(output_dir, exist_ok=True)
         
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = new_report_key('monthly')
         filename = os.path.join(output_dir, f'analysis_{timestamp}.json')
         
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(analysis, f, ensure_ascii=False, indent=2)
+        try:
+            save_report('monthly', json.dumps(analysis, ensure_ascii=False), file_path=filename,
+                        report_key=timestamp, data=analysis)
+        except Exception as e:
+            print(f"月度分析入库失败: {e}")
         
         return filename
     
     def get_latest_analysis(self) -> Optional[Dict]:
         """获取最新的月度分析"""
-        files = glob.glob('data/monthly/analysis_*.json')
-        if not files:
-            return None
-        
-        latest = max(files, key=os.path.getctime)
         try:
-            with open(latest, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
+            report = get_latest_report('monthly')
+        except Exception:
             return None
+        return report.get('data') if report else None
     
     def update_event_result(self, event_id: str, actual_result: str, market_reaction: str) -> Dict:
         """更新事件结果，用于回测和修正预测"""
@@ -907,18 +900,18 @@ class MonthlyAnalysis:
 
 返回JSON格式。"""
         
-        if not self.client:
+        if not self.llm.available:
             return {"error": "未配置API"}
         
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'monthly.event_update',
                 model="deepseek-chat",
                 messages=[{"role": "user", "content": update_prompt}],
                 temperature=0.3,
                 max_tokens=1500
             )
             
-            content = response.choices[0].message.content if response.choices else None
             if content:
                 start = content.find('{')
                 end = content.rfind('}')
@@ -0,0 +1,164 @@
+"""
+流水线阶段耗时统计
+记录每次 run_daily_report 各阶段（采集/去重/筛选/深度分析/报告/邮件）的耗时、条数、LLM token 和错误，
+写入 finance.db 的 pipeline_metrics 表，供 /api/metrics/pipeline 查看和长期对比。
+
+用法：
+    metrics = PipelineMetrics('daily_report')
+    with metrics.stage('dedup') as stage:
+        articles = deduplicator.deduplicate(articles)
+        stage.items = len(articles)
+    metrics.record('collect.source', seconds=1.2, items=15, label='Reuters', parent='collect.rss')
+    metrics.finish()
+"""
+
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from llm_gateway import get_llm_gateway
+
+
+def _llm_usage_snapshot() -> Dict[str, Dict[str, int]]:
+    """当前网关按调用方累计的 token 数"""
+    return {
+        caller: {'prompt': stats['prompt_tokens'], 'completion': stats['completion_tokens']}
+        for caller, stats in get_llm_gateway().get_stats().items()
+    }
+
+
+def _llm_usage_delta(before: Dict, after: Dict) -> Dict[str, Dict[str, int]]:
+    delta = {}
+    for caller, usage in after.items():
+        prev = before.get(caller, {'prompt': 0, 'completion': 0})
+        prompt = usage['prompt'] - prev['prompt']
+        completion = usage['completion'] - prev['completion']
+        if prompt or completion:
+            delta[caller] = {'prompt': prompt, 'completion': completion}
+    return delta
+
+
+class StageRecord:
+    """单个阶段的记录，阶段内可设置 items / error / detail"""
+
+    def __init__(self, stage: str, label: str = '', parent: Optional[str] = None, **detail):
+        self.stage = stage
+        self.label = label
+        # 所属的上级阶段（如逐源抓取属于 collect.rss），耗时已包含在上级阶段内
+        self.parent = parent
+        self.started_at = datetime.now()
+        self.seconds = 0.0
+        self.items = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.status = 'ok'
+        self.error: Optional[str] = None
+        self.detail: Dict = dict(detail)
+
+    def fail(self, error: str):
+        self.status = 'error'
+        self.error = error
+
+    def to_dict(self) -> Dict:
+        return {
+            'stage': self.stage,
+            'label': self.label,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_ms': round(self.seconds * 1000, 1),
+            'items': self.items,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'status': self.status,
+            'error': self.error,
+            'detail': self.detail
+        }
+
+
+class PipelineMetrics:
+    """一次流水线运行的阶段统计"""
+
+    def __init__(self, pipeline: str = 'daily_report'):
+        self.pipeline = pipeline
+        self.run_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.started_at = datetime.now()
+        self.records: List[StageRecord] = []
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._llm_start = _llm_usage_snapshot()
+
+    @contextmanager
+    def stage(self, name: str, label: str = '', **detail):
+        """计时一个阶段；阶段内抛出的异常记为错误后继续向上抛出
+
+        阶段期间网关新增的 token 计入该阶段，按调用方的明细写在 detail['llm']。
+        """
+        record = StageRecord(name, label, **detail)
+        llm_before = _llm_usage_snapshot()
+        started = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record.fail(str(e))
+            raise
+        finally:
+            record.seconds = time.perf_counter() - started
+            usage = _llm_usage_delta(llm_before, _llm_usage_snapshot())
+            if usage:
+                record.detail['llm'] = usage
+                record.prompt_tokens = sum(u['prompt'] for u in usage.values())
+                record.completion_tokens = sum(u['completion'] for u in usage.values())
+            self._add(record)
+
+    def record(self, name: str, seconds: float, items: int = 0, error: Optional[str] = None,
+               label: str = '', prompt_tokens: int = 0, completion_tokens: int = 0,
+               parent: Optional[str] = None, **detail) -> StageRecord:
+        """记录一个已在别处计时的阶段（如各数据源的抓取、各深度分析批次）
+
+        parent 为包含该阶段的上级阶段名，print_summary 不把它当作并列的顶层阶段
+        """
+        record = StageRecord(name, label, parent, **detail)
+        record.seconds = seconds or 0.0
+        record.items = items
+        record.prompt_tokens = prompt_tokens
+        record.completion_tokens = completion_tokens
+        if error:
+            record.fail(error)
+        self._add(record)
+        return record
+
+    def _add(self, record: StageRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def finish(self, status: str = 'ok', error: Optional[str] = None, items: int = 0) -> List[Dict]:
+        """记录总耗时并写入数据库，返回本次运行的全部记录"""
+        usage = _llm_usage_delta(self._llm_start, _llm_usage_snapshot())
+        total = StageRecord('total')
+        total.started_at = self.started_at
+        total.seconds = time.perf_counter() - self._started
+        total.items = items
+        total.prompt_tokens = sum(u['prompt'] for u in usage.values())
+        total.completion_tokens = sum(u['completion'] for u in usage.values())
+        if error:
+            total.fail(error)
+        elif status != 'ok':
+            total.status = status
+        self._add(total)
+
+        rows = [record.to_dict() for record in self.records]
+        try:
+            from database import save_pipeline_metrics
+            save_pipeline_metrics(self.run_id, self.pipeline, rows)
+        except Exception as e:
+            print(f"  ⚠ 保存流水线统计失败: {e}")
+        return rows
+
+    def print_summary(self):
+        """按执行顺序打印顶层阶段耗时（不含属于上级阶段的明细，避免重复计算）"""
+        top = [r for r in self.records if r.parent is None and r.stage != 'total']
+        if not top:
+            return
+        print("   阶段耗时: " + ", ".join(f"{r.stage} {r.seconds:.1f}s" for r in top))
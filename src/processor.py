@@ -1,43 +1,215 @@
 import os
 import json
 import time
-from openai import OpenAI
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional
+from database import get_news_hash, get_cached_analyses, save_cached_analyses, purge_analysis_cache
+from llm_gateway import get_llm_gateway, estimate_tokens
+
+# 深度分析批次并发数（可通过环境变量覆盖；请求数/token 限流由 llm_gateway 统一负责）
+DEFAULT_MAX_WORKERS = int(os.getenv('DEEPSEEK_MAX_WORKERS', '4'))
+
+# 分析缓存：提示词或模型变化时修改 PROMPT_VERSION，旧缓存自动失效
+MODEL_NAME = "deepseek-chat"
+PROMPT_VERSION = "analysis-v1"
+ANALYSIS_CACHE_TTL_HOURS = int(os.getenv('ANALYSIS_CACHE_TTL_HOURS', '72'))
+# 深度分析批次打包：按估算的输入/输出 token 填充批次，避免输出超过 max_tokens 被截断
+PROMPT_TOKEN_BUDGET = 12000         # 单批文章正文的输入 token 预算
+# 每篇文章分析结果（一个 JSON 对象，含中文摘要、实体和最多3个 stock_impact）的估算 token 数，
+# 不低于原先 20 篇 4000 token 的水平，避免长分析在 JSON 中途被截断
+OUTPUT_TOKENS_PER_ARTICLE = 200
+OUTPUT_MARGIN = 1.3                 # 输出估算的余量
+OUTPUT_JSON_OVERHEAD = 300          # JSON 数组外层和格式偏差
+MIN_OUTPUT_TOKENS = 4000            # 原固定 max_tokens，小批次也不低于它
+MAX_OUTPUT_TOKENS = 8000            # deepseek-chat 单次输出上限，单批预计输出不能超过它
+
+# 缓存的分析字段（即 _process_single_batch 在原文章之上附加的字段）
+ANALYSIS_FIELDS = ('summary', 'sentiment', 'sentiment_cn', 'sentiment_us', 'entities',
+                   'event_type', 'impact_level', 'stock_impact')
+
 
 class NLPProcessor:
-    def __init__(self):
-        api_key = os.getenv('DEEPSEEK_API_KEY')
-        if not api_key:
+    def __init__(self, max_workers: int = None, analysis_writer=None):
+        if not os.getenv('DEEPSEEK_API_KEY'):
             print("  ⚠️ WARNING: DEEPSEEK_API_KEY not found in environment!")
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url="https://api.deepseek.com",
-            timeout=120.0,  # 设置120秒超时
-            max_retries=2   # 自动重试2次
-        )
+        self.llm = get_llm_gateway()
+        self.max_workers = max_workers or DEFAULT_MAX_WORKERS
+        # 可选的 database.AnalysisWriter：每批分析结果完成即异步写回 news 表
+        self.analysis_writer = analysis_writer
+        self.cache_version = f"{MODEL_NAME}:{PROMPT_VERSION}"
+        self.last_stats: Dict = {}
+        # 最近一次 process_batch 的阶段明细，供流水线统计使用
+        self.last_filter_stats: Dict = {}
+        self.last_batch_stats: List[Dict] = []
+        # 最近一次 process_batch 中深度分析失败（所在批次异常或无结果）的文章
+        self.last_failed: List[Dict] = []
     
-    def process_batch(self, articles: List[Dict], batch_size=20) -> List[Dict]:
-        """两阶段处理：先筛选标题，再深度分析"""
+    def process_batch(self, articles: List[Dict], batch_size=20, max_workers: int = None) -> List[Dict]:
+        """两阶段处理：先筛选标题，再深度分析
+
+        阶段2按 token 预算打包批次（每批最多 batch_size 篇；阶段1最多保留20篇，超出 token 预算时拆成多批），各批次并发执行（max_workers 个线程，限流由共享的 LLM 网关负责），
+        结果按批次原顺序拼接，单个批次失败只丢弃该批次，丢弃的文章记录在 self.last_failed。
+        已缓存分析结果的文章不再调用 LLM，命中率记录在 self.last_stats。
+        """
+        self.last_failed = []
         if not articles:
             return []
         
         print(f"\n[阶段1] 标题筛选 ({len(articles)}条)...")
+        started = time.perf_counter()
         interesting = self._filter_by_title(articles)
+        self.last_filter_stats = {
+            'seconds': time.perf_counter() - started,
+            'input': len(articles),
+            'output': len(interesting)
+        }
+        self.last_batch_stats = []
         print(f"  筛选出 {len(interesting)} 条感兴趣的新闻")
         
         if not interesting:
             return []
         
-        print(f"\n[阶段2] 深度分析...")
+        # 命中分析缓存的文章直接复用结果，只把未分析过的送入阶段2
+        cached = self._load_cached_analyses(interesting)
+        pending = [a for a in interesting if self._article_hash(a) not in cached]
+        hits = len(interesting) - len(pending)
+        self.last_stats = {
+            'cache_hits': hits,
+            'cache_misses': len(pending),
+            'cache_hit_rate': round(hits / len(interesting), 3)
+        }
+        if hits:
+            print(f"  分析缓存命中 {hits}/{len(interesting)} 条")
+            self._submit_analyses([{**a, **cached[self._article_hash(a)]} for a in interesting
+                                   if self._article_hash(a) in cached])
+        
+        fresh = self._deep_analyze(pending, batch_size, max_workers) if pending else []
+        self._save_cached_analyses(fresh)
+        
+        fresh_by_hash = {self._article_hash(item): item for item in fresh}
+        self.last_failed = [a for a in pending if self._article_hash(a) not in fresh_by_hash]
         all_processed = []
-        for batch_start in range(0, len(interesting), batch_size):
-            batch = interesting[batch_start:batch_start + batch_size]
-            processed = self._process_single_batch(batch)
-            all_processed.extend(processed)
-            print(f"  已处理 {len(all_processed)}/{len(interesting)} 条")
+        for article in interesting:
+            url_hash = self._article_hash(article)
+            if url_hash in cached:
+                all_processed.append({**article, **cached[url_hash]})
+            elif url_hash in fresh_by_hash:
+                all_processed.append(fresh_by_hash[url_hash])
+        return all_processed
+    
+    def _deep_analyze(self, articles: List[Dict], batch_size: int, max_workers: Optional[int]) -> List[Dict]:
+        """阶段2：并发深度分析，按批次原顺序返回结果"""
+        batches = self._pack_batches(articles, batch_size)
+        workers = max(1, min(max_workers or self.max_workers, len(batches)))
+        print(f"\n[阶段2] 深度分析 ({len(batches)}个批次, 并发{workers})...")
+        
+        results: List[List[Dict]] = [[] for _ in batches]
+        self.last_batch_stats = [{} for _ in batches]
+        done_count = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='deep-analysis') as executor:
+            futures = {executor.submit(self._run_batch, i, batch): i for i, batch in enumerate(batches)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                    self._submit_analyses(results[index])
+                except Exception as e:
+                    print(f"  批次 {index+1} 处理异常，已跳过: {e}")
+                done_count += len(batches[index])
+                print(f"  已处理 {done_count}/{len(articles)} 条")
         
+        all_processed = []
+        for processed in results:
+            all_processed.extend(processed)
         return all_processed
     
+    def _run_batch(self, index: int, batch: List[Dict]) -> List[Dict]:
+        """执行单个批次并记录耗时和结果条数"""
+        started = time.perf_counter()
+        processed: List[Dict] = []
+        error = None
+        try:
+            processed = self._process_single_batch(batch)
+            if not processed:
+                error = '批次无有效结果'
+            return processed
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.last_batch_stats[index] = {
+                'batch': index + 1,
+                'articles': len(batch),
+                'processed': len(processed),
+                'seconds': time.perf_counter() - started,
+                'estimated_prompt_tokens': sum(
+                    estimate_tokens(self._format_article(i + 1, a)) for i, a in enumerate(batch)
+                ),
+                'error': error
+            }
+    
+    @staticmethod
+    def _format_article(index: int, article: Dict) -> str:
+        """深度分析提示词中单篇文章的文本"""
+        return f"\n[文章{index}]\n标题: {article['title']}\n来源: {article['source']}\n内容: {article['content']}\n"
+    
+    @staticmethod
+    def _required_output_tokens(count: int) -> int:
+        """count 篇文章的分析结果预计需要的输出 token（含余量和 JSON 开销）"""
+        return int(count * OUTPUT_TOKENS_PER_ARTICLE * OUTPUT_MARGIN) + OUTPUT_JSON_OVERHEAD
+
+    def _pack_batches(self, articles: List[Dict], max_items: int) -> List[List[Dict]]:
+        """按估算 token 顺序装箱：输入预算将超出、或预计输出将超过 MAX_OUTPUT_TOKENS 时开启新批次"""
+        batches: List[List[Dict]] = []
+        current: List[Dict] = []
+        prompt_tokens = 0
+        for article in articles:
+            tokens = estimate_tokens(self._format_article(len(current) + 1, article))
+            over_budget = (
+                prompt_tokens + tokens > PROMPT_TOKEN_BUDGET
+                or self._required_output_tokens(len(current) + 1) > MAX_OUTPUT_TOKENS
+                or len(current) >= max_items
+            )
+            if current and over_budget:
+                batches.append(current)
+                current, prompt_tokens = [], 0
+            current.append(article)
+            prompt_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    @staticmethod
+    def _article_hash(article: Dict) -> str:
+        return get_news_hash(article.get('url', ''), article.get('title', ''))
+    
+    def _load_cached_analyses(self, articles: List[Dict]) -> Dict[str, Dict]:
+        """读取分析缓存，数据库不可用时视为全部未命中"""
+        try:
+            purge_analysis_cache(ANALYSIS_CACHE_TTL_HOURS)
+            hashes = [self._article_hash(a) for a in articles]
+            return get_cached_analyses(hashes, self.cache_version, ANALYSIS_CACHE_TTL_HOURS)
+        except Exception as e:
+            print(f"  ⚠ 读取分析缓存失败: {e}")
+            return {}
+    
+    def _save_cached_analyses(self, processed: List[Dict]):
+        """把新分析结果写入缓存"""
+        if not processed:
+            return
+        try:
+            save_cached_analyses({
+                self._article_hash(item): {field: item.get(field) for field in ANALYSIS_FIELDS}
+                for item in processed
+            }, self.cache_version)
+        except Exception as e:
+            print(f"  ⚠ 写入分析缓存失败: {e}")
+    
+    def _submit_analyses(self, processed: List[Dict]):
+        """把分析结果交给后台写入线程（未配置时不写库）"""
+        if self.analysis_writer and processed:
+            self.analysis_writer.submit(processed)
+    
     def _filter_by_title(self, articles: List[Dict]) -> List[Dict]:
         """阶段1：仅用标题快速筛选"""
         titles_text = "\n".join([f"{i+1}. [{a['source']}] {a['title']}" 
@@ -60,47 +232,42 @@ class NLPProcessor:
 
 如果都不感兴趣，返回：[]"""
         
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = self.client.chat.completions.create(
-                    model="deepseek-chat",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.1,
-                    max_tokens=500,
-                    timeout=60.0  # 单次请求60秒超时
-                )
-                
-                content = response.choices[0].message.content
-                if content is None:
-                    return articles[:20]
-                indices = self._parse_indices(content, len(articles))
-
-                selected = []
-                seen = set()
-                for idx in indices:
-                    if idx in seen:
-                        continue
-                    seen.add(idx)
-                    selected.append(articles[idx-1])
-                    if len(selected) >= 20:
-                        break
-                return selected
+        try:
+            content = self.llm.chat_sync(
+                'processor.filter',
+                messages=[{"role": "user", "content": prompt}],
+                model=MODEL_NAME,
+                temperature=0.1,
+                max_tokens=500,
+                timeout=60.0  # 单次请求60秒超时
+            )
             
-            except Exception as e:
-                print(f"筛选失败 (尝试 {attempt+1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(3)  # 等待3秒后重试
+            if content is None:
+                return articles[:20]
+            indices = self._parse_indices(content, len(articles))
+
+            selected = []
+            seen = set()
+            for idx in indices:
+                if idx in seen:
                     continue
+                seen.add(idx)
+                selected.append(articles[idx-1])
+                if len(selected) >= 20:
+                    break
+            return selected
+        except Exception as e:
+            # 可重试的错误已由 LLM 网关退避重试，这里不再叠加重试
+            print(f"筛选失败: {e}")
         
         print(f"筛选最终失败，保留前20篇文章")
         return articles[:20]
     
     def _process_single_batch(self, articles: List[Dict]) -> List[Dict]:
         """处理单个批次"""
-        articles_text = ""
-        for i, article in enumerate(articles):
-            articles_text += f"\n[文章{i+1}]\n标题: {article['title']}\n来源: {article['source']}\n内容: {article['content']}\n"
+        articles_text = "".join(self._format_article(i + 1, article) for i, article in enumerate(articles))
+        # 按文章数预留输出空间，且不低于原先的固定值；_pack_batches 保证不会超过上限
+        max_tokens = min(MAX_OUTPUT_TOKENS, max(MIN_OUTPUT_TOKENS, self._required_output_tokens(len(articles))))
         
         prompt = f"""分析以下财经新闻，为每篇文章返回JSON数组：
 
@@ -133,15 +300,15 @@ class NLPProcessor:
         for attempt in range(max_retries):
             try:
                 print(f"    [DEBUG] 调用 DeepSeek API (尝试 {attempt+1}/{max_retries})...")
-                response = self.client.chat.completions.create(
-                    model="deepseek-chat",
+                content = self.llm.chat_sync(
+                    'processor.analysis',
                     messages=[{"role": "user", "content": prompt}],
+                    model=MODEL_NAME,
                     temperature=0.3,
-                    max_tokens=4000,  # 增加token限制以避免截断
+                    max_tokens=max_tokens,
                     timeout=90.0  # 单次请求90秒超时
                 )
                 
-                content = response.choices[0].message.content
                 print(f"    [DEBUG] API 响应长度: {len(content) if content else 0}")
                 if content is None:
                     print(f"    [DEBUG] API 返回空内容")
@@ -179,10 +346,9 @@ class NLPProcessor:
                 return processed
             
             except Exception as e:
-                print(f"批次处理失败 (尝试 {attempt+1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(5)  # 等待5秒后重试
-                    continue
+                # 可重试的错误已由 LLM 网关退避重试，这里只对空回复和无效 JSON 重试
+                print(f"批次处理失败: {e}")
+                break
         
         print(f"批次处理最终失败，跳过此批次")
         return []
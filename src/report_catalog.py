@@ -0,0 +1,115 @@
+"""
+报告目录（内存索引）
+在内存中维护所有报告的 (created_at, id, report_type, report_key, file_path) 有序索引，
+历史报告列表的分页和类型筛选直接在索引上切片，不再每次请求都 COUNT + OFFSET 查库。
+
+报告只追加不修改（新报告总是 reports 表的新一行），后台线程按 id 增量轮询新行，
+报告由 main.py 等其他进程写入时也能在一个轮询周期内出现在目录里。
+
+用法：
+    catalog = ReportCatalog()
+    total, entries = catalog.page(['hourly', 'daily'], page=1, per_page=20)
+"""
+
+import os
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from database import get_reports_after
+
+# 后台轮询间隔（秒）
+CATALOG_POLL_SECONDS = float(os.getenv('REPORT_CATALOG_POLL_SECONDS', '5'))
+
+# 索引条目，按 (created_at, id) 升序；created_at 为 UTC 'YYYY-MM-DD HH:MM:SS'，字符串序即时间序
+Entry = Tuple[str, int, str, str, str]
+
+
+class ReportCatalog:
+    """报告目录：全量有序索引 + 按类型组合懒加载的子索引"""
+
+    def __init__(self, poll_seconds: float = CATALOG_POLL_SECONDS,
+                 on_new: Callable[[List[Dict]], None] = None):
+        """on_new: 同步到新报告时的回调（参数为新报告行，首次全量加载不触发）"""
+        self.poll_seconds = poll_seconds
+        self.on_new = on_new
+        self._entries: List[Entry] = []
+        self._views: Dict[frozenset, List[Entry]] = {}
+        self._last_id = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def refresh(self) -> int:
+        """同步 id 大于已知最大 id 的新报告，返回新增条数"""
+        with self._refresh_lock:
+            rows = get_reports_after(self._last_id)
+            initial = not self._loaded
+            with self._lock:
+                for row in rows:
+                    entry = (row['created_at'], row['id'], row['report_type'],
+                             row['report_key'], row['file_path'])
+                    bisect.insort(self._entries, entry)
+                    for types, view in self._views.items():
+                        if entry[2] in types:
+                            bisect.insort(view, entry)
+                if rows:
+                    self._last_id = rows[-1]['id']
+                self._loaded = True
+            if rows and not initial and self.on_new:
+                self.on_new(rows)
+            return len(rows)
+
+    def start(self):
+        """启动后台轮询线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._poll, name='report-catalog', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"报告目录同步失败: {e}")
+
+    def ensure_loaded(self):
+        """首次使用时同步加载全量索引，并启动后台轮询"""
+        if not self._loaded:
+            self.refresh()
+        self.start()
+
+    def _view(self, report_types: Iterable[str]) -> List[Entry]:
+        """某个类型组合的有序子索引，首次使用时从全量索引筛出，之后随 refresh 增量维护"""
+        types = frozenset(report_types)
+        view = self._views.get(types)
+        if view is None:
+            view = [entry for entry in self._entries if entry[2] in types]
+            self._views[types] = view
+        return view
+
+    def page(self, report_types: Iterable[str], page: int = 1, per_page: int = 20) -> Tuple[int, List[Dict]]:
+        """按时间倒序分页，返回 (总数, 当前页条目)"""
+        self.ensure_loaded()
+        with self._lock:
+            view = self._view(report_types)
+            total = len(view)
+            # 索引升序存放，倒序第 start..end 条对应升序下标 [total-end, total-start)
+            start = max(page - 1, 0) * per_page
+            end = start + max(per_page, 0)
+            selected = view[max(total - end, 0):max(total - start, 0)]
+        return total, [{
+            'created_at': created_at,
+            'id': report_id,
+            'report_type': report_type,
+            'report_key': report_key,
+            'file_path': file_path,
+        } for created_at, report_id, report_type, report_key, file_path in reversed(selected)]
@@ -10,12 +10,8 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 import re
 
-# 尝试导入 DeepSeek API
-try:
-    from openai import OpenAI
-    HAS_OPENAI = True
-except ImportError:
-    HAS_OPENAI = False
+# DeepSeek API 调用统一走 LLM 网关（openai 未安装时 HAS_OPENAI 为 False）
+from llm_gateway import get_llm_gateway, HAS_OPENAI
 
 
 class TranslationCache:
@@ -171,19 +167,10 @@ class Translator:
         """
         self.use_api = use_api and HAS_OPENAI
         self.cache = TranslationCache()
-        self.client = None
+        self.llm = get_llm_gateway() if self.use_api else None
         
-        if self.use_api:
-            api_key = os.getenv('DEEPSEEK_API_KEY')
-            if api_key:
-                self.client = OpenAI(
-                    api_key=api_key,
-                    base_url="https://api.deepseek.com",
-                    timeout=60.0,   # 设置60秒超时
-                    max_retries=2   # 自动重试2次
-                )
-            else:
-                self.use_api = False
+        if self.use_api and not self.llm.available:
+            self.use_api = False
     
     def translate_text(self, text: str, use_api: bool = None) -> str:
         """
@@ -231,11 +218,12 @@ class Translator:
     
     def _api_translate(self, text: str) -> Optional[str]:
         """使用 DeepSeek API 翻译"""
-        if not self.client:
+        if not self.llm or not self.llm.available:
             return None
         
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'translator',
                 model="deepseek-chat",
                 messages=[
                     {
@@ -251,9 +239,10 @@ Only return the translation, no explanations."""
                     }
                 ],
                 max_tokens=500,
-                temperature=0.3
+                temperature=0.3,
+                timeout=60.0   # 单次请求60秒超时
             )
-            return response.choices[0].message.content.strip()
+            return content.strip() if content else None
         except Exception as e:
             print(f"Translation API error: {e}")
             return None
@@ -2,19 +2,13 @@ import os
 import json
 from datetime import datetime
 from typing import List, Dict
-from openai import OpenAI
+from llm_gateway import get_llm_gateway
+from database import save_report, new_report_key
 
 class WeeklySummary:
     def __init__(self):
         self.api_key = os.getenv('DEEPSEEK_API_KEY')
-        self.client = None
-        if self.api_key:
-            self.client = OpenAI(
-                api_key=self.api_key, 
-                base_url="https://api.deepseek.com",
-                timeout=120.0,  # 设置120秒超时
-                max_retries=2   # 自动重试2次
-            )
+        self.llm = get_llm_gateway()
     
     def generate(self, weekly_reports: List[Dict]) -> Dict:
         """生成一周总结和个股预测"""
@@ -74,17 +68,17 @@ class WeeklySummary:
   "summary": "一周市场总体分析"
 }}"""
         
-        if not self.client:
+        if not self.llm.available:
             return {'stocks': [], 'summary': '未配置 DeepSeek API，暂无周度分析'}
 
         try:
-            response = self.client.chat.completions.create(
+            content = self.llm.chat_sync(
+                'weekly_summary',
                 model="deepseek-chat",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
                 max_tokens=2000
             )
-            content = response.choices[0].message.content if response.choices else None
             if content:
                 start = content.find('{')
                 end = content.rfind('}')
@@ -113,7 +107,7 @@ class WeeklySummary:
             return ""
         output_dir = os.path.join('data', 'weekly')
         os.makedirs(output_dir, exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        timestamp = new_report_key('weekly')
         filename = os.path.join(output_dir, f'analysis_{timestamp}.json')
         payload = {
             **analysis,
@@ -121,5 +115,10 @@ class WeeklySummary:
         }
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(payload, f, ensure_ascii=False, indent=2)
+        try:
+            save_report('weekly', json.dumps(payload, ensure_ascii=False), file_path=filename,
+                        report_key=timestamp, data=payload)
+        except Exception as e:
+            print(f"周报入库失败: {e}")
         return filename
 
@@ -0,0 +1,22 @@
+"""
+pytest 公共配置：与各入口脚本一样把 src 加入导入路径
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, ROOT)
+
+import pytest
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """指向临时目录的 SQLite 库（已执行全部迁移）"""
+    import database
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'data' / 'finance.db'))
+    database.init_database()
+    yield database
+    database.close_connections()
@@ -0,0 +1,47 @@
+"""
+数据库基准脚本测试：合成数据生成与小规模完整运行
+"""
+
+import json
+import random
+from argparse import Namespace
+
+import database
+import benchmark_database
+
+
+def _args(**overrides):
+    args = dict(news=300, predictions=50, hot_searches=500, days=3, batch=100, queries=3, warmup=1,
+                seed=7, keep=False, compare=None, output=None)
+    args.update(overrides)
+    return Namespace(**args)
+
+
+def test_generators_are_seeded():
+    first = benchmark_database.make_news(20, 3, random.Random(1))
+    second = benchmark_database.make_news(20, 3, random.Random(1))
+    assert [n['title'] for n in first] == [n['title'] for n in second]
+    assert len({n['url'] for n in first}) == 20
+
+    reports = benchmark_database.make_reports(10, random.Random(1))
+    # 报告键在同类型内唯一，满足 reports 表的唯一索引
+    assert len({(r[0], r[1]) for r in reports}) == len(reports)
+    assert len(benchmark_database.make_hot_searches(500, 3, random.Random(1))) == 500
+
+
+def test_small_run_produces_fixed_structure(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(database, 'DB_PATH', database.DB_PATH)  # run_benchmark 会改写 DB_PATH，测试后恢复
+    monkeypatch.setattr(database, 'DATABASE_URL', '')
+    result = benchmark_database.run_benchmark(_args())
+
+    assert set(result) == {'config', 'environment', 'dataset', 'insert_news', 'operations'}
+    assert result['environment']['backend'] == 'sqlite'
+    assert result['dataset']['news'] == 300
+    assert result['insert_news']['count'] == 3
+    assert all(stats['count'] == 3 for stats in result['operations'].values())
+
+    # 与基线对比只打印，不修改结果
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(result), encoding='utf-8')
+    benchmark_database.compare(result, str(baseline))
+    assert '+0.0%' in capsys.readouterr().out
@@ -0,0 +1,174 @@
+"""
+DataCollector 采集测试（并发抓取、条件请求缓存、增量游标）
+"""
+
+import time
+from datetime import datetime
+
+import feedparser
+import yaml
+
+from collector import DataCollector, FeedCache, FeedCursor
+
+
+def _make_collector(tmp_path, delays):
+    config = {
+        'fetch': {'max_workers': 4, 'source_timeout': 5, 'global_timeout': 0.3},
+        'rss_sources': [{'name': name, 'url': f'https://example.com/{name}.rss', 'category': 'test'}
+                        for name in delays],
+    }
+    config_path = tmp_path / 'sources.yaml'
+    config_path.write_text(yaml.safe_dump(config), encoding='utf-8')
+    collector = DataCollector(str(config_path), str(tmp_path / 'user_config.yaml'),
+                              str(tmp_path / 'feed_cache.json'), str(tmp_path / 'feed_cursors.json'))
+
+    def fake_fetch(url, timeout=15):
+        name = url.rsplit('/', 1)[-1][:-len('.rss')]
+        time.sleep(delays[name])
+        published = list(time.localtime())[:9]
+        return feedparser.FeedParserDict(entries=[
+            {'title': f'{name} news {i}', 'link': f'https://example.com/{name}/{i}',
+             'summary': 'summary', 'published_parsed': published}
+            for i in range(3)
+        ])
+
+    collector._fetch_feed_with_timeout = fake_fetch
+    return collector
+
+
+def test_slow_source_entries_are_not_committed_after_global_timeout(tmp_path):
+    collector = _make_collector(tmp_path, {'fast': 0, 'slow': 1.0})
+
+    articles = collector.fetch_latest()
+    assert {a['source'] for a in articles} == {'fast'}
+    assert collector.last_fetch_stats['slow']['status'] == 'timeout'
+
+    # 慢源的线程在截止时间之后才完成，其条目不能随 commit 被标记为已见
+    time.sleep(1.2)
+    collector.commit_cursors()
+    assert 'slow' not in collector.cursor.cursors
+    assert len(collector.cursor.cursors['fast']['seen']) == 3
+
+    # 下一轮慢源及时返回时，之前未处理的条目仍会发出；快源已提交的条目不再重复
+    fresh = _make_collector(tmp_path, {'fast': 0, 'slow': 0})
+    articles = fresh.fetch_latest()
+    assert {a['source'] for a in articles} == {'slow'}
+    assert len(articles) == 3
+
+
+def test_undated_entry_does_not_hide_later_entries(tmp_path):
+    cursor = FeedCursor(str(tmp_path / 'cursors.json'))
+    # 无发布时间的条目以本地采集时刻代替，在 UTC+8 下比 feed 中的 UTC 时间晚约 8 小时
+    cursor.stage('src', [
+        {'url': 'https://example.com/dated', 'published_at': '2025-11-15T06:00:00'},
+        {'url': 'https://example.com/undated', 'published_at': '2025-11-15T14:00:00'},
+    ])
+    cursor.commit()
+
+    fresh = [
+        {'url': 'https://example.com/dated', 'published_at': '2025-11-15T06:00:00'},
+        {'url': 'https://example.com/new', 'published_at': '2025-11-15T06:30:00'},
+        {'url': 'https://example.com/late', 'published_at': '2025-11-15T01:00:00'},
+    ]
+    assert [a['url'] for a in cursor.filter_new('src', fresh)] == [
+        'https://example.com/new', 'https://example.com/late']
+
+
+def test_commit_skips_excluded_entries(tmp_path):
+    cursor = FeedCursor(str(tmp_path / 'cursors.json'))
+    articles = [{'url': f'https://example.com/{i}', 'published_at': '2025-11-15T06:00:00'} for i in range(3)]
+    cursor.stage('src', articles)
+    cursor.commit(exclude=[articles[1]])
+
+    reloaded = FeedCursor(str(tmp_path / 'cursors.json'))
+    assert reloaded.filter_new('src', articles) == [articles[1]]
+
+
+def test_sources_are_fetched_concurrently_in_config_order(tmp_path):
+    collector = _make_collector(tmp_path, {'a': 0.2, 'b': 0.2, 'c': 0.2, 'd': 0})
+
+    started = time.monotonic()
+    articles = collector.fetch_latest(global_timeout=5)
+    elapsed = time.monotonic() - started
+
+    # 4 个源并发抓取，总耗时约等于最慢的源而不是各源之和
+    assert elapsed < 0.6
+    assert [a['source'] for a in articles[::3]] == ['a', 'b', 'c', 'd']
+    assert {name: stats['status'] for name, stats in collector.last_fetch_stats.items()} == {
+        'a': 'ok', 'b': 'ok', 'c': 'ok', 'd': 'ok'}
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, body=b'', headers=None, chunk_delay=0):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.chunk_delay = chunk_delay
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), 16):
+            time.sleep(self.chunk_delay)
+            yield self.body[i:i + 16]
+
+
+def test_source_deadline_covers_slow_downloads(tmp_path, monkeypatch):
+    import collector as collector_module
+    collector = _make_collector(tmp_path, {})
+    del collector._fetch_feed_with_timeout
+    # 每个分块都在读取超时之内到达，但整体下载超过该源的截止时间
+    monkeypatch.setattr(collector_module.requests, 'get',
+                        lambda url, **kwargs: _FakeResponse(body=b'x' * 160, chunk_delay=0.05))
+
+    feed = collector._fetch_feed_with_timeout('https://example.com/slow.rss', timeout=0.2)
+    assert feed.get('fetch_error') == 'timeout'
+
+
+RSS_BODY = b'''<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>
+<item><title>First</title><link>https://example.com/1</link><description>one</description>
+<pubDate>Sat, 15 Nov 2025 06:00:00 GMT</pubDate></item>
+</channel></rss>'''
+
+
+def test_not_modified_feed_reuses_cached_entries(tmp_path, monkeypatch):
+    import collector as collector_module
+    collector = _make_collector(tmp_path, {})
+    del collector._fetch_feed_with_timeout
+    url = 'https://example.com/feed.rss'
+    requests_seen = []
+
+    def fake_get(url, headers=None, **kwargs):
+        requests_seen.append(headers)
+        if headers.get('If-None-Match') == '"v1"':
+            return _FakeResponse(status_code=304)
+        return _FakeResponse(body=RSS_BODY, headers={'ETag': '"v1"', 'Last-Modified': 'Sat, 15 Nov 2025 06:00:00 GMT'})
+
+    monkeypatch.setattr(collector_module.requests, 'get', fake_get)
+    first = collector._fetch_feed_with_timeout(url)
+    assert [e['title'] for e in first['entries']] == ['First']
+    assert 'If-None-Match' not in requests_seen[0]
+    collector.feed_cache.save()
+
+    # 新进程从磁盘加载缓存，带校验值发起条件请求，304 时复用上次的条目
+    collector.feed_cache = collector_module.FeedCache(str(tmp_path / 'feed_cache.json'))
+    second = collector._fetch_feed_with_timeout(url)
+    assert requests_seen[1]['If-Modified-Since'] == 'Sat, 15 Nov 2025 06:00:00 GMT'
+    assert second.get('not_modified')
+    parsed = collector._parse_entries({'name': 'feed'}, second, datetime(2025, 11, 14), 15)
+    assert [(a['title'], a['url'], a['content']) for a in parsed] == [('First', 'https://example.com/1', 'one')]
+
+
+def test_feed_without_validators_is_not_cached(tmp_path):
+    cache = FeedCache(str(tmp_path / 'feed_cache.json'))
+    cache.update('https://example.com/a.rss', None, None, [{'title': 'x'}])
+    assert cache.conditional_headers('https://example.com/a.rss') == {}
+    cache.save()
+    assert not (tmp_path / 'feed_cache.json').exists()
@@ -0,0 +1,57 @@
+"""
+首页看板快照测试
+"""
+
+import os
+from datetime import datetime
+
+import database
+import dashboard
+
+
+def test_snapshot_path_follows_db_path(tmp_path, monkeypatch):
+    monkeypatch.delenv('DASHBOARD_SNAPSHOT_PATH', raising=False)
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'finance.db'))
+    assert dashboard.dashboard_snapshot_path() == str(tmp_path / 'dashboard.json')
+
+    etag = dashboard.publish_dashboard('测试报告', datetime(2025, 11, 15, 22, 12, 3), 7)
+    assert (tmp_path / 'dashboard.json').exists()
+    assert dashboard.read_dashboard_snapshot(7)[1] == etag
+
+
+def test_snapshot_lands_next_to_a_relocated_db(tmp_path, monkeypatch):
+    # benchmark 等工具把 DB_PATH 指向临时目录时，快照也应写到该目录，而不是 data/
+    monkeypatch.delenv('DASHBOARD_SNAPSHOT_PATH', raising=False)
+    workdir = tmp_path / 'bench'
+    monkeypatch.setattr(database, 'DB_PATH', str(workdir / 'finance.db'))
+
+    path = dashboard.dashboard_snapshot_path()
+    assert os.path.dirname(path) == str(workdir)
+    dashboard.publish_dashboard('测试报告', datetime(2025, 11, 15, 22, 12, 3), 3)
+    assert os.listdir(workdir) == ['dashboard.json']
+    assert dashboard.read_dashboard_snapshot(3)[0]
+
+
+def test_snapshot_ignored_for_other_report(tmp_path):
+    path = str(tmp_path / 'dashboard.json')
+    dashboard.publish_dashboard('测试报告', datetime(2025, 11, 15, 22, 12, 3), 7, path=path)
+    assert dashboard.read_dashboard_snapshot(8, path=path) is None
+    (tmp_path / 'dashboard.json').write_text('not json', encoding='utf-8')
+    assert dashboard.read_dashboard_snapshot(7, path=path) is None
+
+
+def test_api_latest_skips_stale_snapshot(temp_db, monkeypatch):
+    import json
+    import web_app
+    monkeypatch.delenv('DASHBOARD_SNAPSHOT_PATH', raising=False)
+    client = web_app.app.test_client()
+
+    first = temp_db.save_report('hourly', '第一份报告', report_key='20251115_100000',
+                                created_at=datetime(2025, 11, 15, 10, 0, 0))
+    dashboard.publish_dashboard('第一份报告', datetime(2025, 11, 15, 10, 0, 0), first)
+    assert json.loads(client.get('/api/latest').data)['content'] == '第一份报告'
+
+    # 第二份报告入库后快照发布失败：快照仍是第一份，接口应按数据库中的最新报告组装
+    temp_db.save_report('hourly', '第二份报告', report_key='20251115_110000',
+                        created_at=datetime(2025, 11, 15, 11, 0, 0))
+    assert json.loads(client.get('/api/latest').data)['content'] == '第二份报告'
@@ -0,0 +1,236 @@
+"""
+database 模块测试（临时 SQLite 库）
+"""
+
+from datetime import datetime
+
+import pytest
+
+
+def test_hot_queries_use_indexes(temp_db):
+    assert temp_db.check_query_plans() == {}
+
+
+def test_query_plan_check_reports_full_scan(temp_db):
+    with temp_db.get_connection() as conn:
+        conn.execute('DROP INDEX idx_hot_collected')
+        conn.commit()
+    problems = temp_db.check_query_plans()
+    assert list(problems) == ['get_latest_hot_searches']
+    assert any(step.startswith('SCAN hot_searches') for step in problems['get_latest_hot_searches'])
+
+
+def test_hot_query_functions_run(temp_db):
+    """HOT_QUERIES 覆盖的查询函数在迁移后的空库上都能执行"""
+    temp_db.get_unprocessed_news()
+    temp_db.get_recent_news(source='reuters')
+    temp_db.get_latest_hot_searches('weibo')
+    temp_db.get_crypto_prices(['BTC'])
+    temp_db.get_crypto_history('BTC', 'minute')
+    temp_db.get_reports(['hourly', 'daily'], limit=10)
+    temp_db.get_reports_after(0)
+    temp_db.get_reports_since('hourly', datetime(2000, 1, 1), limit=5)
+    temp_db.get_report_by_key('weekly', '20251115_221203')
+    assert temp_db.get_prediction_accuracy('AAPL')['total'] == 0
+
+
+def _add_news(database):
+    database.bulk_insert_news([
+        {'title': '苹果公司发布新款芯片', 'content': 'Apple unveils new silicon for Mac', 'source': 'a',
+         'url': 'https://example.com/1'},
+        {'title': '央行宣布降准', 'content': 'PBOC cuts reserve requirement ratio', 'source': 'b',
+         'url': 'https://example.com/2'},
+    ])
+
+
+def test_search_news_uses_fts(temp_db):
+    _add_news(temp_db)
+    assert [n['url'] for n in temp_db.search_news('silicon 苹果')] == ['https://example.com/1']
+    assert [n['url'] for n in temp_db.search_news('降准')] == ['https://example.com/2']
+
+
+def test_search_news_without_trigram_falls_back_to_like(tmp_path, monkeypatch):
+    import database
+    monkeypatch.setattr(database, 'DB_PATH', str(tmp_path / 'finance.db'))
+    monkeypatch.setattr(database, '_fts_trigram_supported', lambda conn: False)
+    try:
+        database.init_database()
+        with database.get_connection() as conn:
+            assert not database._has_news_fts(conn)
+        _add_news(database)
+        assert [n['url'] for n in database.search_news('silicon 苹果')] == ['https://example.com/1']
+        assert [n['url'] for n in database.search_news('reserve requirement')] == ['https://example.com/2']
+    finally:
+        database.close_connections()
+
+
+@pytest.fixture
+def shanghai_tz():
+    import time
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('TZ', 'Asia/Shanghai')
+        time.tzset()
+        yield
+    time.tzset()
+
+
+def test_reports_created_at_is_utc(temp_db, shanghai_tz):
+    local = datetime(2025, 11, 15, 22, 12, 3)
+    temp_db.save_report('hourly', 'report', report_key='20251115_221203', created_at=local)
+    report = temp_db.get_report_by_key('hourly', '20251115_221203')
+    assert report['created_at'] == '2025-11-15 14:12:03'
+    assert temp_db.report_local_time(report['created_at']) == local
+    assert len(temp_db.get_reports_since('hourly', datetime(2025, 11, 15, 22, 0))) == 1
+    assert temp_db.get_reports_since('hourly', datetime(2025, 11, 15, 22, 30)) == []
+
+
+def test_back_to_back_reports_get_distinct_keys(temp_db):
+    at = datetime(2025, 11, 15, 22, 12, 3)
+    keys = []
+    for i in range(3):
+        key = temp_db.new_report_key('hourly', at)
+        temp_db.save_report('hourly', f'report {i}', report_key=key, created_at=at)
+        keys.append(key)
+    assert keys == ['20251115_221203', '20251115_221203_2', '20251115_221203_3']
+    assert [temp_db.get_report_by_key('hourly', k)['content'] for k in keys] == ['report 0', 'report 1', 'report 2']
+    # 序号只在同类型内递增
+    assert temp_db.new_report_key('daily', at) == '20251115_221203'
+
+
+def _crypto(symbol, price, volume=100.0):
+    return {'symbol': symbol, 'name': symbol, 'price_usd': price, 'price_cny': price * 7,
+            'change_24h': 1.0, 'volume_24h': volume, 'market_cap': price * 1000}
+
+
+def test_crypto_latest_is_upserted(temp_db, monkeypatch):
+    monkeypatch.setattr(temp_db, '_utc_now', lambda: '2025-11-15 14:12:03')
+    temp_db.save_crypto_prices([_crypto('BTC', 100.0), _crypto('ETH', 10.0)])
+    temp_db.save_crypto_prices([_crypto('BTC', 101.0)])
+    with temp_db.get_connection() as conn:
+        rows = {r['symbol']: r['price_usd'] for r in conn.execute('SELECT * FROM crypto_latest')}
+    assert rows == {'BTC': 101.0, 'ETH': 10.0}
+
+
+def test_crypto_samples_are_downsampled_into_buckets(temp_db, monkeypatch):
+    samples = [('2025-11-15 14:12:03', 100.0), ('2025-11-15 14:12:40', 104.0),
+               ('2025-11-15 14:12:59', 98.0), ('2025-11-15 14:47:00', 101.0), ('2025-11-15 15:01:00', 99.0)]
+    for now, price in samples:
+        monkeypatch.setattr(temp_db, '_utc_now', lambda now=now: now)
+        temp_db.save_crypto_prices([_crypto('BTC', price)])
+
+    minutes = temp_db.get_crypto_history('BTC', 'minute')
+    assert [m['bucket'] for m in minutes] == ['2025-11-15T14:12', '2025-11-15T14:47', '2025-11-15T15:01']
+    first = minutes[0]
+    assert (first['open'], first['high'], first['low'], first['close'], first['samples']) == (100.0, 104.0, 98.0, 98.0, 3)
+
+    hours = temp_db.get_crypto_history('BTC', 'hour')
+    assert [(h['bucket'], h['open'], h['close'], h['samples']) for h in hours] == [
+        ('2025-11-15T14', 100.0, 101.0, 4), ('2025-11-15T15', 99.0, 99.0, 1)]
+    days = temp_db.get_crypto_history('BTC', 'day')
+    assert [(d['bucket'], d['high'], d['low'], d['samples']) for d in days] == [('2025-11-15', 104.0, 98.0, 5)]
+
+
+def test_crypto_history_range_and_purge(temp_db, monkeypatch):
+    for now in ('2020-01-01 00:00:00', '2020-01-02 00:00:00', '2020-01-03 00:00:00'):
+        monkeypatch.setattr(temp_db, '_utc_now', lambda now=now: now)
+        temp_db.save_crypto_prices([_crypto('BTC', 1.0), _crypto('ETH', 2.0)])
+
+    days = temp_db.get_crypto_history('BTC', 'day', since='2020-01-02T00:00', until='2020-01-02T23:59')
+    assert [d['bucket'] for d in days] == ['2020-01-02']
+    assert len(temp_db.get_crypto_history('ETH', 'hour', since='2020-01-02 00:00:00')) == 2
+
+    # 分钟桶和小时桶过期删除，天桶保留
+    assert temp_db.purge_crypto_history(minute_days=2, hour_days=90) == {'minute': 6, 'hour': 6}
+    assert len(temp_db.get_crypto_history('BTC', 'day')) == 3
+    with pytest.raises(ValueError):
+        temp_db.get_crypto_history('BTC', 'second')
+
+
+def _news(i, **extra):
+    return {'title': f'新闻{i}', 'content': '正文', 'source': 'test', 'category': 'general',
+            'url': f'https://example.com/{i}', 'published_at': '2025-11-15T06:00:00', **extra}
+
+
+def test_bulk_insert_news_counts_inserted_and_ignored(temp_db):
+    assert temp_db.bulk_insert_news([_news(i) for i in range(5)]) == {'inserted': 5, 'ignored': 0}
+    # 已存在的和批内重复的条目都被忽略
+    batch = [_news(3), _news(5), _news(5), _news(6)]
+    assert temp_db.bulk_insert_news(batch) == {'inserted': 2, 'ignored': 2}
+    assert temp_db.insert_news([]) == 0
+    with temp_db.get_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) AS cnt FROM news').fetchone()['cnt'] == 7
+
+
+def test_save_hot_searches_writes_all_items(temp_db):
+    temp_db.save_hot_searches('weibo', [{'rank': i, 'title': f'热搜{i}', 'hot_value': 100 - i} for i in range(1, 4)])
+    assert [r['title'] for r in temp_db.get_latest_hot_searches('weibo')] == ['热搜1', '热搜2', '热搜3']
+
+
+def test_update_news_analyses_matches_by_id_or_hash(temp_db):
+    temp_db.bulk_insert_news([_news(i) for i in range(3)])
+    with temp_db.get_connection() as conn:
+        first_id = conn.execute("SELECT id FROM news WHERE url = 'https://example.com/0'").fetchone()['id']
+
+    # process_batch 的输出不带 id，按 url/title 的哈希匹配；字段名 sentiment / stock_impact 自动映射
+    updated = temp_db.update_news_analyses([
+        {'id': first_id, 'summary': '按主键', 'sentiment_overall': 0.2},
+        {**_news(1), 'summary': '按哈希', 'sentiment': -0.4, 'stock_impact': [{'symbol': 'AAPL'}]},
+        {**_news(9), 'summary': '不存在'},
+    ])
+    assert updated == 2
+    with temp_db.get_connection() as conn:
+        rows = {r['url'][-1]: dict(r) for r in conn.execute('SELECT * FROM news')}
+    assert (rows['0']['summary'], rows['0']['sentiment_overall'], rows['0']['is_processed']) == ('按主键', 0.2, 1)
+    assert (rows['1']['summary'], rows['1']['sentiment_overall']) == ('按哈希', -0.4)
+    assert rows['1']['related_stocks'] == '[{"symbol": "AAPL"}]'
+    assert rows['2']['is_processed'] == 0
+
+
+def test_analysis_writer_flushes_queued_batches(temp_db):
+    temp_db.bulk_insert_news([_news(i) for i in range(4)])
+    writer = temp_db.AnalysisWriter()
+    try:
+        for i in range(4):
+            writer.submit([{**_news(i), 'summary': f'摘要{i}'}])
+        writer.flush()
+        assert (writer.written, writer.errors) == (4, 0)
+        assert [n['summary'] for n in temp_db.get_unprocessed_news()] == []
+    finally:
+        writer.close()
+    assert not writer._thread.is_alive()
+
+
+def test_news_retention_archives_content_and_keeps_rollups(temp_db, tmp_path):
+    from datetime import timedelta
+    now = datetime.now()
+    ages = {'old': 400, 'cold': 40, 'hot': 1}
+    temp_db.bulk_insert_news([
+        _news(name, content=f'{name} 正文' * 20, published_at=(now - timedelta(days=days)).isoformat())
+        for name, days in ages.items()])
+    temp_db.update_news_analyses([{**_news(name), 'sentiment': 0.5, 'impact_level': '高'} for name in ages])
+    temp_db.refresh_sentiment_rollups()
+    old_day = (now - timedelta(days=400)).isoformat()[:10]
+
+    stats = temp_db.run_news_retention(content_days=30, days=365)
+    assert (stats['archived'], stats['deleted']) == (2, 1)
+
+    with temp_db.get_connection() as conn:
+        rows = {r['url'].rsplit('/', 1)[-1]: dict(r) for r in conn.execute('SELECT * FROM news')}
+    assert set(rows) == {'cold', 'hot'}
+    assert rows['cold']['content'] is None and rows['cold']['archived_at']
+    assert rows['hot']['content'] and rows['hot']['archived_at'] is None
+
+    # 归档库按发布月份存放，正文可完整读回
+    archive_dir = tmp_path / 'data' / 'archive'
+    assert len(list(archive_dir.glob('news_*.db'))) == 2
+    cold = temp_db.load_archived_news((now - timedelta(days=40)).isoformat()[:7])
+    assert [(n['url'], n['content']) for n in cold] == [('https://example.com/cold', 'cold 正文' * 20)]
+
+    # 热表中删除的旧新闻，其天级汇总保留
+    daily = {r['bucket']: r for r in temp_db.get_sentiment_rollup('daily')}
+    assert daily[old_day]['news_count'] == 1
+    assert daily[old_day]['sentiment_overall'] == 0.5
+    assert daily[old_day]['high_impact_count'] == 1
+
+    # 再次运行不会重复归档
+    assert temp_db.run_news_retention(content_days=30, days=365)['archived'] == 0
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+from db_backends import SQLiteBackend, StorageBackend
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+    class Partial(StorageBackend):
+        def _checkout(self):
+            return None
+
+        def _checkin(self, conn):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_sqlite_insert_returning_id(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'test.db'))
+    try:
+        with backend.connection() as conn:
+            conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT)')
+            first = backend.insert_returning_id(conn, 'INSERT INTO t (name) VALUES (?)', ('a',))
+            second = backend.insert_returning_id(conn, 'INSERT INTO t (name) VALUES (?)', ('b',))
+            conn.commit()
+        assert (first, second) == (1, 2)
+    finally:
+        backend.close_all()
+
+
+def test_sqlite_upsert_updates_in_place(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'test.db'))
+    try:
+        with backend.connection() as conn:
+            conn.execute('CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT UNIQUE, '
+                         'price REAL, is_active INTEGER DEFAULT 1)')
+            sql = backend.upsert_sql('t', ('symbol', 'price'), ('symbol',))
+            conn.execute(sql, ('BTC', 1.0))
+            conn.execute('UPDATE t SET is_active = 0')
+            conn.execute(sql, ('BTC', 2.0))
+            conn.commit()
+            rows = [tuple(r) for r in conn.execute('SELECT id, symbol, price, is_active FROM t')]
+        # 原行原地更新：主键不变，未列出的列保持原值
+        assert rows == [(1, 'BTC', 2.0, 0)]
+    finally:
+        backend.close_all()
+
+
+def test_sqlite_pool_reuses_connections_in_wal_mode(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'test.db'), max_idle=1)
+    try:
+        with backend.connection() as outer:
+            # 同一线程内嵌套调用共享同一连接
+            with backend.connection() as inner:
+                assert inner is outer
+            assert outer.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            assert outer.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        with backend.connection() as again:
+            assert again is outer
+    finally:
+        backend.close_all()
+
+
+def test_sqlite_pool_rolls_back_uncommitted_work(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'test.db'))
+    try:
+        with backend.connection() as conn:
+            conn.execute('CREATE TABLE t (name TEXT)')
+            conn.commit()
+        with pytest.raises(RuntimeError):
+            with backend.connection() as conn:
+                conn.execute("INSERT INTO t VALUES ('lost')")
+                raise RuntimeError('boom')
+        # 归还时未提交的写事务被回滚，其他线程不会被遗留的写锁阻塞
+        with backend.connection() as conn:
+            assert not conn.in_transaction
+            assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    finally:
+        backend.close_all()
+
+
+def test_sqlite_pool_hands_out_distinct_connections_per_thread(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'test.db'))
+    barrier = threading.Barrier(2)
+    seen = []
+
+    def worker():
+        with backend.connection() as conn:
+            seen.append(conn)
+            barrier.wait(timeout=5)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert seen[0] is not seen[1]
+    finally:
+        backend.close_all()
@@ -0,0 +1,51 @@
+"""
+NewsDeduplicator 测试
+"""
+
+from deduplicator import NewsDeduplicator
+
+
+def _article(title, url, source, content=''):
+    return {'title': title, 'url': url, 'source': source, 'content': content}
+
+
+def test_exact_repeat_of_swapped_in_duplicate_is_deduplicated():
+    dedup = NewsDeduplicator()
+    articles = [
+        _article('Fed holds interest rates steady as inflation cools', 'https://a.com/1', 'A', 'short'),
+        # 近似重复且内容更丰富，替换保留条目
+        _article('Fed holds interest rates steady while inflation cools', 'https://b.com/2', 'B', 'much richer content ' * 5),
+        # 与替换进来的条目完全相同（同 URL 同标题）的转载
+        _article('Fed holds interest rates steady while inflation cools', 'https://b.com/2', 'C', 'x'),
+    ]
+    kept = dedup.deduplicate(articles)
+    assert len(kept) == 1
+    assert kept[0]['url'] == 'https://b.com/2'
+    assert kept[0]['also_reported_by'] == ['A', 'C']
+    assert dedup.last_stats['near_duplicates'] == 1
+    assert dedup.last_stats['exact_duplicates'] == 1
+
+
+def test_replacement_is_indexed_for_later_near_duplicates():
+    dedup = NewsDeduplicator()
+    articles = [
+        _article('Fed holds interest rates steady as inflation cools', 'https://a.com/1', 'A', 'short'),
+        # 与第一条近似，内容更丰富，替换保留条目
+        _article('Fed holds interest rates steady as inflation cools further in October', 'https://b.com/2', 'B',
+                 'much richer content ' * 5),
+        # 只与替换进来的标题近似，与最初的标题相似度低于阈值
+        _article('Fed keeps rates steady as inflation cools further in October data', 'https://c.com/3', 'C', 'x'),
+    ]
+    kept = dedup.deduplicate(articles)
+    assert [a['url'] for a in kept] == ['https://b.com/2']
+    assert kept[0]['also_reported_by'] == ['A', 'C']
+    assert dedup.last_stats['near_duplicates'] == 2
+
+
+def test_input_articles_are_not_modified():
+    dedup = NewsDeduplicator()
+    first = _article('Fed holds interest rates steady', 'https://a.com/1', 'A', 'content ' * 10)
+    second = _article('Fed holds interest rates steady', 'https://b.com/2', 'B', 'x')
+    kept = dedup.deduplicate([first, second])
+    assert kept[0]['also_reported_by'] == ['B']
+    assert 'also_reported_by' not in first
@@ -0,0 +1,104 @@
+"""
+事件推送中心测试：发布/订阅、补发最新事件、SSE 输出、后台采集器
+"""
+
+import json
+import threading
+import time
+
+from event_hub import EventHub, PeriodicPublisher
+
+
+def test_publish_reaches_matching_subscribers():
+    hub = EventHub()
+    everything = hub.subscribe()
+    reports = hub.subscribe(['report'])
+    hub.publish('realtime', {'n': 1})
+    report_id = hub.publish('report', {'id': '20251115_221203'})
+
+    assert [e[1] for e in (everything.get_nowait(), everything.get_nowait())] == ['realtime', 'report']
+    event_id, event, data = reports.get_nowait()
+    assert (event_id, event, json.loads(data)) == (report_id, 'report', {'id': '20251115_221203'})
+    assert reports.empty()
+
+    hub.unsubscribe(reports)
+    assert hub.subscriber_count == 1
+
+
+def test_new_subscribers_get_the_latest_event_of_each_type():
+    hub = EventHub()
+    for n in range(3):
+        hub.publish('realtime', {'n': n})
+    hub.publish('report', {'id': 'r1'})
+    q = hub.subscribe()
+    messages = [q.get_nowait() for _ in range(q.qsize())]
+    assert [(event, json.loads(data)) for _, event, data in messages] == [
+        ('realtime', {'n': 2}), ('report', {'id': 'r1'})]
+    assert hub.subscribe(replay=False).empty()
+
+
+def test_slow_subscriber_drops_oldest_events():
+    hub = EventHub(queue_size=2)
+    q = hub.subscribe()
+    for n in range(4):
+        hub.publish('realtime', {'n': n})
+    assert [json.loads(q.get_nowait()[2])['n'] for _ in range(2)] == [2, 3]
+
+
+def test_stream_formats_sse_and_unsubscribes_on_close():
+    hub = EventHub()
+    stream = hub.stream(['report'], keepalive=0.05)
+    assert next(stream) == 'retry: 3000\n\n'
+    assert next(stream) == ': keepalive\n\n'
+    event_id = hub.publish('report', {'id': 'r1'})
+    assert next(stream) == f'id: {event_id}\nevent: report\ndata: {{"id": "r1"}}\n\n'
+    assert hub.subscriber_count == 1
+    stream.close()
+    assert hub.subscriber_count == 0
+
+
+def test_periodic_publisher_publishes_only_changes():
+    hub = EventHub()
+    q = hub.subscribe(['realtime'])
+    values = iter([[1], [1], [2]])
+    publisher = PeriodicPublisher(hub, 'realtime', lambda: next(values), interval=60)
+
+    publisher.refresh()
+    publisher.refresh()
+    publisher.refresh()
+    assert [json.loads(q.get_nowait()[2])['data'] for _ in range(q.qsize())] == [[1], [2]]
+
+
+def test_concurrent_latest_calls_share_one_fetch():
+    hub = EventHub()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return {'price': 1}
+
+    publisher = PeriodicPublisher(hub, 'realtime', fetch, interval=60)
+    publisher.start = lambda: None  # 只测同步采集路径，不启动后台线程
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(publisher.latest()[0])) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 并发请求在锁上等待同一次采集，上游只被请求一次
+    assert results == [{'price': 1}] * 5
+    assert len(calls) == 1
+
+
+def test_idle_publisher_thread_exits():
+    hub = EventHub()
+    calls = []
+    publisher = PeriodicPublisher(hub, 'realtime', lambda: calls.append(1) or len(calls), interval=0.02)
+    publisher.latest()
+    time.sleep(0.2)
+    # 没有订阅者也没有读取时后台线程退出，不再请求上游
+    assert not publisher._thread.is_alive()
+    stopped_at = len(calls)
+    time.sleep(0.1)
+    assert len(calls) == stopped_at
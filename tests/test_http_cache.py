@@ -0,0 +1,94 @@
+"""
+API 响应缓存层测试：ETag / 304、压缩协商、Cache-Control
+"""
+
+import gzip
+
+import pytest
+from flask import Flask, Response, jsonify
+
+import http_cache
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    http_cache.init_http_cache(app)
+
+    @app.route('/api/big')
+    def big():
+        return jsonify({'items': ['财经新闻'] * 200})
+
+    @app.route('/api/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/api/reports/<key>', methods=['GET', 'POST'])
+    def report(key):
+        return jsonify({'key': key})
+
+    @app.route('/api/stream')
+    def stream():
+        return Response((chunk for chunk in ('data: 1\n\n',)), mimetype='text/event-stream')
+
+    @app.route('/api/missing')
+    def missing():
+        return jsonify({'error': 'not found'}), 404
+
+    http_cache._compressed.clear()
+    return app.test_client()
+
+
+def test_etag_round_trip_returns_304(client):
+    first = client.get('/api/small')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+    second = client.get('/api/small', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['Cache-Control'] == 'no-cache'
+    # 内容变化（不同路由）时旧 ETag 不命中
+    assert client.get('/api/reports/a', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_large_json_is_compressed_per_accept_encoding(client):
+    plain = client.get('/api/big')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    gz = client.get('/api/big', headers={'Accept-Encoding': 'gzip'})
+    assert gz.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gz.data) == plain.data
+    assert gz.headers['ETag'] != plain.headers['ETag']
+    # 同一内容再次请求复用已压缩的结果
+    assert client.get('/api/big', headers={'Accept-Encoding': 'gzip'}).data == gz.data
+    assert len(http_cache._compressed) == 1
+
+
+def test_brotli_is_preferred_when_available(client):
+    brotli = pytest.importorskip('brotli')
+    plain = client.get('/api/big')
+    br = client.get('/api/big', headers={'Accept-Encoding': 'gzip;q=0.5, br'})
+    assert br.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(br.data) == plain.data
+    # 压缩结果按 (ETag, 编码) 缓存，304 校验使用带编码后缀的 ETag
+    assert len(http_cache._compressed) == 1
+    again = client.get('/api/big', headers={'Accept-Encoding': 'br', 'If-None-Match': br.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_small_and_streamed_responses_are_not_compressed(client):
+    small = client.get('/api/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    stream = client.get('/api/stream', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in stream.headers
+    assert 'ETag' not in stream.headers
+    assert stream.data == b'data: 1\n\n'
+
+
+def test_cache_control_by_route_and_method(client):
+    assert client.get('/api/reports/a').headers['Cache-Control'] == 'public, max-age=86400'
+    assert client.post('/api/reports/a').headers['Cache-Control'] == 'no-store'
+    assert client.get('/api/missing').headers['Cache-Control'] == 'no-cache'
+    assert http_cache.cache_policy('/api/reports/history') == 'no-cache'
+    assert http_cache.cache_policy('/assets/index-abc123.js') == 'public, max-age=31536000, immutable'
@@ -0,0 +1,143 @@
+"""
+LLM 网关测试：限流、重试、调用统计、同步与异步并发调用
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm_gateway
+from llm_gateway import LLMGateway, RateLimiter
+
+
+def _response(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                           usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+
+
+def _gateway(create, **kwargs):
+    """使用假客户端的网关：create(**request) 为协程函数"""
+    gateway = LLMGateway(api_key='test-key', **kwargs)
+
+    def ensure_client():
+        if gateway._client is None:
+            gateway._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+            gateway._semaphore = asyncio.Semaphore(gateway.max_concurrency)
+
+    gateway._ensure_client = ensure_client
+    return gateway
+
+
+def test_no_request_limit_by_default(monkeypatch):
+    monkeypatch.delenv('DEEPSEEK_RPM', raising=False)
+    monkeypatch.delenv('DEEPSEEK_TPM', raising=False)
+    limiter = LLMGateway(api_key='test-key').rate_limiter
+    assert (limiter.rpm, limiter.tpm) == (0, 0)
+    assert all(limiter.try_acquire(1000) == 0 for _ in range(500))
+
+
+def test_rate_limiter_window():
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=100, window=0.2)
+    assert limiter.try_acquire(10) == 0
+    assert limiter.try_acquire(10) == 0
+    assert limiter.try_acquire(10) > 0       # 请求数已满
+    time.sleep(0.25)
+    assert limiter.try_acquire(95) == 0
+    assert limiter.try_acquire(10) > 0       # token 数已满
+
+
+def test_retryable_errors_are_retried_by_gateway_only(monkeypatch):
+    monkeypatch.setattr(llm_gateway, 'BACKOFF_BASE', 0.001)
+    calls = []
+
+    async def create(**request):
+        calls.append(request)
+        raise asyncio.TimeoutError()
+
+    gateway = _gateway(create)
+    with pytest.raises(asyncio.TimeoutError):
+        gateway.chat_sync('test', [{'role': 'user', 'content': 'hi'}])
+    assert len(calls) == llm_gateway.DEFAULT_RETRIES + 1
+    assert gateway.get_stats()['test']['retries'] == llm_gateway.DEFAULT_RETRIES
+
+    # processor 不在网关重试之上再叠加重试
+    from processor import NLPProcessor
+    nlp = NLPProcessor(max_workers=1)
+    nlp.llm = gateway
+    calls.clear()
+    article = {'title': 't', 'source': 's', 'content': 'c', 'url': 'https://example.com/1'}
+    assert nlp._process_single_batch([article]) == []
+    assert len(calls) == llm_gateway.DEFAULT_RETRIES + 1
+
+
+def test_concurrent_sync_callers_share_one_loop():
+    active = []
+    peak = []
+
+    async def create(**request):
+        active.append(1)
+        peak.append(len(active))
+        await asyncio.sleep(0.05)
+        active.pop()
+        return _response(request['messages'][0]['content'])
+
+    gateway = _gateway(create, max_concurrency=3)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        replies = list(pool.map(
+            lambda i: gateway.chat_sync('test', [{'role': 'user', 'content': str(i)}]), range(6)))
+    assert replies == [str(i) for i in range(6)]
+    assert max(peak) == 3
+    assert gateway.get_stats()['test']['calls'] == 6
+
+
+def test_transient_error_then_success_and_non_retryable_errors(monkeypatch):
+    monkeypatch.setattr(llm_gateway, 'BACKOFF_BASE', 0.001)
+    calls = []
+
+    async def create(**request):
+        calls.append(request)
+        if request['messages'][0]['content'] == 'bad':
+            raise ValueError('bad request')
+        if len(calls) == 1:
+            raise asyncio.TimeoutError()
+        return _response('ok')
+
+    gateway = _gateway(create)
+    assert gateway.chat_sync('flaky', [{'role': 'user', 'content': 'hi'}], max_tokens=123) == 'ok'
+    assert calls[-1]['max_tokens'] == 123
+    stats = gateway.get_stats()['flaky']
+    assert (stats['calls'], stats['retries'], stats['errors']) == (1, 1, 0)
+    assert (stats['prompt_tokens'], stats['completion_tokens']) == (10, 5)
+
+    # 参数错误等不可恢复的异常直接抛出，不重试
+    calls.clear()
+    with pytest.raises(ValueError):
+        gateway.chat_sync('broken', [{'role': 'user', 'content': 'bad'}])
+    assert len(calls) == 1
+    assert gateway.get_stats()['broken']['errors'] == 1
+
+
+def test_chat_can_be_awaited_from_another_event_loop():
+    async def create(**request):
+        await asyncio.sleep(0.01)
+        return _response(request['messages'][0]['content'])
+
+    gateway = _gateway(create)
+
+    async def main():
+        return await asyncio.gather(*(gateway.chat('async', [{'role': 'user', 'content': str(i)}])
+                                      for i in range(4)))
+
+    assert asyncio.run(main()) == ['0', '1', '2', '3']
+    assert gateway.get_stats()['async']['calls'] == 4
+
+
+def test_unconfigured_gateway_raises(monkeypatch):
+    monkeypatch.delenv('DEEPSEEK_API_KEY', raising=False)
+    gateway = LLMGateway()
+    assert not gateway.available
+    with pytest.raises(RuntimeError):
+        gateway.chat_sync('test', [{'role': 'user', 'content': 'hi'}])
@@ -0,0 +1,77 @@
+"""
+本地模拟 LLM 服务测试：合成响应、录制回放、错误注入
+"""
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from mock_llm_server import MockConfig, start_mock_server
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**kwargs):
+        server = start_mock_server(MockConfig(latency=0, jitter=0, seed=1, **kwargs))
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_address[1]}'
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _post(base_url, content):
+    request = urllib.request.Request(
+        f'{base_url}/chat/completions',
+        data=json.dumps({'model': 'deepseek-chat', 'messages': [{'role': 'user', 'content': content}]}).encode(),
+        headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def _stats(base_url):
+    with urllib.request.urlopen(f'{base_url}/stats', timeout=10) as response:
+        return json.loads(response.read())
+
+
+def test_synthesizes_one_analysis_per_article(mock_server):
+    base_url = mock_server()
+    reply = _post(base_url, '[文章1] 标题一\n[文章2] 标题二\n[文章3] 标题三')
+    analyses = json.loads(reply['choices'][0]['message']['content'])
+    assert [a['index'] for a in analyses] == [1, 2, 3]
+    assert reply['usage']['completion_tokens'] > 0
+    assert _stats(base_url)['synthesized'] == 1
+
+
+def test_replays_recorded_responses(mock_server, tmp_path):
+    recordings = tmp_path / 'recordings.jsonl'
+    recordings.write_text(json.dumps({'match': '一周市场总体分析', 'content': '{"summary": "录制"}'},
+                                     ensure_ascii=False) + '\n', encoding='utf-8')
+    base_url = mock_server(recordings=str(recordings))
+    reply = _post(base_url, '请给出一周市场总体分析')
+    assert reply['choices'][0]['message']['content'] == '{"summary": "录制"}'
+    assert _stats(base_url)['replayed'] == 1
+
+
+def test_injects_rate_limit_errors(mock_server):
+    base_url = mock_server(rate_limit_rate=1.0)
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        _post(base_url, 'hi')
+    assert excinfo.value.code == 429
+    assert excinfo.value.headers['Retry-After'] == '1'
+    assert _stats(base_url)['errors_429'] == 1
+
+
+def test_malformed_responses_are_not_valid_json(mock_server):
+    base_url = mock_server(malformed_rate=1.0)
+    for _ in range(5):
+        content = _post(base_url, '[文章1] 标题')['choices'][0]['message']['content']
+        with pytest.raises(ValueError):
+            json.loads(content)
+    assert _stats(base_url)['malformed'] == 5
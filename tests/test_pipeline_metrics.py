@@ -0,0 +1,34 @@
+"""
+流水线阶段统计测试
+"""
+
+from pipeline_metrics import PipelineMetrics
+
+
+def test_summary_lists_only_top_level_stages(capsys):
+    metrics = PipelineMetrics('test')
+    with metrics.stage('collect.rss') as stage:
+        stage.items = 3
+    metrics.record('collect.source', seconds=0.5, items=3, label='Reuters', parent='collect.rss')
+    with metrics.stage('analysis'):
+        pass
+    metrics.record('analysis.filter', seconds=0.2, parent='analysis')
+    metrics.record('analysis.batch', seconds=0.3, label='batch-1', parent='analysis')
+
+    metrics.print_summary()
+    line = capsys.readouterr().out
+    assert 'collect.rss' in line and 'analysis ' in line
+    assert 'collect.source' not in line
+    assert 'analysis.filter' not in line
+    assert 'analysis.batch' not in line
+
+
+def test_stage_records_error_and_reraises():
+    metrics = PipelineMetrics('test')
+    try:
+        with metrics.stage('dedup'):
+            raise ValueError('boom')
+    except ValueError:
+        pass
+    record = metrics.records[-1]
+    assert (record.stage, record.status, record.error) == ('dedup', 'error', 'boom')
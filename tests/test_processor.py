@@ -0,0 +1,129 @@
+"""
+NLPProcessor 批次打包、输出 token 预留与分析缓存测试
+"""
+
+import processor
+from processor import NLPProcessor
+
+
+class _RecordingLLM:
+    def __init__(self):
+        self.max_tokens = []
+
+    def chat_sync(self, caller, messages, **kwargs):
+        self.max_tokens.append(kwargs['max_tokens'])
+        return '[{"index": 1, "summary": "摘要", "sentiment": 0.1}]'
+
+
+def _articles(n, content='内容' * 50):
+    return [{'title': f'新闻{i}', 'source': 'test', 'content': content, 'url': f'https://example.com/{i}'}
+            for i in range(n)]
+
+
+def test_max_tokens_never_below_baseline():
+    nlp = NLPProcessor(max_workers=1)
+    nlp.llm = _RecordingLLM()
+    for n in (1, 5, 20):
+        nlp._process_single_batch(_articles(n))
+    assert all(tokens >= processor.MIN_OUTPUT_TOKENS for tokens in nlp.llm.max_tokens)
+    assert nlp.llm.max_tokens[-1] >= 20 * processor.OUTPUT_TOKENS_PER_ARTICLE
+
+
+def test_pack_batches_respects_output_budget():
+    nlp = NLPProcessor(max_workers=1)
+    batches = nlp._pack_batches(_articles(60, content='x'), 60)
+    assert all(nlp._required_output_tokens(len(batch)) <= processor.MAX_OUTPUT_TOKENS for batch in batches)
+    assert len(batches[0]) > 20  # 默认估算下 20 篇一批放得下，输出预算不应更早拆分
+    assert sum(len(batch) for batch in batches) == 60
+
+
+def test_long_output_articles_are_split_before_max_tokens(monkeypatch):
+    # 每篇分析结果很长时，一批 20 篇的预计输出超过 MAX_OUTPUT_TOKENS，必须拆批而不是被截断
+    monkeypatch.setattr(processor, 'OUTPUT_TOKENS_PER_ARTICLE', 600)
+    nlp = NLPProcessor(max_workers=1)
+    nlp.llm = _RecordingLLM()
+    batches = nlp._pack_batches(_articles(20, content='x'), 20)
+    assert len(batches) > 1
+    for batch in batches:
+        nlp._process_single_batch(batch)
+    for batch, max_tokens in zip(batches, nlp.llm.max_tokens):
+        assert nlp._required_output_tokens(len(batch)) <= max_tokens <= processor.MAX_OUTPUT_TOKENS
+
+
+def test_failed_batches_are_reported():
+    nlp = NLPProcessor(max_workers=2)
+    nlp._filter_by_title = lambda articles: articles
+    nlp._load_cached_analyses = lambda articles: {}
+    nlp._save_cached_analyses = lambda processed: None
+
+    def fake_batch(batch):
+        if any(a['url'].endswith('/0') for a in batch):
+            raise RuntimeError('LLM 不可用')
+        return [{**a, 'summary': '摘要'} for a in batch]
+
+    nlp._process_single_batch = fake_batch
+    articles = _articles(4, content='x')
+    processed = nlp.process_batch(articles, batch_size=2)
+    assert [a['url'] for a in processed] == [a['url'] for a in articles[2:]]
+    assert nlp.last_failed == articles[:2]
+
+
+def test_cached_analyses_skip_the_llm(temp_db):
+    calls = []
+
+    def make_processor(version='deepseek-chat:analysis-v1'):
+        nlp = NLPProcessor(max_workers=1)
+        nlp.cache_version = version
+        nlp._filter_by_title = lambda articles: articles
+
+        def fake_batch(batch):
+            calls.append([a['url'] for a in batch])
+            return [{**a, 'summary': f"摘要{a['title']}", 'sentiment': 0.5} for a in batch]
+
+        nlp._process_single_batch = fake_batch
+        return nlp
+
+    articles = _articles(3, content='x')
+    first = make_processor().process_batch(articles)
+    assert len(calls) == 1
+
+    # 第二轮全部命中缓存，不再调用 LLM，结果与首次一致
+    nlp = make_processor()
+    second = nlp.process_batch(articles + _articles(4, content='x')[3:])
+    assert [(a['url'], a['summary'], a['sentiment']) for a in second] == [
+        (a['url'], a['summary'], a['sentiment']) for a in first] + [('https://example.com/3', '摘要新闻3', 0.5)]
+    assert calls[1] == ['https://example.com/3']
+    assert nlp.last_stats == {'cache_hits': 3, 'cache_misses': 1, 'cache_hit_rate': 0.75}
+
+    # 提示词版本变化后旧缓存不再命中
+    make_processor('deepseek-chat:analysis-v2').process_batch(articles)
+    assert len(calls[2]) == 3
+
+
+def test_expired_analyses_are_purged(temp_db):
+    temp_db.save_cached_analyses({'fresh': {'summary': 'a'}, 'stale': {'summary': 'b'}}, 'v1')
+    with temp_db.get_connection() as conn:
+        conn.execute("UPDATE analysis_cache SET created_at = datetime('now', '-80 hours') WHERE url_hash = 'stale'")
+        conn.commit()
+    assert temp_db.get_cached_analyses(['fresh', 'stale'], 'v1', ttl_hours=72) == {'fresh': {'summary': 'a'}}
+    assert temp_db.purge_analysis_cache(72) == 1
+
+
+def test_finished_batches_are_submitted_to_the_writer():
+    class RecordingWriter:
+        def __init__(self):
+            self.batches = []
+
+        def submit(self, analyses):
+            self.batches.append([a['url'] for a in analyses])
+
+    writer = RecordingWriter()
+    nlp = NLPProcessor(max_workers=1, analysis_writer=writer)
+    nlp._filter_by_title = lambda articles: articles
+    nlp._load_cached_analyses = lambda articles: {}
+    nlp._save_cached_analyses = lambda processed: None
+    nlp._process_single_batch = lambda batch: [{**a, 'summary': '摘要'} for a in batch]
+
+    nlp.process_batch(_articles(4, content='x'), batch_size=2)
+    assert writer.batches == [['https://example.com/0', 'https://example.com/1'],
+                              ['https://example.com/2', 'https://example.com/3']]
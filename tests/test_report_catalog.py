@@ -0,0 +1,55 @@
+"""
+报告目录（内存索引）测试：分页、类型筛选、增量同步
+"""
+
+from datetime import datetime
+
+import pytest
+
+from report_catalog import ReportCatalog
+
+
+def _save(db, report_type, hour):
+    return db.save_report(report_type, f'{report_type} {hour}', report_key=f'20251115_{hour:02d}0000',
+                          created_at=datetime(2025, 11, 15, hour, 0, 0))
+
+
+@pytest.fixture
+def catalog():
+    new_rows = []
+    catalog = ReportCatalog(poll_seconds=3600, on_new=new_rows.extend)
+    catalog.new_rows = new_rows
+    yield catalog
+    catalog.stop()
+
+
+def test_pages_are_newest_first_and_filtered_by_type(temp_db, catalog):
+    for hour in range(1, 8):
+        _save(temp_db, 'daily' if hour % 3 == 0 else 'hourly', hour)
+
+    total, first = catalog.page(['hourly', 'daily'], page=1, per_page=3)
+    assert total == 7
+    assert [e['report_key'] for e in first] == ['20251115_070000', '20251115_060000', '20251115_050000']
+    total, last = catalog.page(['hourly', 'daily'], page=3, per_page=3)
+    assert [e['report_key'] for e in last] == ['20251115_010000']
+    assert catalog.page(['hourly', 'daily'], page=4, per_page=3) == (7, [])
+
+    total, daily = catalog.page(['daily'], page=1, per_page=10)
+    assert (total, [e['report_key'] for e in daily]) == (2, ['20251115_060000', '20251115_030000'])
+    # 首次全量加载不触发新报告回调
+    assert catalog.new_rows == []
+
+
+def test_refresh_picks_up_new_reports_incrementally(temp_db, catalog):
+    _save(temp_db, 'hourly', 1)
+    assert catalog.page(['hourly'], per_page=10)[0] == 1
+    catalog.page(['daily'], per_page=10)
+
+    new_id = _save(temp_db, 'daily', 2)
+    _save(temp_db, 'hourly', 3)
+    assert catalog.refresh() == 2
+    assert [row['id'] for row in catalog.new_rows][0] == new_id
+    # 已建立的类型子索引随 refresh 增量更新
+    assert [e['report_key'] for e in catalog.page(['daily'], per_page=10)[1]] == ['20251115_020000']
+    assert catalog.page(['hourly'], per_page=10)[0] == 2
+    assert catalog.refresh() == 0
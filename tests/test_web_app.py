@@ -0,0 +1,101 @@
+"""
+web_app 接口测试（Flask 测试客户端 + 临时 SQLite 库）
+"""
+
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def client(temp_db):
+    import web_app
+    # 报告缓存按 id 区分，每个测试的临时库 id 都从 1 开始
+    web_app._latest_reports.clear()
+    web_app._parsed_reports.clear()
+    yield web_app.app.test_client()
+    web_app._latest_reports.clear()
+    web_app._parsed_reports.clear()
+
+
+def test_crypto_market_does_not_write(client, temp_db, monkeypatch):
+    import web_app
+
+    class FakeCollector:
+        def get_market_data(self, symbols):
+            return [{'symbol': s, 'price_usd': 1.0} for s in symbols]
+
+    monkeypatch.setattr(web_app, 'get_crypto_collector', lambda: FakeCollector())
+    response = client.get('/api/crypto/market?symbols=BTC,ETH')
+    assert [c['symbol'] for c in response.get_json()] == ['BTC', 'ETH']
+    with temp_db.get_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) AS cnt FROM crypto_latest').fetchone()['cnt'] == 0
+        assert conn.execute('SELECT COUNT(*) AS cnt FROM crypto_history_minute').fetchone()['cnt'] == 0
+
+
+def test_sentiment_history_serves_rollups(client, temp_db):
+    from datetime import datetime, timedelta
+    published = (datetime.now() - timedelta(days=2)).isoformat()
+    temp_db.bulk_insert_news([{'title': '新闻', 'url': 'https://example.com/1', 'published_at': published}])
+    temp_db.refresh_sentiment_rollups()
+
+    data = client.get('/api/sentiment/history?granularity=daily&days=7').get_json()
+    assert [row['bucket'] for row in data['data']] == [published[:10]]
+    assert client.get('/api/sentiment/history?granularity=minute').status_code == 400
+
+
+def test_latest_report_is_fetched_once_per_new_report(client, temp_db, monkeypatch):
+    import web_app
+    fetched, parsed = [], []
+    real_fetch, real_parse = web_app.get_latest_db_report, web_app.parse_report
+    monkeypatch.setattr(web_app, 'get_latest_db_report', lambda t: fetched.append(t) or real_fetch(t))
+    monkeypatch.setattr(web_app, 'parse_report', lambda content: parsed.append(1) or real_parse(content))
+
+    temp_db.save_report('hourly', '第一份报告', report_key='20251115_100000',
+                        created_at=datetime(2025, 11, 15, 10, 0, 0))
+    with web_app.app.test_request_context():
+        first = web_app.load_latest_report('hourly')
+        web_app.get_stock_recommendations()
+        web_app.get_market_prediction()
+    with web_app.app.test_request_context():
+        assert web_app.load_latest_report('hourly') is first
+        web_app.get_stock_recommendations()
+    assert (len(fetched), len(parsed)) == (1, 1)
+
+    temp_db.save_report('hourly', '第二份报告', report_key='20251115_110000',
+                        created_at=datetime(2025, 11, 15, 11, 0, 0))
+    with web_app.app.test_request_context():
+        assert web_app.get_latest_report() == '第二份报告'
+    assert len(fetched) == 2
+
+
+def test_parsed_reports_are_copied_and_bounded(monkeypatch):
+    import web_app
+    monkeypatch.setattr(web_app, 'REPORT_CACHE_SIZE', 2)
+    web_app._parsed_reports.clear()
+    report = {'id': 1, 'content': '报告内容'}
+    copy = web_app.parse_report_cached(report)
+    copy['mutated'] = True
+    assert 'mutated' not in web_app.parse_report_cached(report)
+
+    for report_id in (2, 3):
+        web_app.parse_report_cached({'id': report_id, 'content': '报告内容'})
+    assert list(web_app._parsed_reports) == [2, 3]
+    web_app._parsed_reports.clear()
+
+
+def test_reports_history_pages_from_the_catalog(client, temp_db, monkeypatch):
+    import web_app
+    from report_catalog import ReportCatalog
+    catalog = ReportCatalog(poll_seconds=3600)
+    monkeypatch.setattr(web_app, 'report_catalog', catalog)
+    for hour in range(1, 6):
+        temp_db.save_report('hourly', f'报告{hour}', report_key=f'20251115_{hour:02d}0000',
+                            created_at=datetime(2025, 11, 15, hour, 0, 0))
+    try:
+        data = client.get('/api/reports/history?type=hourly&page=2&per_page=2').get_json()
+        assert (data['total'], data['pages']) == (5, 3)
+        assert [r['id'] for r in data['data']] == ['20251115_030000', '20251115_020000']
+        assert client.get('/api/reports/history?type=unknown').get_json()['total'] == 0
+    finally:
+        catalog.stop()
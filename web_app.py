@@ -1,9 +1,10 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request, g, has_request_context
 import os
 import sys
-import glob
-from datetime import datetime, timedelta
-from collections import Counter
+import copy
+import threading
+from datetime import datetime, timedelta, timezone
+from collections import Counter, OrderedDict
 import json
 from dotenv import load_dotenv
 
@@ -11,6 +12,13 @@ load_dotenv()
 
 sys.path.append('src')
 from weekly_summary import WeeklySummary
+from database import (get_reports, get_reports_since, get_report_by_key, report_local_time,
+                      get_latest_report as get_latest_db_report)
+from report_catalog import ReportCatalog
+from event_hub import EventHub, PeriodicPublisher
+from http_cache import init_http_cache
+from dashboard import (parse_report, recommend_stocks, predict_markets, build_dashboard,
+                       dump_dashboard, read_dashboard_snapshot)
 
 # 导入翻译服务
 def get_translator():
@@ -95,181 +103,130 @@ def init_database():
 app = Flask(__name__, static_folder="frontend/dist/assets", template_folder="frontend/dist")
 # Vite builds assets with relative paths like /assets/..., so we need to match that
 app.static_url_path = "/assets"
+# ETag/304、gzip/brotli 压缩和 Cache-Control（见 src/http_cache.py）
+init_http_cache(app)
 
 weekly_gen = WeeklySummary()
 
+# 报告都存在 reports 表中，report_key 即导出文件名中的时间戳，前端仍以文件名/时间戳作为报告 ID
+REPORT_FILE_NAMES = {
+    'hourly': ('report_', '.txt'),
+    'daily': ('summary_', '.txt'),
+    'weekly': ('analysis_', '.json'),
+    'monthly': ('analysis_', '.json'),
+}
+
+def report_file_name(report_type, report_key):
+    prefix, ext = REPORT_FILE_NAMES[report_type]
+    return f'{prefix}{report_key}{ext}'
+
+def report_key_from_file(report_type, file_name):
+    prefix, ext = REPORT_FILE_NAMES[report_type]
+    name = os.path.basename(file_name)
+    if name.startswith(prefix) and name.endswith(ext):
+        return name[len(prefix):-len(ext)]
+    return name
+
+def report_time(report):
+    """报告生成时间（reports.created_at 按 UTC 存储，转为本地时间）"""
+    return report_local_time(report['created_at'])
+
+# 报告入库后不再修改，新报告总是新的一行：按报告 id 缓存最新报告行和解析结果，
+# 新报告入库前重复请求只需一次按索引取最新 id 的查询
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '64'))
+_report_cache_lock = threading.Lock()
+_latest_reports = {}             # report_type -> 最新报告行
+_parsed_reports = OrderedDict()  # 报告 id -> parse_report 结果（LRU）
+
+# 推送给浏览器的事件（/api/events）：新报告、实时快讯
+event_hub = EventHub()
+
+def publish_new_reports(rows):
+    """报告目录同步到新报告时推送 report 事件，字段与历史报告列表一致"""
+    for r in rows:
+        event_hub.publish('report', {
+            'id': r['report_key'],
+            'type': r['report_type'],
+            'title': r['title'],
+            'timestamp': report_time(r).isoformat(),
+            'file_path': r['file_path']
+        })
+
+# 历史报告列表的内存索引，后台按 id 增量同步新报告（报告由 main.py 进程写入）
+report_catalog = ReportCatalog(on_new=publish_new_reports)
+
+# 实时快讯由一个后台线程按间隔采集，/api/realtime 和 /api/events 共用结果
+REALTIME_POLL_SECONDS = float(os.getenv('REALTIME_POLL_SECONDS', '30'))
+_realtime_feed = None
+_realtime_feed_lock = threading.Lock()
+
+def get_realtime_feed():
+    """实时快讯的后台采集器，首次使用时创建；实时采集模块未加载时返回 None"""
+    global _realtime_feed
+    with _realtime_feed_lock:
+        if _realtime_feed is None:
+            collector = get_realtime_collector()
+            if collector:
+                _realtime_feed = PeriodicPublisher(event_hub, 'realtime', collector.fetch_all_realtime,
+                                                   REALTIME_POLL_SECONDS)
+        return _realtime_feed
+
+def load_latest_report(report_type):
+    """获取某类型最新的报告记录
+
+    同一请求内多次调用只查一次库；返回的行在请求间共享，调用方不要修改
+    """
+    memo = g.setdefault('latest_reports', {}) if has_request_context() else {}
+    if report_type in memo:
+        return memo[report_type]
+    report = None
+    try:
+        head = get_reports(report_type, limit=1)
+        if head:
+            report = _latest_reports.get(report_type)
+            if not report or report['id'] != head[0]['id']:
+                report = get_latest_db_report(report_type)
+                with _report_cache_lock:
+                    _latest_reports[report_type] = report
+    except Exception as e:
+        print(f"读取最新报告失败: {e}")
+    memo[report_type] = report
+    return report
+
 def get_latest_report():
     """获取最新的小时报告"""
-    reports = glob.glob('data/reports/report_*.txt')
-    if not reports:
-        return None
-    latest = max(reports, key=os.path.getctime)
-    try:
-        with open(latest, 'r', encoding='utf-8') as f:
-            return f.read()
-    except:
-        return None
+    report = load_latest_report('hourly')
+    return report['content'] if report else None
 
 def get_latest_summary():
     """获取最新的每日摘要"""
-    summaries = glob.glob('data/summaries/summary_*.txt')
-    if not summaries:
-        return None
-    latest = max(summaries, key=os.path.getctime)
-    try:
-        with open(latest, 'r', encoding='utf-8') as f:
-            return f.read()
-    except:
-        return None
+    report = load_latest_report('daily')
+    return report['content'] if report else None
 
 def get_weekly_reports():
     """获取过去7天的报告"""
-    reports = glob.glob('data/reports/report_*.txt')
-    if not reports:
+    try:
+        reports = get_reports_since('hourly', datetime.now() - timedelta(days=7))
+    except Exception as e:
+        print(f"读取周内报告失败: {e}")
         return []
-    
-    now = datetime.now()
-    week_ago = now - timedelta(days=7)
-    weekly = []
-    
-    for report_path in reports:
-        try:
-            mtime = datetime.fromtimestamp(os.path.getctime(report_path))
-            if mtime >= week_ago:
-                with open(report_path, 'r', encoding='utf-8') as f:
-                    weekly.append(f.read())
-        except:
-            pass
-    
-    return weekly
+    return [r['content'] for r in reports if r.get('content')]
 
-def parse_report(content):
-    """解析报告内容"""
-    if not content:
+def parse_report_cached(report):
+    """解析报告行的文本内容，结果按报告 id 缓存（LRU），返回副本供调用方修改"""
+    if not report or not report.get('content'):
         return {}
-    
-    lines = content.split('\n')
-    data = {
-        'title': '',
-        'sentiment': {'overall': 0, 'cn': 0, 'us': 0},
-        'sentiment_label': {'overall': '中性', 'cn': '中性', 'us': '中性'},
-        'hot_topics': [],
-        'major_events': [],
-        'stocks': [],
-        'total_news': 0
-    }
-    
-    # 解析标题
-    for line in lines:
-        if '财经新闻每小时简报' in line:
-            data['title'] = line.strip()
-            break
-    
-    # 解析新闻数量
-    for line in lines:
-        if '共分析' in line and '条新闻' in line:
-            try:
-                data['total_news'] = int(line.split('共分析')[1].split('条')[0].strip())
-            except:
-                pass
-    
-    # 解析情绪
-    def get_sentiment_label(score):
-        if score > 0.3:
-            return '积极'
-        elif score < -0.3:
-            return '消极'
-        return '中性'
-    
-    for i, line in enumerate(lines):
-        if '整体情绪' in line:
-            try:
-                score = float(line.split('指数:')[1].split(')')[0].strip())
-                data['sentiment']['overall'] = score
-                data['sentiment_label']['overall'] = get_sentiment_label(score)
-            except:
-                pass
-        if '中国市场' in line:
-            try:
-                score = float(line.split('指数:')[1].split(')')[0].strip())
-                data['sentiment']['cn'] = score
-                data['sentiment_label']['cn'] = get_sentiment_label(score)
-            except:
-                pass
-        if '美国市场' in line:
-            try:
-                score = float(line.split('指数:')[1].split(')')[0].strip())
-                data['sentiment']['us'] = score
-                data['sentiment_label']['us'] = get_sentiment_label(score)
-            except:
-                pass
-    
-    # 解析热点
-    in_hot = False
-    for line in lines:
-        if '【热点追踪】' in line:
-            in_hot = True
-            continue
-        if in_hot and line.strip().startswith('•'):
-            topic = line.strip().replace('•', '').strip()
-            data['hot_topics'].append(topic)
-        if in_hot and '【重大事件' in line:
-            break
-
-    # 解析重大事件
-    if '【重大事件提醒】' in content:
-        # 使用 split 获取 【重大事件提醒】 和 【其他新闻】 之间的内容
-        # 如果 【其他新闻】 不存在，则取到文件末尾
-        try:
-            events_section = content.split('【重大事件提醒】')[1].split('【其他新闻')[0]
-            
-            event_lines = events_section.strip().split('\n')
-            current_event = {}
-            
-            for line in event_lines:
-                line = line.strip()
-                if not line:
-                    continue
-
-                if line.startswith('[') and ']' in line:
-                    # 当遇到新的 source，保存上一个事件
-                    if current_event:
-                        data['major_events'].append(current_event)
-                    current_event = {'source': line.split(']')[0][1:].strip()}
-                elif line.startswith('标题:'):
-                    current_event['title'] = line.replace('标题:', '').strip()
-                elif line.startswith('摘要:'):
-                    current_event['summary'] = line.replace('摘要:', '').strip()
-                elif line.startswith('情绪:'):
-                    sentiment_line = line.replace('情绪:', '').strip()
-                    parts = [p.strip() for p in sentiment_line.split('|')]
-                    current_event['sentiment_overall'] = parts[0] if len(parts) > 0 else '中性'
-                    current_event['sentiment_cn'] = parts[1].replace('中国:', '') if len(parts) > 1 else '中性'
-                    current_event['sentiment_us'] = parts[2].replace('美国:', '') if len(parts) > 2 else '中性'
-            
-            # 添加最后一个事件
-            if current_event and 'title' in current_event:
-                 data['major_events'].append(current_event)
-        except IndexError:
-            pass # Section not found
-    
-    # 解析股票影响
-    for i, line in enumerate(lines):
-        if '股票影响:' in line:
-            stocks_str = line.split('股票影响:')[1].strip()
-            for stock in stocks_str.split('|'):
-                stock = stock.strip()
-                if '(' in stock and ')' in stock:
-                    symbol = stock.split('(')[0].strip()
-                    name = stock.split('(')[1].split(')')[0]
-                    direction = '上涨' if '↑' in stock else '下跌' if '↓' in stock else '中性'
-                    data['stocks'].append({
-                        'symbol': symbol,
-                        'name': name,
-                        'direction': direction
-                    })
-    
-    return data
+    with _report_cache_lock:
+        parsed = _parsed_reports.get(report['id'])
+        if parsed is not None:
+            _parsed_reports.move_to_end(report['id'])
+    if parsed is None:
+        parsed = parse_report(report['content'])
+        with _report_cache_lock:
+            _parsed_reports[report['id']] = parsed
+            while len(_parsed_reports) > REPORT_CACHE_SIZE:
+                _parsed_reports.popitem(last=False)
+    return copy.deepcopy(parsed)
 
 def analyze_weekly_stocks():
     """分析一周数据，预测个股涨跌"""
@@ -291,67 +248,18 @@ def analyze_weekly_stocks():
 
 def get_stock_recommendations():
     """获取股票推荐"""
-    report = get_latest_report()
-    if not report:
+    report = load_latest_report('hourly')
+    if not report or not report.get('content'):
         return {'a_stocks': [], 'us_stocks': []}
-    
-    data = parse_report(report)
-    stocks = data.get('stocks', [])
-    
-    # 分类A股和美股
-    a_stocks = []
-    us_stocks = []
-    
-    for stock in stocks:
-        if stock['direction'] == '上涨':
-            # 简单判断：数字开头的是A股代码
-            if stock['symbol'].isdigit():
-                a_stocks.append(stock)
-            else:
-                us_stocks.append(stock)
-    
-    return {
-        'a_stocks': a_stocks[:5],
-        'us_stocks': us_stocks[:5]
-    }
+    return recommend_stocks(parse_report_cached(report))
 
 def get_market_prediction():
     """获取大盘走势预测"""
-    report = get_latest_report()
-    if not report:
+    report = load_latest_report('hourly')
+    if not report or not report.get('content'):
         return {}
-    
-    data = parse_report(report)
-    sentiment = data.get('sentiment', {})
-    
-    def predict_trend(score):
-        if score > 0.3:
-            return '上涨'
-        elif score < -0.3:
-            return '下跌'
-        else:
-            return '震荡'
-    
-    return {
-        'china': {
-            'name': 'A股',
-            'sentiment': sentiment.get('cn', 0),
-            'trend': predict_trend(sentiment.get('cn', 0)),
-            'icon': '↑' if sentiment.get('cn', 0) > 0.3 else '↓' if sentiment.get('cn', 0) < -0.3 else '→'
-        },
-        'us': {
-            'name': '美股',
-            'sentiment': sentiment.get('us', 0),
-            'trend': predict_trend(sentiment.get('us', 0)),
-            'icon': '↑' if sentiment.get('us', 0) > 0.3 else '↓' if sentiment.get('us', 0) < -0.3 else '→'
-        },
-        'global': {
-            'name': '全球',
-            'sentiment': sentiment.get('overall', 0),
-            'trend': predict_trend(sentiment.get('overall', 0)),
-            'icon': '↑' if sentiment.get('overall', 0) > 0.3 else '↓' if sentiment.get('overall', 0) < -0.3 else '→'
-        }
-    }
+    return predict_markets(parse_report_cached(report))
+
 
 @app.route('/')
 @app.route('/<path:path>')
@@ -370,86 +278,25 @@ def test():
 
 @app.route('/api/latest')
 def api_latest():
-    """聚合接口：获取首页所需的所有实时数据"""
-    report_content = get_latest_report()
-    
-    # 获取最新报告的时间戳
-    reports = glob.glob('data/reports/report_*.txt')
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    if reports:
-        latest_file = max(reports, key=os.path.getctime)
-        mtime = os.path.getctime(latest_file)
-        timestamp = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
-    
-    data = {
-        'timestamp': timestamp,
-        'stats': {
-            'total_news': 0,
-            'positive_news': 0,
-            'negative_news': 0
-        },
-        'sentiment': {
-            'score': 0,
-            'label': 'Neutral',
-            'breakdown': {'positive': 0, 'neutral': 0, 'negative': 0}
-        },
-        'recommendations': {'a_shares': [], 'us_shares': []},
-        'market_prediction': [],
-        'hot_topics': []
-    }
-
-    if report_content:
-        parsed = parse_report(report_content)
-        
-        # 填充统计数据
-        data['stats']['total_news'] = parsed.get('total_news', 0)
-        # 简单估算正负面新闻数量 based on sentiment
-        sentiment_score = parsed.get('sentiment', {}).get('overall', 0)
-        data['stats']['positive_news'] = int(data['stats']['total_news'] * (0.5 + sentiment_score/2)) if sentiment_score > 0 else int(data['stats']['total_news'] * 0.3)
-        
-        # 填充情绪数据
-        # 模拟 breakdown 数据，因为 parse_report 目前只返回单一数值
-        overall_score = parsed.get('sentiment', {}).get('overall', 0)
-        cn_score = parsed.get('sentiment', {}).get('cn', 0)
-        us_score = parsed.get('sentiment', {}).get('us', 0)
-        
-        pos_pct = int(50 + overall_score * 50)
-        neg_pct = int(20 - overall_score * 20)
-        neu_pct = 100 - pos_pct - neg_pct
-        
-        data['sentiment'] = {
-            'score': overall_score,
-            'label': parsed.get('sentiment_label', {}).get('overall', '中性'),
-            'breakdown': {
-                'cn': cn_score,
-                'us': us_score,
-                'positive': max(0, pos_pct),
-                'neutral': max(0, neu_pct),
-                'negative': max(0, neg_pct)
-            }
-        }
-        
-        # 填充推荐
-        recs = get_stock_recommendations()
-        data['recommendations'] = {
-            'a_shares': recs.get('a_stocks', []),
-            'us_shares': recs.get('us_stocks', [])
-        }
-        
-        # 填充预测
-        preds = get_market_prediction()
-        data['market_prediction'] = [
-            {'name': v['name'], 'icon': v['icon'], 'trend': v['trend'], 'sentiment': f"指数: {v['sentiment']}"}
-            for k, v in preds.items()
-        ]
-        
-        # 填充热点
-        data['hot_topics'] = parsed.get('hot_topics', [])
-        
-        # Add raw content for display
-        data['content'] = report_content
-
-    return jsonify(data)
+    """聚合接口：获取首页所需的所有实时数据
+
+    报告生成时发布的看板快照对应最新小时报告时直接返回；快照缺失或落后于 reports 表
+    （快照发布失败、快照路径不一致）时按最新报告现场组装
+    """
+    report = load_latest_report('hourly')
+    snapshot = read_dashboard_snapshot(report['id']) if report else None
+    if snapshot:
+        body, etag = snapshot
+    elif report:
+        body, etag = dump_dashboard(build_dashboard(
+            report['content'], report_time(report).strftime('%Y-%m-%d %H:%M:%S'), parse_report_cached(report)))
+    else:
+        body, etag = dump_dashboard(build_dashboard(None, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    
+    # 304 和压缩由 http_cache 统一处理
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
 
 @app.route('/api/report/latest')
 def api_report_latest():
@@ -466,49 +313,37 @@ def api_summary_latest():
 @app.route('/api/hourly_report')
 def hourly_report():
     """获取最新小时简报的完整内容"""
-    # 获取最新报告文件路径
-    reports = glob.glob('data/reports/report_*.txt')
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-    
-    if reports:
-        latest_file = max(reports, key=os.path.getctime)
-        # 获取文件修改时间
-        mtime = os.path.getctime(latest_file)
-        timestamp = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
+    report = load_latest_report('hourly')
+    timestamp = report_time(report).strftime('%Y-%m-%d %H:%M:%S') if report else datetime.now().strftime('%Y-%m-%d %H:%M')
     
-    content = get_latest_report()
+    content = report['content'] if report else None
     if not content:
         return jsonify({
             'content': '暂无数据',
             'timestamp': timestamp
         })
     
-    data = parse_report(content)
+    data = parse_report_cached(report)
     data['content'] = content  # 添加原始内容
     data['timestamp'] = timestamp
     return jsonify(data)
 
 @app.route('/api/daily_summary')
 def daily_summary():
-    # 获取所有摘要文件列表
-    summary_files = glob.glob('data/summaries/summary_*.txt')
-    summary_files.sort(key=os.path.getctime, reverse=True)
-    
     # 如果请求特定文件
     requested_file = request.args.get('file')
     if requested_file:
-        file_path = f'data/summaries/{requested_file}'
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return jsonify({'content': content, 'file': requested_file})
-            except:
-                pass
+        try:
+            report = get_report_by_key('daily', report_key_from_file('daily', requested_file))
+            if report and report.get('content'):
+                return jsonify({'content': report['content'], 'file': requested_file})
+        except Exception:
+            pass
         return jsonify({'content': '无法读取文件', 'error': True})
     
     # 返回文件列表和最新内容
-    file_names = [os.path.basename(f) for f in summary_files]
+    summaries = get_reports('daily', limit=None)
+    file_names = [report_file_name('daily', r['report_key']) for r in summaries]
     content = get_latest_summary()
     return jsonify({
         'files': file_names,
@@ -526,46 +361,36 @@ def market_prediction():
 
 @app.route('/api/sentiment')
 def sentiment():
-    report = get_latest_report()
-    data = parse_report(report)
+    data = parse_report_cached(load_latest_report('hourly'))
     return jsonify(data.get('sentiment', {}))
 
 @app.route('/api/weekly_analysis')
 def weekly_analysis():
-    # 获取所有周报文件列表
-    weekly_files = glob.glob('data/weekly/analysis_*.json')
-    weekly_files.sort(key=os.path.getctime, reverse=True)
-    
     # 如果请求特定文件
     requested_file = request.args.get('file')
     if requested_file:
-        file_path = f'data/weekly/{requested_file}'
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    data['file'] = requested_file
-                    return jsonify(data)
-            except:
-                pass
+        try:
+            report = get_report_by_key('weekly', report_key_from_file('weekly', requested_file))
+            if report and isinstance(report.get('data'), dict):
+                data = report['data']
+                data['file'] = requested_file
+                return jsonify(data)
+        except Exception:
+            pass
         return jsonify({'error': True, 'message': '无法读取文件'})
     
-    # 返回文件列表
-    file_names = [os.path.basename(f) for f in weekly_files]
+    # 返回周报列表
+    file_names = [report_file_name('weekly', r['report_key']) for r in get_reports('weekly', limit=None)]
     
     # 获取最新的周报数据
-    if weekly_files:
-        latest = weekly_files[0]
-        try:
-            with open(latest, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                data['files'] = file_names
-                data['latest'] = file_names[0] if file_names else None
-                return jsonify(data)
-        except:
-            pass
+    latest = load_latest_report('weekly')
+    if latest and isinstance(latest.get('data'), dict):
+        data = dict(latest['data'])
+        data['files'] = file_names
+        data['latest'] = file_names[0] if file_names else None
+        return jsonify(data)
     
-    # 如果没有JSON文件，则生成分析
+    # 如果还没有周报，则生成分析
     result = analyze_weekly_stocks()
     result['files'] = file_names
     return jsonify(result)
@@ -577,19 +402,15 @@ def api_report_structured():
     lang = request.args.get('lang', 'zh')  # 支持 'zh' 或 'en'
     translator = get_translator()
     
-    # 优先从 reports_json 目录读取
-    json_reports = glob.glob('data/reports_json/report_*.json')
-    if json_reports:
-        latest = max(json_reports, key=os.path.getctime)
-        try:
-            with open(latest, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return jsonify(translator['translate_report_data'](data, lang))
-        except:
-            pass
+    # 优先使用最新报告的结构化数据
+    report = load_latest_report('hourly')
+    if report and isinstance(report.get('data'), dict):
+        # 翻译会原地修改嵌套字段，不能直接用缓存中的数据
+        data = report['data'] if lang == 'zh' else copy.deepcopy(report['data'])
+        return jsonify(translator['translate_report_data'](data, lang))
     
     # 回退：解析最新的文本报告
-    report_content = get_latest_report()
+    report_content = report['content'] if report else None
     if not report_content:
         return jsonify({
             'meta': {'total_news': 0, 'generated_at': datetime.now().isoformat()},
@@ -606,7 +427,7 @@ def api_report_structured():
         })
     
     # 解析文本报告为结构化数据
-    parsed = parse_report(report_content)
+    parsed = parse_report_cached(report)
     
     # 构建结构化响应
     sentiment_overall = parsed.get('sentiment', {}).get('overall', 0)
@@ -624,12 +445,7 @@ def api_report_structured():
             return '中性'
     
     # 获取时间戳
-    reports = glob.glob('data/reports/report_*.txt')
-    timestamp = datetime.now().isoformat()
-    if reports:
-        latest_file = max(reports, key=os.path.getctime)
-        mtime = os.path.getctime(latest_file)
-        timestamp = datetime.fromtimestamp(mtime).isoformat()
+    timestamp = report_time(report).isoformat()
     
     now = datetime.now()
     beijing_hour = now.hour
@@ -725,61 +541,34 @@ def api_reports_history():
     report_type = request.args.get('type', 'all')  # all, hourly, daily, weekly
     lang = request.args.get('lang', 'zh')
     
-    reports = []
-    
-    # 获取小时报告
-    if report_type in ['all', 'hourly']:
-        hourly_files = glob.glob('data/reports/report_*.txt')
-        for f in hourly_files:
-            mtime = os.path.getctime(f)
-            reports.append({
-                'id': os.path.basename(f).replace('report_', '').replace('.txt', ''),
-                'type': 'hourly',
-                'title': 'Hourly Brief' if lang == 'en' else '每小时简报',
-                'timestamp': datetime.fromtimestamp(mtime).isoformat(),
-                'file_path': f
-            })
-    
-    # 获取每日摘要
-    if report_type in ['all', 'daily']:
-        daily_files = glob.glob('data/summaries/summary_*.txt')
-        for f in daily_files:
-            mtime = os.path.getctime(f)
-            reports.append({
-                'id': os.path.basename(f).replace('summary_', '').replace('.txt', ''),
-                'type': 'daily',
-                'title': 'Daily Summary' if lang == 'en' else '每日摘要',
-                'timestamp': datetime.fromtimestamp(mtime).isoformat(),
-                'file_path': f
-            })
-    
-    # 获取周报
-    if report_type in ['all', 'weekly']:
-        weekly_files = glob.glob('data/weekly/analysis_*.json')
-        for f in weekly_files:
-            mtime = os.path.getctime(f)
-            reports.append({
-                'id': os.path.basename(f).replace('analysis_', '').replace('.json', ''),
-                'type': 'weekly',
-                'title': 'Weekly Analysis' if lang == 'en' else '周度分析',
-                'timestamp': datetime.fromtimestamp(mtime).isoformat(),
-                'file_path': f
-            })
-    
-    # 按时间排序
-    reports.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    # 分页
-    total = len(reports)
-    start = (page - 1) * per_page
-    end = start + per_page
+    report_types = {
+        'all': ['hourly', 'daily', 'weekly'],
+        'hourly': ['hourly'],
+        'daily': ['daily'],
+        'weekly': ['weekly'],
+    }.get(report_type, [])
+    titles = {
+        'hourly': 'Hourly Brief' if lang == 'en' else '每小时简报',
+        'daily': 'Daily Summary' if lang == 'en' else '每日摘要',
+        'weekly': 'Weekly Analysis' if lang == 'en' else '周度分析',
+    }
+    
+    # 按时间倒序分页，直接在内存目录上切片
+    total, rows = report_catalog.page(report_types, page, per_page) if report_types else (0, [])
+    reports = [{
+        'id': r['report_key'],
+        'type': r['report_type'],
+        'title': titles[r['report_type']],
+        'timestamp': report_time(r).isoformat(),
+        'file_path': r['file_path']
+    } for r in rows]
     
     return jsonify({
         'total': total,
         'page': page,
         'per_page': per_page,
         'pages': (total + per_page - 1) // per_page,
-        'data': reports[start:end]
+        'data': reports
     })
 
 
@@ -788,31 +577,22 @@ def api_report_detail(report_id):
     """获取指定报告详情"""
     report_type = request.args.get('type', 'hourly')
     
-    if report_type == 'hourly':
-        filepath = f'data/reports/report_{report_id}.txt'
-    elif report_type == 'daily':
-        filepath = f'data/summaries/summary_{report_id}.txt'
-    elif report_type == 'weekly':
-        filepath = f'data/weekly/analysis_{report_id}.json'
-    else:
+    if report_type not in ('hourly', 'daily', 'weekly'):
         return jsonify({'error': '无效的报告类型'}), 400
     
-    if not os.path.exists(filepath):
-        return jsonify({'error': '报告不存在'}), 404
-    
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            if filepath.endswith('.json'):
-                data = json.load(f)
-                return jsonify(data)
-            else:
-                content = f.read()
-                parsed = parse_report(content) if report_type == 'hourly' else {}
-                return jsonify({
-                    'content': content,
-                    'parsed': parsed,
-                    'timestamp': datetime.fromtimestamp(os.path.getctime(filepath)).isoformat()
-                })
+        report = get_report_by_key(report_type, report_id)
+        if not report:
+            return jsonify({'error': '报告不存在'}), 404
+        if report_type == 'weekly':
+            return jsonify(report.get('data') or {})
+        content = report.get('content') or ''
+        parsed = parse_report_cached(report) if report_type == 'hourly' else {}
+        return jsonify({
+            'content': content,
+            'parsed': parsed,
+            'timestamp': report_time(report).isoformat()
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1048,6 +828,7 @@ def api_crypto_market():
         return jsonify({'error': '加密货币模块未加载'}), 500
     
     try:
+        # 只读：分桶历史由 main.py 的定时采样任务写入
         data = collector.get_market_data(symbols_list)
         # 直接返回列表格式，便于前端处理
         return jsonify(data)
@@ -1055,6 +836,31 @@ def api_crypto_market():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/crypto/<symbol>/history')
+def api_crypto_history(symbol):
+    """加密货币价格历史（本地采集的 OHLC 分桶，按时间正序）
+
+    参数: granularity minute / hour / day (默认 hour)，days 最近 N 天 (minute 默认 1，hour 默认 7，day 默认 365)
+    """
+    granularity = request.args.get('granularity', 'hour')
+    default_days = {'minute': 1, 'hour': 7, 'day': 365}
+    if granularity not in default_days:
+        return jsonify({'error': 'granularity 只支持 minute、hour 或 day'}), 400
+    days = min(request.args.get('days', default_days[granularity], type=int), 3650)
+    try:
+        from database import get_crypto_history
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%dT%H:%M')
+        return jsonify({
+            'symbol': symbol.upper(),
+            'granularity': granularity,
+            'data': get_crypto_history(symbol.upper(), granularity, since=since)
+        })
+    except ImportError:
+        return jsonify({'error': '数据库模块未加载'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/crypto/global')
 def api_crypto_global():
     """获取加密货币全球市场数据"""
@@ -1115,18 +921,38 @@ def api_crypto_detail(coin_id):
 
 @app.route('/api/realtime')
 def api_realtime():
-    """获取实时快讯"""
-    collector = get_realtime_collector()
-    if not collector:
+    """获取实时快讯（后台按 REALTIME_POLL_SECONDS 采集的最新结果）"""
+    feed = get_realtime_feed()
+    if not feed:
         return jsonify({'error': '实时采集模块未加载'}), 500
     
     try:
-        data = collector.fetch_all_realtime()
-        return jsonify({'data': data, 'timestamp': datetime.now().isoformat()})
+        data, fetched_at = feed.latest()
+        return jsonify({'data': data, 'timestamp': fetched_at.isoformat()})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/events')
+def api_events():
+    """事件推送（Server-Sent Events）
+
+    types: 逗号分隔的事件类型，默认全部。report - 新报告入库；realtime - 实时快讯有更新
+    连接建立时补发每类事件的最新一条
+    """
+    types = [t for t in request.args.get('types', 'report,realtime').split(',') if t]
+    report_catalog.ensure_loaded()
+    if 'realtime' in types:
+        feed = get_realtime_feed()
+        if feed:
+            feed.start()
+    
+    response = Response(event_hub.stream(types), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭 Nginx 代理缓冲
+    return response
+
+
 @app.route('/api/backtest/report')
 def api_backtest_report():
     """获取回测报告"""
@@ -1199,42 +1025,41 @@ def api_monthly_analysis():
     if not analyzer:
         return jsonify({'error': '月度分析模块未加载'}), 500
     
-    # 获取所有月度分析文件
-    monthly_files = glob.glob('data/monthly/analysis_*.json')
-    monthly_files.sort(key=os.path.getctime, reverse=True)
-    file_names = [os.path.basename(f) for f in monthly_files]
+    # 获取所有月度分析
+    try:
+        monthly_reports = get_reports('monthly', limit=None)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    file_names = [report_file_name('monthly', r['report_key']) for r in monthly_reports]
     
     # 如果请求特定文件
     requested_file = request.args.get('file')
     if requested_file:
-        file_path = f'data/monthly/{requested_file}'
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    data['files'] = file_names
-                    data['file'] = requested_file
-                    analyzer.current_analysis = data  # 设置当前分析用于对话
-                    return jsonify(data)
-            except Exception as e:
-                return jsonify({'error': str(e)}), 500
+        try:
+            report = get_report_by_key('monthly', report_key_from_file('monthly', requested_file))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        if report and isinstance(report.get('data'), dict):
+            data = report['data']
+            data['files'] = file_names
+            data['file'] = requested_file
+            analyzer.current_analysis = data  # 设置当前分析用于对话
+            return jsonify(data)
         return jsonify({'error': '文件不存在'}), 404
     
     try:
-        # 检查是否有当月的分析
-        current_month_prefix = f"analysis_{year}{month:02d}"
+        # 检查是否有当月的分析（报告键以 YYYYMM 开头）
+        current_month_prefix = f"{year}{month:02d}"
         existing_analysis = None
         
         if not regenerate:
-            for f in monthly_files:
-                if current_month_prefix in f:
-                    try:
-                        with open(f, 'r', encoding='utf-8') as file:
-                            existing_analysis = json.load(file)
-                            analyzer.current_analysis = existing_analysis
+            for r in monthly_reports:
+                if r['report_key'].startswith(current_month_prefix):
+                    report = get_report_by_key('monthly', r['report_key'])
+                    if report and isinstance(report.get('data'), dict):
+                        existing_analysis = report['data']
+                        analyzer.current_analysis = existing_analysis
                         break
-                    except:
-                        pass
         
         if existing_analysis and not regenerate:
             existing_analysis['files'] = file_names
@@ -1291,33 +1116,18 @@ def api_monthly_chat():
 @app.route('/api/monthly/history')
 def api_monthly_history():
     """获取月度分析历史列表"""
-    monthly_files = glob.glob('data/monthly/analysis_*.json')
-    monthly_files.sort(key=os.path.getctime, reverse=True)
+    try:
+        monthly_reports = get_reports('monthly', limit=None)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
     
-    history = []
-    for f in monthly_files:
-        try:
-            mtime = datetime.fromtimestamp(os.path.getctime(f))
-            filename = os.path.basename(f)
-            
-            # 尝试读取摘要
-            summary = ""
-            try:
-                with open(f, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    summary = data.get('summary', '')[:100]
-                    month_name = data.get('month', '')
-            except:
-                month_name = ""
-            
-            history.append({
-                'file': filename,
-                'month': month_name,
-                'timestamp': mtime.isoformat(),
-                'summary': summary
-            })
-        except:
-            pass
+    # 月份名和摘要在入库时已提取到 title / summary 列，列表不必读取完整分析
+    history = [{
+        'file': report_file_name('monthly', r['report_key']),
+        'month': r['title'] or '',
+        'timestamp': report_time(r).isoformat(),
+        'summary': (r['summary'] or '')[:100]
+    } for r in monthly_reports]
     
     return jsonify({'data': history})
 
@@ -1447,6 +1257,70 @@ def run_optimization():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/sentiment/history')
+def api_sentiment_history():
+    """情绪走势（读取预聚合的小时/天汇总表）
+
+    参数: granularity hourly / daily (默认 daily)，days 最近 N 天 (hourly 默认 7，daily 默认 90)
+    """
+    granularity = request.args.get('granularity', 'daily')
+    if granularity not in ('hourly', 'daily'):
+        return jsonify({'error': 'granularity 只支持 hourly 或 daily'}), 400
+    days = min(request.args.get('days', 7 if granularity == 'hourly' else 90, type=int), 3650)
+    try:
+        from database import get_sentiment_rollup
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        return jsonify({'granularity': granularity, 'data': get_sentiment_rollup(granularity, since=since)})
+    except ImportError:
+        return jsonify({'error': '数据库模块未加载'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/news/search')
+def api_search_news():
+    """新闻全文检索
+
+    参数: q 关键词（空格分隔，全部命中），days 只搜最近 N 天 (默认 365)，limit 返回条数 (默认 50，最大 200)
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': '请提供关键词'}), 400
+    days = min(request.args.get('days', 365, type=int), 3650)
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    try:
+        from database import search_news
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+        results = search_news(query, since=since, limit=limit)
+        return jsonify({'query': query, 'count': len(results), 'data': results})
+    except ImportError:
+        return jsonify({'error': '数据库模块未加载'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/metrics/pipeline')
+def api_pipeline_metrics():
+    """流水线阶段耗时统计
+
+    参数: pipeline (默认 daily_report), runs 最近运行次数 (默认 24), days 汇总天数 (默认 7)
+    """
+    pipeline = request.args.get('pipeline', 'daily_report')
+    runs = min(request.args.get('runs', 24, type=int), 500)
+    days = min(request.args.get('days', 7, type=int), 90)
+    try:
+        from database import get_pipeline_runs, get_pipeline_stage_summary
+        return jsonify({
+            'pipeline': pipeline,
+            'runs': get_pipeline_runs(pipeline, runs),
+            'summary': get_pipeline_stage_summary(pipeline, days)
+        })
+    except ImportError:
+        return jsonify({'error': '数据库模块未加载'}), 500
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 if __name__ == '__main__':
     # 初始化数据库
     init_database()